@@ -0,0 +1,8 @@
+"""Benchmarks for the lab hot paths; run with `python -m benchmarks.run --help` from labs/."""
+import os
+import sys
+
+# the lab modules import each other as top-level modules (from get_conn import ...)
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,169 @@
+"""Synthetic datasets shaped like the lab data, at any scale.
+
+Everything is streamed to disk row by row and seeded, so a given (scale, seed) always
+produces the same files and 10M-row datasets never have to fit in memory.
+"""
+import json
+import os
+import random
+
+from . import SRC_DIR
+from sql_script import iter_statements, parse_insert
+
+# Extensions that only exist on Azure Database for PostgreSQL; a local pgvector server has "vector"
+AZURE_ONLY_EXTENSIONS = ("pg_diskann", "azure_ai")
+
+RETURN_STATUSES = ("Pending", "Completed", "Rejected")
+RETURN_REASONS = ("Wrong item sent", "Item not as described", "Item arrived damaged", "Changed my mind")
+SHIPMENT_STATUSES = ("Delivered", "In Transit", "Preparing", "Not Started")
+REVIEW_TEXTS = ("Excellent product!", "Great value but a bit pricey.", "I was sent the wrong item.",
+                "Works as described.", "Stopped working after a week.")
+CITIES = (("New York", "NY"), ("Los Angeles", "CA"), ("Chicago", "IL"), ("Houston", "TX"),
+          ("Phoenix", "AZ"), ("Seattle", "WA"), ("Miami", "FL"), ("San Francisco", "CA"))
+
+
+def _sql_literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _tuple(values) -> str:
+    return "(" + ", ".join(_sql_literal(v) for v in values) + ")"
+
+
+def split_script(path, keep_azure_extensions=False):
+    """Returns the (before, after) non-INSERT statements of a lab SQL script.
+
+    The generated scripts reuse the real DDL so they stay in sync with the labs.
+    """
+    before, after = [], []
+    seen_insert = False
+    with open(path, encoding="utf-8") as f:
+        for statement in iter_statements(f):
+            if parse_insert(statement) is not None:
+                seen_insert = True
+                continue
+            lowered = statement.lower()
+            if not keep_azure_extensions and lowered.startswith("create extension") and \
+                    any(ext in lowered for ext in AZURE_ONLY_EXTENSIONS):
+                continue
+            (after if seen_insert else before).append(statement)
+    return before, after
+
+
+def load_templates(path=None):
+    with open(path or os.path.join(SRC_DIR, "sample_products.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_products(count, seed=0, templates=None):
+    """Yields product dicts like sample_products.json entries, with ids 1..count."""
+    templates = templates or load_templates()
+    sentences = [s.strip().rstrip(".") + "." for t in templates for s in t["description"].split(". ") if s.strip()]
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        base = templates[rng.randrange(len(templates))]
+        yield {
+            "id": i,
+            "name": f"{base['name']} {i}",
+            "category": base["category"],
+            "description": " ".join(rng.sample(sentences, 3)),
+            "price": round(base["price"] * rng.uniform(0.5, 1.5), 2),
+        }
+
+
+def write_products_json(path, count, seed=0):
+    """Writes a JSON array of count products, one element at a time."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for product in iter_products(count, seed):
+            if product["id"] > 1:
+                f.write(",\n")
+            f.write(json.dumps(product, ensure_ascii=False))
+        f.write("\n]\n")
+    return path
+
+
+def write_product_catalogue_sql(path, count, seed=0):
+    """Writes a product_catalogue.sql-style script (one INSERT per row) with count products."""
+    before, after = split_script(os.path.join(SRC_DIR, "product_catalogue.sql"))
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(s + ";\n" for s in before)
+        for p in iter_products(count, seed):
+            values = _tuple((p["id"], p["name"], p["category"], p["description"], p["price"]))
+            f.write(f"INSERT INTO product_catalogue (id, name, category, description, price) VALUES {values};\n")
+        f.writelines(s + ";\n" for s in after)
+    return path
+
+
+def _write_multirow(f, table, columns, rows, rows_per_statement):
+    chunk = []
+    for row in rows:
+        chunk.append(_tuple(row))
+        if len(chunk) >= rows_per_statement:
+            f.write(f"INSERT INTO {table} ({columns}) VALUES\n" + ",\n".join(chunk) + "\n;\n")
+            chunk = []
+    if chunk:
+        f.write(f"INSERT INTO {table} ({columns}) VALUES\n" + ",\n".join(chunk) + "\n;\n")
+
+
+def contoso_row_counts(scale):
+    return {
+        "products": scale,
+        "customers": scale,
+        "sales": scale * 2,
+        "return_items": max(1, scale // 10),
+        "shipments": scale,
+        "reviews": max(1, scale // 2),
+    }
+
+
+def write_contoso_sql(path, scale, seed=0, rows_per_statement=1000):
+    """Writes a contoso_db.sql-style script; foreign keys only point at rows that exist."""
+    counts = contoso_row_counts(scale)
+    rng = random.Random(seed)
+    before, after = split_script(os.path.join(SRC_DIR, "contoso_db.sql"))
+
+    def date():
+        return f"2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(s + ";\n" for s in before)
+        _write_multirow(f, "products", "name, description, price, inventory, refurbished, category", (
+            (p["name"], p["description"], p["price"], rng.randint(0, 500), rng.random() < 0.2, p["category"][:50])
+            for p in iter_products(counts["products"], seed)), rows_per_statement)
+        _write_multirow(f, "customers", "city, state, country, sentiment_score, name, email", (
+            (*rng.choice(CITIES), "USA", round(rng.uniform(1, 5), 2) if rng.random() < 0.5 else None,
+             f"Customer {i}", f"customer{i}@example.com")
+            for i in range(1, counts["customers"] + 1)), rows_per_statement)
+        _write_multirow(f, "sales", "customer_id, quantity, product_id", (
+            (rng.randint(1, counts["customers"]), rng.randint(1, 5), rng.randint(1, counts["products"]))
+            for _ in range(counts["sales"])), rows_per_statement)
+        _write_multirow(f, "return_items", "sales_id, return_status, reason, status_date", (
+            (rng.randint(1, counts["sales"]), rng.choice(RETURN_STATUSES), rng.choice(RETURN_REASONS), date())
+            for _ in range(counts["return_items"])), rows_per_statement)
+        _write_multirow(f, "shipments", "sales_id, shipment_date, shipment_status, latest_status_date", (
+            (i, date(), rng.choice(SHIPMENT_STATUSES), date())
+            for i in range(1, counts["shipments"] + 1)), rows_per_statement)
+        _write_multirow(f, "reviews", "customer_id, product_id, sales_id, rating, review_text", (
+            (rng.randint(1, counts["customers"]), rng.randint(1, counts["products"]),
+             rng.randint(1, counts["sales"]), rng.randint(1, 5), rng.choice(REVIEW_TEXTS))
+            for _ in range(counts["reviews"])), rows_per_statement)
+        f.writelines(s + ";\n" for s in after)
+    return path
+
+
+def generate(out_dir, scale, seed=0):
+    """Writes all three datasets into out_dir and returns their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    return {
+        "products_json": write_products_json(os.path.join(out_dir, "products.json"), scale, seed),
+        "product_catalogue_sql": write_product_catalogue_sql(
+            os.path.join(out_dir, "product_catalogue.sql"), scale, seed),
+        "contoso_sql": write_contoso_sql(os.path.join(out_dir, "contoso_db.sql"), scale, seed),
+    }
@@ -0,0 +1,77 @@
+"""Timing helpers: per-call latency percentiles, throughput and peak RSS."""
+import asyncio
+import resource
+import sys
+import time
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(name, latencies, wall_seconds, items=None, **extra) -> dict:
+    """Builds the JSON record for one benchmark; items defaults to the number of calls."""
+    latencies = sorted(latencies)
+    items = len(latencies) if items is None else items
+    return {
+        "name": name,
+        "calls": len(latencies),
+        "items": items,
+        "seconds": round(wall_seconds, 4),
+        "throughput_per_s": round(items / wall_seconds, 2) if wall_seconds else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+
+def bench(name, func, iterations=100, warmup=5, items_per_call=1, **extra) -> dict:
+    """Calls func() iterations times (after warmup calls) and summarizes the latencies."""
+    for _ in range(warmup):
+        func()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - t)
+    return summarize(name, latencies, time.perf_counter() - start, iterations * items_per_call, **extra)
+
+
+async def bench_async(name, func, iterations=100, warmup=5, concurrency=1, **extra) -> dict:
+    """Awaits func() iterations times with up to concurrency calls in flight."""
+    for _ in range(warmup):
+        await func()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            t = time.perf_counter()
+            await func()
+            latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(iterations)))
+    return summarize(name, latencies, time.perf_counter() - start, concurrency=concurrency, **extra)
+
+
+def timed_once(name, func, items=None, **extra) -> dict:
+    """Times a single long-running call, such as a bulk load."""
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    record = summarize(name, [seconds], seconds, items if items is not None else 1, **extra)
+    if isinstance(result, dict):
+        record["result"] = result
+    return record
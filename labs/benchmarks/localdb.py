@@ -0,0 +1,163 @@
+"""Throwaway local PostgreSQL + pgvector and SQL Server instances for the benchmarks."""
+import contextlib
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+import psycopg2
+
+DOCKER_IMAGE = "pgvector/pgvector:pg16"
+# mcr.microsoft.com/azure-sql-edge also works (and runs on arm64); both take the same settings
+SQLSERVER_IMAGE = "mcr.microsoft.com/mssql/server:2022-latest"
+SQLSERVER_PASSWORD = "Bench_pass1!"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalPostgres:
+    """Starts a disposable PostgreSQL server and stops it on exit.
+
+    mode is "docker" (the pgvector image), "initdb" (a temporary cluster from the
+    PostgreSQL binaries on PATH, which need the pgvector extension installed) or "dsn"
+    (an existing server given by dsn, left running).
+    """
+
+    def __init__(self, mode: str = "docker", dsn: str | None = None, image: str = DOCKER_IMAGE,
+                 startup_timeout: float = 60.0):
+        self.mode = mode
+        self.dsn = dsn
+        self.image = image
+        self.startup_timeout = startup_timeout
+        self._container = None
+        self._data_dir = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def connect(self, **kwargs):
+        return psycopg2.connect(self.dsn, **kwargs)
+
+    def start(self):
+        if self.mode == "docker":
+            port = _free_port()
+            self._container = subprocess.check_output(
+                ["docker", "run", "-d", "--rm", "-e", "POSTGRES_PASSWORD=bench", "-e", "POSTGRES_USER=bench",
+                 "-e", "POSTGRES_DB=bench", "-p", f"127.0.0.1:{port}:5432", self.image],
+                text=True).strip()
+            self.dsn = f"host=127.0.0.1 port={port} user=bench password=bench dbname=bench"
+        elif self.mode == "initdb":
+            self._data_dir = tempfile.mkdtemp(prefix="bench_pg_")
+            port = _free_port()
+            subprocess.run(["initdb", "-D", self._data_dir, "-U", "bench", "--auth=trust", "-E", "UTF8"],
+                           check=True, capture_output=True)
+            subprocess.run(["pg_ctl", "-D", self._data_dir, "-l", os.path.join(self._data_dir, "server.log"),
+                            "-o", f"-p {port} -k {self._data_dir} -c fsync=off", "-w", "start"],
+                           check=True, capture_output=True)
+            self.dsn = f"host={self._data_dir} port={port} user=bench dbname=postgres"
+        elif self.mode != "dsn" or not self.dsn:
+            raise ValueError("mode must be 'docker', 'initdb' or 'dsn' (with a dsn)")
+        self._wait_ready()
+        with contextlib.closing(self.connect()) as conn:
+            with conn.cursor() as cur:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            conn.commit()
+        return self
+
+    def _wait_ready(self):
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                self.connect().close()
+                return
+            except psycopg2.OperationalError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+
+    def stop(self):
+        if self._container:
+            subprocess.run(["docker", "stop", self._container], capture_output=True)
+            self._container = None
+        if self._data_dir:
+            subprocess.run(["pg_ctl", "-D", self._data_dir, "-m", "fast", "stop"], capture_output=True)
+            shutil.rmtree(self._data_dir, ignore_errors=True)
+            self._data_dir = None
+
+
+class LocalSQLServer:
+    """Starts a disposable SQL Server (or Azure SQL Edge) container with an empty bench database.
+
+    mode is "docker", or "odbc" for an existing server given by connection_string, left
+    running. connection_string is what JSONToSQLInserter(connection_string=...) takes.
+    """
+
+    def __init__(self, mode: str = "docker", connection_string: str | None = None, image: str = SQLSERVER_IMAGE,
+                 startup_timeout: float = 120.0):
+        self.mode = mode
+        self.connection_string = connection_string
+        self.image = image
+        self.startup_timeout = startup_timeout
+        self._container = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def connect(self, **kwargs):
+        import pyodbc
+
+        return pyodbc.connect(self.connection_string, **kwargs)
+
+    def start(self):
+        if self.mode == "docker":
+            port = _free_port()
+            self._container = subprocess.check_output(
+                ["docker", "run", "-d", "--rm", "-e", "ACCEPT_EULA=Y", "-e", f"MSSQL_SA_PASSWORD={SQLSERVER_PASSWORD}",
+                 "-p", f"127.0.0.1:{port}:1433", self.image],
+                text=True).strip()
+            server = (f"DRIVER={{ODBC Driver 18 for SQL Server}};SERVER=127.0.0.1,{port};UID=sa;"
+                      f"PWD={SQLSERVER_PASSWORD};Encrypt=yes;TrustServerCertificate=yes;")
+            self.connection_string = server + "DATABASE=master;"
+            self._wait_ready()
+            conn = self.connect(autocommit=True)
+            try:
+                conn.cursor().execute("IF DB_ID('bench') IS NULL CREATE DATABASE bench")
+            finally:
+                conn.close()
+            self.connection_string = server + "DATABASE=bench;"
+        elif self.mode != "odbc" or not self.connection_string:
+            raise ValueError("mode must be 'docker' or 'odbc' (with a connection_string)")
+        self._wait_ready()
+        return self
+
+    def _wait_ready(self):
+        import pyodbc
+
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                self.connect().close()
+                return
+            except pyodbc.Error:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(1.0)
+
+    def stop(self):
+        if self._container:
+            subprocess.run(["docker", "stop", self._container], capture_output=True)
+            self._container = None
@@ -0,0 +1,316 @@
+"""Runs the lab benchmarks against a throwaway PostgreSQL and prints (or writes) JSON results.
+
+    cd labs
+    python -m benchmarks.run --scale 10000 --db docker --out bench.json
+    python -m benchmarks.run --scale 1000 --db dsn --dsn "host=localhost user=postgres" --suites loaders,vectors
+    python -m benchmarks.run --scale 1000 --suites loaders --sqlserver docker
+
+Embeddings come from FakeEmbeddingService, so no Azure resources are needed. None of the
+timed paths call the chat model; the MCP tools are benchmarked by calling the plugin's
+kernel functions directly.
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import itertools
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from . import datagen
+from .harness import bench, bench_async, peak_rss_mb, summarize, timed_once
+from .localdb import SQLSERVER_IMAGE, LocalPostgres, LocalSQLServer
+
+from async_pool import AsyncConnectionPool
+from embeddings import EmbeddingPipeline, FakeEmbeddingService
+from prepared import PreparingConnection
+from vector_copy import bulk_load_vectors, iter_vector_rows
+from vector_search import LocalVectorIndex
+from init_sql_db import clean_product, iter_json_array
+
+SUITES = ("datagen", "loaders", "mcp", "vectors")
+
+
+def run_datagen(args, paths):
+    return [timed_once("datagen", lambda: paths.update(datagen.generate(args.work_dir, args.scale, args.seed)),
+                       items=args.scale, scale=args.scale)]
+
+
+def run_loaders(args, paths, db):
+    import db_init
+    import product_catalog_init
+
+    results = []
+
+    def parse_json():
+        with open(paths["products_json"], encoding="utf-8") as f:
+            return sum(1 for _ in map(clean_product, iter_json_array(f)))
+
+    # JSONToSQLInserter writes to Azure SQL; only its parse/validate stage runs locally
+    results.append(timed_once("json_inserter.parse_clean", parse_json, items=args.scale))
+    if args.sqlserver:
+        results += run_sqlserver(args, paths)
+
+    for name, module, path, rows in (
+        ("product_catalog_init.execute_sql_file", product_catalog_init, paths["product_catalogue_sql"], args.scale),
+        ("db_init.execute_sql_file", db_init, paths["contoso_sql"],
+         sum(datagen.contoso_row_counts(args.scale).values())),
+    ):
+        # a psycopg2 connection's with block only ends the transaction; closing() closes it too
+        with contextlib.closing(db.connect()) as conn:
+            with conn.cursor() as cur:
+                results.append(timed_once(name, functools.partial(module.execute_sql_file, cur, path), items=rows))
+            conn.commit()
+
+    # same script again, over parallel connections with keys, indexes and FKs built after the load
+    from parallel_init import ParallelInitializer
+    initializer = ParallelInitializer(db.connect, workers=args.init_workers)
+    results.append(timed_once("parallel_init.run", lambda: initializer.run(paths["contoso_sql"]),
+                              items=sum(datagen.contoso_row_counts(args.scale).values()),
+                              workers=args.init_workers))
+    return results
+
+
+def write_modified_products(path, out_path, every=10):
+    """Copies a products JSON file with the price of every n-th product raised; returns how many changed."""
+    changed = 0
+    with open(path, encoding="utf-8") as f, open(out_path, "w", encoding="utf-8") as out:
+        out.write("[\n")
+        for i, product in enumerate(iter_json_array(f)):
+            if product["id"] % every == 0:
+                product["price"] = round(product["price"] + 1, 2)
+                changed += 1
+            out.write((",\n" if i else "") + json.dumps(product, ensure_ascii=False))
+        out.write("\n]\n")
+    return changed
+
+
+def run_sqlserver(args, paths):
+    """JSONToSQLInserter.stream_insert in upsert mode against SQL Server.
+
+    With --sqlserver docker the loader runs against a throwaway local SQL Server three
+    times: into the empty table, the same file again (every row skipped) and a copy with
+    some prices changed (only those rows updated), checking the (inserted, updated,
+    skipped) counts of each run. --sqlserver env only times one load into the SQL_*
+    database, whose existing rows make the counts unpredictable.
+    """
+    from init_sql_db import JSONToSQLInserter
+
+    if args.sqlserver == "env":
+        inserter = JSONToSQLInserter()
+        try:
+            return [timed_once("json_inserter.stream_insert",
+                               lambda: inserter.stream_insert(paths["products_json"], mode="upsert"),
+                               items=args.scale)]
+        finally:
+            inserter.close_connection()
+
+    modified_json = os.path.join(args.work_dir, "products_modified.json")
+    changed = write_modified_products(paths["products_json"], modified_json)
+    runs = (
+        ("insert", paths["products_json"], (args.scale, 0, 0)),
+        ("idempotent_reload", paths["products_json"], (0, 0, args.scale)),
+        ("modified_reload", modified_json, (0, changed, args.scale - changed)),
+    )
+    results = []
+    with LocalSQLServer(image=args.sqlserver_image) as server:
+        inserter = JSONToSQLInserter(server.connection_string)
+        try:
+            if not inserter.create_table_if_not_exists():
+                raise RuntimeError("could not create dbo.products_catalogue on the local SQL Server")
+            for run, path, expected in runs:
+                record = timed_once(f"json_inserter.stream_insert.{run}",
+                                    functools.partial(inserter.stream_insert, path, mode="upsert"), items=args.scale)
+                stats = record["result"]
+                counts = (stats["inserted"], stats["updated"], stats["skipped"])
+                if counts != expected or stats["errors"] or stats["invalid"]:
+                    raise RuntimeError(f"{run}: expected (inserted, updated, skipped) = {expected}, got {counts} "
+                                       f"with {stats['errors']} failed batches and {stats['invalid']} invalid records")
+                record["verified"] = True
+                results.append(record)
+        finally:
+            inserter.close_connection()
+    return results
+
+
+async def run_mcp(args, db):
+    import pg_write_mcp
+
+    pg_write_mcp.connection_pool = AsyncConnectionPool(
+        connect=functools.partial(db.connect, connection_factory=PreparingConnection),
+        minconn=1, maxconn=10, max_waiting=100, timeout=30.0)
+    plugin = pg_write_mcp.Contoso_WritePlugin()
+    max_id = min(args.scale, 1000)
+    rng = np.random.default_rng(args.seed)
+
+    async def write_query():
+        await plugin.execute_write_query(
+            f"UPDATE products SET inventory = inventory + 1 WHERE product_id = {int(rng.integers(1, max_id + 1))}")
+
+    async def write_batch():
+        ids = rng.integers(1, max_id + 1, size=10)
+        await plugin.execute_write_batch(
+            [{"sql": "UPDATE products SET inventory = inventory + %s WHERE product_id = %s", "params": [1, int(i)]}
+             for i in ids])
+
+    results = []
+    for concurrency in (1, 8):
+        results.append(await bench_async("mcp.get_db_schema", plugin.get_db_schema,
+                                         iterations=args.iterations, concurrency=concurrency))
+        results.append(await bench_async("mcp.get_procedure_info", plugin.get_procedure_info,
+                                         iterations=args.iterations, concurrency=concurrency))
+        results.append(await bench_async("mcp.execute_write_query", write_query,
+                                         iterations=args.iterations, concurrency=concurrency))
+        results.append(await bench_async("mcp.execute_write_batch", write_batch,
+                                         iterations=args.iterations, concurrency=concurrency, statements=10))
+    pg_write_mcp.connection_pool.closeall()
+    return results
+
+
+async def run_vectors(args, paths, db):
+    from hybrid_search import hybrid_search
+    from quantized_vectors import measure_recall, migrate_table, quantized_search
+
+    rows = min(args.scale, args.vector_rows)
+    results = []
+    with contextlib.closing(db.connect()) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, description FROM product_catalogue ORDER BY id LIMIT %s", (rows,))
+            catalogue = cur.fetchall()
+            cur.execute(f"""
+                DROP TABLE IF EXISTS product_catalogue_vectors CASCADE;
+                CREATE TABLE product_catalogue_vectors (
+                    vector_id SERIAL PRIMARY KEY,
+                    id INTEGER REFERENCES product_catalogue(id),
+                    description TEXT NOT NULL,
+                    embedding vector({args.dim}) NOT NULL
+                );
+            """)
+        conn.commit()
+    ids = [r[0] for r in catalogue]
+    descriptions = [r[1] for r in catalogue]
+
+    # start from empty caches so every run measures the same work
+    for name in ("embedding_cache", "local_index"):
+        shutil.rmtree(os.path.join(args.work_dir, name), ignore_errors=True)
+    pipeline = EmbeddingPipeline(FakeEmbeddingService(dim=args.dim), model="fake", dim=args.dim,
+                                 cache_dir=os.path.join(args.work_dir, "embedding_cache"))
+    start = time.perf_counter()
+    embeddings = await pipeline.embed(descriptions)
+    seconds = time.perf_counter() - start
+    results.append(summarize("embeddings.pipeline", [seconds], seconds, len(descriptions), **pipeline.stats))
+
+    with contextlib.closing(db.connect()) as conn:
+        results.append(timed_once("vector_copy.bulk_load_vectors", lambda: bulk_load_vectors(
+            conn, "product_catalogue_vectors", iter_vector_rows(ids, descriptions, embeddings)), items=rows))
+        with conn.cursor() as cur:
+            cur.execute("CREATE INDEX ON product_catalogue_vectors USING hnsw (embedding vector_cosine_ops)")
+        conn.commit()
+
+    queries = np.stack([FakeEmbeddingService(dim=args.dim).embed_one(f"query {i}") for i in range(64)])
+    picks = itertools.count()
+
+    def next_query():
+        return queries[next(picks) % len(queries)]
+
+    with contextlib.closing(db.connect()) as conn:
+        def knn():
+            with conn.cursor() as cur:
+                cur.execute("SELECT id FROM product_catalogue_vectors ORDER BY embedding <=> %s::vector LIMIT 10",
+                            ("[" + ",".join(map(str, next_query())) + "]",))
+                cur.fetchall()
+
+        results.append(bench("pgvector.knn_hnsw", knn, iterations=args.iterations))
+        results.append(bench("hybrid_search", lambda: hybrid_search(
+            conn, "wireless noise cancelling headphones", next_query(), limit=10), iterations=args.iterations))
+
+        for mode in ("halfvec", "binary"):
+            migration = migrate_table(conn, "product_catalogue_vectors", mode, dim=args.dim)
+            results.append(bench(f"quantized_search.{mode}", lambda: quantized_search(
+                conn, "product_catalogue_vectors", next_query(), 10, mode, dim=args.dim),
+                iterations=args.iterations, storage=migration,
+                recall=measure_recall(conn, "product_catalogue_vectors", list(queries[:20]), 10, mode,
+                                      dim=args.dim)))
+
+        index = LocalVectorIndex(os.path.join(args.work_dir, "local_index"), dim=args.dim)
+        results.append(timed_once("local_index.sync", lambda: index.sync(conn), items=rows))
+    results.append(bench("local_index.search", lambda: index.search(next_query(), 10),
+                         iterations=args.iterations))
+    index.build_ivf(n_lists=max(1, int(np.sqrt(rows))))
+    results.append(bench("local_index.search_ivf", lambda: index.search(next_query(), 10, nprobe=8),
+                         iterations=args.iterations))
+    return results
+
+
+async def main_async(args):
+    paths = {}
+    results = []
+    suites = args.suites.split(",")
+    os.makedirs(args.work_dir, exist_ok=True)
+    # the datasets are needed by every other suite
+    results += run_datagen(args, paths)
+    with LocalPostgres(mode=args.db, dsn=args.dsn) as db:
+        if "loaders" in suites or "mcp" in suites or "vectors" in suites:
+            loader_results = run_loaders(args, paths, db)
+            if "loaders" in suites:
+                results += loader_results
+        if "mcp" in suites:
+            results += await run_mcp(args, db)
+        if "vectors" in suites:
+            results += await run_vectors(args, paths, db)
+    return {
+        "meta": {
+            "scale": args.scale,
+            "seed": args.seed,
+            "dim": args.dim,
+            "db": args.db,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "results": results,
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the lab loaders, MCP tools and vector search.")
+    parser.add_argument("--scale", type=int, default=10000, help="Rows per generated table (1k to 10M).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma separated subset of {SUITES}.")
+    parser.add_argument("--db", choices=["docker", "initdb", "dsn"], default="docker",
+                        help="How to get a PostgreSQL server with pgvector (default: docker).")
+    parser.add_argument("--dsn", help="Connection string for --db dsn.")
+    parser.add_argument("--sqlserver", nargs="?", const="env", choices=["env", "docker"],
+                        help="Also run JSONToSQLInserter.stream_insert: against the SQL_* database (env, the "
+                             "default) or a throwaway local SQL Server, verifying insert and reload counts (docker).")
+    parser.add_argument("--sqlserver-image", default=SQLSERVER_IMAGE,
+                        help="Image for --sqlserver docker, e.g. mcr.microsoft.com/azure-sql-edge on arm64.")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension.")
+    parser.add_argument("--vector-rows", type=int, default=100000, help="Cap on rows embedded and indexed.")
+    parser.add_argument("--init-workers", type=int, default=4, help="Connections used by parallel_init.")
+    parser.add_argument("--iterations", type=int, default=200, help="Calls per latency benchmark.")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "lab_benchmarks"))
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    report = asyncio.run(main_async(args))
+    output = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
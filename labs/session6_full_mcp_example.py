@@ -12,6 +12,33 @@ from dotenv import load_dotenv
 import sys
 load_dotenv()
 
+def get_write_plugin():
+    # Connect to a shared WriteAgent server if one is running, e.g.
+    #   python src/pg_write_mcp.py --transport streamable-http --port 8000
+    # with PG_WRITE_MCP_URL=http://127.0.0.1:8000/mcp/; otherwise start a private one over stdio
+    url = os.getenv("PG_WRITE_MCP_URL")
+    if url:
+        from semantic_kernel.connectors.mcp import MCPStreamableHttpPlugin
+
+        return MCPStreamableHttpPlugin(
+            name="WriteAgent",
+            description="Postgres Write Plugin",
+            url=url,
+        )
+    return MCPStdioPlugin(
+        name="WriteAgent",
+        description="Postgres Write Plugin",
+        command=sys.executable,
+        args=[
+            str(Path(os.path.dirname(__file__)).joinpath("src", "pg_write_mcp.py")),
+        ],
+        env={
+            "AZURE_OPENAI_CHAT_DEPLOYMENT_NAME": os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"),
+            "AZURE_OPENAI_ENDPOINT": os.getenv("AZURE_OPENAI_ENDPOINT"),
+        },
+    )
+
+
 # this script is an example of how to use multiple MCP plugins with Semantic Kernel
 async def main():
     try:
@@ -25,18 +52,7 @@ async def main():
             args=["-y", "@azure/mcp@latest", "server", "start"]
         ) as azure_plugin,
         # Connect to WriteAgent MCP Plugin
-            MCPStdioPlugin(
-                name="WriteAgent",
-                description="Postgres Write Plugin",
-                command=sys.executable,
-                args=[
-                    str(Path(os.path.dirname(__file__)).joinpath("src", "pg_write_mcp.py")),
-                ],
-                env={
-                    "AZURE_OPENAI_CHAT_DEPLOYMENT_NAME": os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"),
-                    "AZURE_OPENAI_ENDPOINT": os.getenv("AZURE_OPENAI_ENDPOINT"),
-                },
-            ) as write_agent,
+            get_write_plugin() as write_agent,
         ):
             agent = ChatCompletionAgent(
                 service=AzureChatCompletion(),
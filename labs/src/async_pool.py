@@ -0,0 +1,416 @@
+import asyncio
+import collections
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from psycopg2 import InterfaceError, OperationalError, extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+class PoolFull(Exception):
+    """Raised when the wait queue already holds max_waiting callers."""
+
+
+def ping(conn):
+    """One round trip that fails if the server or the network has dropped the connection.
+
+    Runs in autocommit mode so it does not leave a transaction open (no extra ROLLBACK).
+    """
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+    finally:
+        if not conn.closed:
+            conn.autocommit = autocommit
+
+
+def is_broken(exc, conn) -> bool:
+    """True if exc means the connection itself is gone, so the call can be retried on another one."""
+    return isinstance(exc, (OperationalError, InterfaceError)) and bool(conn.closed)
+
+
+class AsyncConnectionPool:
+    """Asyncio front end for a bounded set of blocking psycopg2 connections.
+
+    Blocking driver calls run on a thread pool with one worker per connection, so they
+    never stall the event loop. When every connection is checked out, callers queue up
+    in FIFO order (at most max_waiting of them) and give up after timeout seconds.
+
+    Idle connections are reused most recently used first. One that has not been used for
+    check_after seconds is pinged before it is handed out, and one older than max_lifetime
+    is replaced (new connections also pick up a fresh Entra token), so a call after an idle
+    period does not fail on a connection the server has already closed. warm_up() opens
+    connections ahead of the first calls and keep_warm() keeps them healthy in the
+    background, closing surplus connections idle for more than max_idle.
+    """
+
+    def __init__(self, connect, minconn: int = 1, maxconn: int = 10,
+                 max_waiting: int = 100, timeout: float = 30.0, warmup: int | None = None,
+                 max_lifetime: float | None = 3000.0, max_idle: float | None = 600.0,
+                 check_after: float = 10.0):
+        if minconn > maxconn:
+            raise ValueError("minconn must not exceed maxconn")
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.warmup = min(maxconn, max(minconn, warmup or 0))
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        # (connection, idle since, last known healthy), most recently returned on the right
+        self._idle = collections.deque()
+        self._waiters = collections.deque()
+        self._opened_at = {}
+        # connections that are open or being opened, idle or checked out
+        self._size = 0
+        self._closed = False
+        self.stats = {"opened": 0, "pings": 0, "broken": 0, "expired": 0, "idle_closed": 0, "closed": 0,
+                      "retries": 0}
+        self._executor = ThreadPoolExecutor(max_workers=maxconn, thread_name_prefix="pg_pool")
+        # like psycopg2's pools, open the minimum number of connections up front
+        for _ in range(minconn):
+            self._size += 1
+            self._add_idle(self._open())
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for fut in self._waiters if not fut.done())
+
+    def _open(self):
+        conn = self._connect()
+        self._opened_at[id(conn)] = time.monotonic()
+        self.stats["opened"] += 1
+        return conn
+
+    def _add_idle(self, conn, verified=None):
+        now = time.monotonic()
+        self._idle.append((conn, now, now if verified is None else verified))
+
+    def _expired(self, conn, now) -> bool:
+        return self.max_lifetime is not None and now - self._opened_at.get(id(conn), now) > self.max_lifetime
+
+    def _discard(self, conn, reason):
+        self.stats[reason] += 1
+        self._opened_at.pop(id(conn), None)
+        if not conn.closed:
+            conn.close()
+        self._release_slot()
+
+    async def _healthy(self, conn, verified) -> bool:
+        now = time.monotonic()
+        if conn.closed:
+            self._discard(conn, "broken")
+            return False
+        if self._expired(conn, now):
+            self._discard(conn, "expired")
+            return False
+        if now - verified > self.check_after:
+            self.stats["pings"] += 1
+            try:
+                await self.run(ping, conn)
+            except Exception:
+                self._discard(conn, "broken")
+                return False
+        return True
+
+    async def run(self, func, *args, **kwargs):
+        """Runs a blocking function on the pool's executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def getconn(self, timeout: float | None = None):
+        """Checks out a connection, waiting in line if the pool is exhausted."""
+        if self._closed:
+            raise PoolTimeout("connection pool is closed")
+        # new arrivals never jump ahead of callers that are already waiting
+        if not self.waiting:
+            while self._idle:
+                conn, _, verified = self._idle.pop()
+                if await self._healthy(conn, verified):
+                    return conn
+            if self._size < self.maxconn:
+                self._size += 1
+                try:
+                    return await self.run(self._open)
+                except BaseException:
+                    self._release_slot()
+                    raise
+        if self.waiting >= self.max_waiting:
+            raise PoolFull(f"{self.max_waiting} callers are already waiting for a connection")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            done, _ = await asyncio.wait({fut}, timeout=timeout)
+        except asyncio.CancelledError:
+            self._abandon(fut)
+            raise
+        if not done:
+            self._abandon(fut)
+            raise PoolTimeout(f"could not get a connection within {timeout} seconds")
+        return fut.result()
+
+    def _abandon(self, fut):
+        # the connection may have been handed over just as the waiter gave up
+        if fut.done() and not fut.cancelled() and fut.exception() is None:
+            self.putconn(fut.result())
+        else:
+            fut.cancel()
+
+    def putconn(self, conn, close: bool = False):
+        """Returns a connection to the pool, handing it straight to the next waiter."""
+        if self._closed or close or conn.closed:
+            self._discard(conn, "closed" if self._closed else "broken")
+            return
+        if self._expired(conn, time.monotonic()):
+            self._discard(conn, "expired")
+            return
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(conn)
+                return
+        self._add_idle(conn)
+
+    def _release_slot(self):
+        self._size -= 1
+        if self._closed:
+            return
+        # a slot was freed, open a replacement connection for the first waiter
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._size += 1
+                asyncio.ensure_future(self._open_for(fut))
+                return
+
+    async def _open_for(self, fut):
+        try:
+            conn = await self.run(self._open)
+        except Exception as e:
+            self._size -= 1
+            if not fut.done():
+                fut.set_exception(e)
+            return
+        if fut.done():
+            self.putconn(conn)
+        else:
+            fut.set_result(conn)
+
+    @asynccontextmanager
+    async def connection(self, timeout: float | None = None):
+        """Checks out a connection and returns it when the block exits.
+
+        A connection left inside a transaction is rolled back before it is reused.
+        """
+        conn = await self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    await self.run(conn.rollback)
+                except Exception:
+                    self.putconn(conn, close=True)
+                    conn = None
+            if conn is not None:
+                self.putconn(conn)
+
+    async def run_with_retry(self, func, *args, retries: int = 1, timeout: float | None = None, **kwargs):
+        """Checks out a connection and runs func(conn, *args, **kwargs) on the executor.
+
+        If the connection breaks during the call it is discarded and the call is repeated
+        on another one, up to retries times. Only use this for calls that are safe to
+        repeat, e.g. reads; a write may have been committed just before the connection broke.
+        """
+        for attempt in range(retries + 1):
+            async with self.connection(timeout) as conn:
+                try:
+                    return await self.run(func, conn, *args, **kwargs)
+                except Exception as e:
+                    if attempt == retries or not is_broken(e, conn):
+                        raise
+                    self.stats["retries"] += 1
+
+    async def warm_up(self, count: int | None = None) -> int:
+        """Opens connections in parallel until the pool holds count (default warmup); returns how many."""
+        missing = min(self.maxconn, self.warmup if count is None else count) - self._size
+        if missing <= 0 or self._closed:
+            return 0
+        self._size += missing
+        results = await asyncio.gather(*(self.run(self._open) for _ in range(missing)), return_exceptions=True)
+        opened = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                self._release_slot()
+            else:
+                self.putconn(result)
+                opened += 1
+        return opened
+
+    async def maintain(self):
+        """One housekeeping pass over the idle connections.
+
+        Closes expired connections and those idle for more than max_idle beyond the warm-up
+        size, pings the rest once they are check_after seconds past their last check, then
+        tops the pool back up to the warm-up size.
+        """
+        now = time.monotonic()
+        keep, check = [], []
+        surplus = self._size - self.warmup
+        while self._idle:
+            conn, since, verified = self._idle.popleft()
+            if conn.closed:
+                self._discard(conn, "broken")
+            elif self._expired(conn, now):
+                self._discard(conn, "expired")
+            elif surplus > 0 and self.max_idle is not None and now - since > self.max_idle:
+                self._discard(conn, "idle_closed")
+                surplus -= 1
+            elif now - verified > self.check_after:
+                check.append((conn, since))
+            else:
+                keep.append((conn, since, verified))
+        # nothing was awaited, so no caller saw the deque empty; keep the original order
+        self._idle.extendleft(reversed(keep))
+        for conn, since in check:
+            self.stats["pings"] += 1
+            try:
+                await self.run(ping, conn)
+            except Exception:
+                self._discard(conn, "broken")
+                continue
+            if self._closed:
+                conn.close()
+                continue
+            # back at the cold end, keeping its idle time, unless a caller is waiting for it
+            waiter = next((fut for fut in self._waiters if not fut.done()), None)
+            if waiter is not None:
+                self._waiters.remove(waiter)
+                waiter.set_result(conn)
+            else:
+                self._idle.appendleft((conn, since, time.monotonic()))
+        await self.warm_up()
+
+    async def keep_warm(self, interval: float = 30.0):
+        """Runs maintain() every interval seconds until the pool is closed."""
+        while not self._closed:
+            await asyncio.sleep(interval)
+            try:
+                await self.maintain()
+            except Exception:
+                # the database may be briefly unreachable; try again on the next pass
+                pass
+
+    def closeall(self):
+        """Closes idle connections; checked out connections are closed when returned."""
+        self._closed = True
+        while self._idle:
+            self._idle.popleft()[0].close()
+            self._size -= 1
+        while self._waiters:
+            self._waiters.popleft().cancel()
+        self._executor.shutdown(wait=False)
+
+
+class ValidatingConnectionPool(ThreadedConnectionPool):
+    """psycopg2 ThreadedConnectionPool that checks connections on checkout.
+
+    Drop-in replacement for SimpleConnectionPool/ThreadedConnectionPool in code that calls
+    getconn() and putconn() directly. psycopg2 keeps at most minconn idle connections, so
+    minconn is also the warm-up size. A connection idle for more than check_after seconds
+    is pinged first, and one older than max_lifetime is replaced, so getconn() does not
+    hand out a connection the server closed while it sat idle.
+
+    connect, if given, opens the connections instead of psycopg2.connect(*args, **kwargs);
+    pass get_conn.connect so replacements use a current Entra token rather than the one
+    baked into a connection string.
+    """
+
+    def __init__(self, minconn, maxconn, *args, connect=None, max_lifetime: float | None = 3000.0,
+                 check_after: float = 10.0, **kwargs):
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self._connect_func = connect
+        self._opened_at = {}
+        self._returned_at = {}
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def _connect(self, key=None):
+        if self._connect_func is None:
+            conn = super()._connect(key)
+        else:
+            # same bookkeeping as psycopg2's AbstractConnectionPool._connect
+            conn = self._connect_func()
+            if key is not None:
+                self._used[key] = conn
+                self._rused[id(conn)] = key
+            else:
+                self._pool.append(conn)
+        self._opened_at[id(conn)] = self._returned_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _healthy(self, conn) -> bool:
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self.max_lifetime is not None and now - self._opened_at.get(id(conn), now) > self.max_lifetime:
+            return False
+        if now - self._returned_at.get(id(conn), now) > self.check_after:
+            try:
+                ping(conn)
+            except Exception:
+                return False
+        return True
+
+    def getconn(self, key=None):
+        # at worst every pooled connection is stale, then a new one is opened
+        for _ in range(self.maxconn + 1):
+            conn = super().getconn(key)
+            if self._healthy(conn):
+                return conn
+            self.putconn(conn, key, close=True)
+        return super().getconn(key)
+
+    def putconn(self, conn, key=None, close=False):
+        if close or conn.closed:
+            self._opened_at.pop(id(conn), None)
+            self._returned_at.pop(id(conn), None)
+        else:
+            self._returned_at[id(conn)] = time.monotonic()
+        super().putconn(conn, key, close)
+        if conn.closed:
+            # psycopg2 closes connections returned beyond minconn
+            self._opened_at.pop(id(conn), None)
+            self._returned_at.pop(id(conn), None)
+
+    def run_with_retry(self, func, *args, retries: int = 1, **kwargs):
+        """Runs func(conn, *args, **kwargs) on a pooled connection, retrying on a broken one (reads only)."""
+        for attempt in range(retries + 1):
+            conn = self.getconn()
+            try:
+                return func(conn, *args, **kwargs)
+            except Exception as e:
+                if attempt == retries or not is_broken(e, conn):
+                    raise
+            finally:
+                self.putconn(conn, close=bool(conn.closed))
@@ -0,0 +1,363 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+from semantic_kernel.agents import ChatHistoryAgentThread
+from semantic_kernel.contents import AuthorRole, ChatMessageContent
+
+SUMMARY_PROMPT = (
+    "Summarize the earlier part of this support conversation between a Contoso customer and "
+    "the support agent. Keep customer and product ids, orders, decisions and open questions; "
+    "drop greetings and small talk. Answer with the summary only."
+)
+
+
+class HistoryBackend(ABC):
+    """Append-only message store keyed by (partition, session, sequence number).
+
+    partition is the customer id, which is also the Cosmos DB partition key, so one
+    customer's sessions stay together. Messages are plain dicts (ChatMessageContent.model_dump()).
+    """
+
+    @abstractmethod
+    def append(self, partition: str, session_id: str, start_seq: int, messages: list):
+        """Stores messages with sequence numbers start_seq, start_seq + 1, ..."""
+
+    @abstractmethod
+    def load_tail(self, partition: str, session_id: str, limit: int) -> list:
+        """Returns the last limit (seq, message) pairs, oldest first."""
+
+    @abstractmethod
+    def load_range(self, partition: str, session_id: str, start: int, end: int) -> list:
+        """Returns the (seq, message) pairs with start <= seq < end, oldest first."""
+
+    @abstractmethod
+    def load_summary(self, partition: str, session_id: str):
+        """Returns (summary, upto_seq) or None; the summary covers messages with seq < upto_seq."""
+
+    @abstractmethod
+    def save_summary(self, partition: str, session_id: str, summary: str, upto_seq: int):
+        """Replaces the session's summary with one covering messages with seq < upto_seq."""
+
+
+class SQLiteHistoryBackend(HistoryBackend):
+    """History in a local SQLite file (or ":memory:"), handy for tests and offline runs."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    partition_key TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    PRIMARY KEY (partition_key, session_id, seq)
+                );
+                CREATE TABLE IF NOT EXISTS chat_summaries (
+                    partition_key TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    upto_seq INTEGER NOT NULL,
+                    summary TEXT NOT NULL,
+                    PRIMARY KEY (partition_key, session_id)
+                );
+            """)
+
+    def append(self, partition, session_id, start_seq, messages):
+        rows = [(partition, session_id, start_seq + i, json.dumps(m, default=str)) for i, m in enumerate(messages)]
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO chat_messages VALUES (?, ?, ?, ?)", rows)
+
+    def _select(self, sql, params):
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [(seq, json.loads(message)) for seq, message in rows]
+
+    def load_tail(self, partition, session_id, limit):
+        rows = self._select("SELECT seq, message FROM chat_messages WHERE partition_key = ? AND session_id = ? "
+                            "ORDER BY seq DESC LIMIT ?", (partition, session_id, limit))
+        return rows[::-1]
+
+    def load_range(self, partition, session_id, start, end):
+        return self._select("SELECT seq, message FROM chat_messages WHERE partition_key = ? AND session_id = ? "
+                            "AND seq >= ? AND seq < ? ORDER BY seq", (partition, session_id, start, end))
+
+    def load_summary(self, partition, session_id):
+        with self._lock:
+            return self.conn.execute("SELECT summary, upto_seq FROM chat_summaries WHERE partition_key = ? "
+                                     "AND session_id = ?", (partition, session_id)).fetchone()
+
+    def save_summary(self, partition, session_id, summary, upto_seq):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO chat_summaries VALUES (?, ?, ?, ?)",
+                              (partition, session_id, upto_seq, summary))
+
+
+POSTGRES_HISTORY_SQL = """
+CREATE TABLE IF NOT EXISTS chat_messages (
+    partition_key TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (partition_key, session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS chat_summaries (
+    partition_key TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    upto_seq INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (partition_key, session_id)
+);
+"""
+
+
+class PostgresHistoryBackend(HistoryBackend):
+    """History in two PostgreSQL tables; connect() returns a psycopg2 connection.
+
+    The primary key serves both the tail query (a backward index scan) and appends.
+    """
+
+    def __init__(self, connect):
+        self.connect = connect
+        self._conn = None
+        self._lock = threading.Lock()
+        with self._lock:
+            self._run(lambda curs: curs.execute(POSTGRES_HISTORY_SQL), commit=True)
+
+    def _run(self, func, commit=False):
+        # one connection, serialized; reconnects if the previous one was closed
+        if self._conn is None or self._conn.closed:
+            self._conn = self.connect()
+        try:
+            with self._conn.cursor() as curs:
+                result = func(curs)
+            if commit:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+            return result
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def append(self, partition, session_id, start_seq, messages):
+        from psycopg2.extras import execute_values
+
+        rows = [(partition, session_id, start_seq + i, json.dumps(m, default=str)) for i, m in enumerate(messages)]
+        with self._lock:
+            self._run(lambda curs: execute_values(
+                curs, "INSERT INTO chat_messages (partition_key, session_id, seq, message) VALUES %s "
+                      "ON CONFLICT DO NOTHING", rows), commit=True)
+
+    def _select(self, sql, params):
+        def run(curs):
+            curs.execute(sql, params)
+            return curs.fetchall()
+
+        with self._lock:
+            rows = self._run(run)
+        # psycopg2 already decodes jsonb
+        return [(seq, message) for seq, message in rows]
+
+    def load_tail(self, partition, session_id, limit):
+        rows = self._select("SELECT seq, message FROM chat_messages WHERE partition_key = %s AND session_id = %s "
+                            "ORDER BY seq DESC LIMIT %s", (partition, session_id, limit))
+        return rows[::-1]
+
+    def load_range(self, partition, session_id, start, end):
+        return self._select("SELECT seq, message FROM chat_messages WHERE partition_key = %s AND session_id = %s "
+                            "AND seq >= %s AND seq < %s ORDER BY seq", (partition, session_id, start, end))
+
+    def load_summary(self, partition, session_id):
+        def run(curs):
+            curs.execute("SELECT summary, upto_seq FROM chat_summaries WHERE partition_key = %s AND session_id = %s",
+                         (partition, session_id))
+            return curs.fetchone()
+
+        with self._lock:
+            return self._run(run)
+
+    def save_summary(self, partition, session_id, summary, upto_seq):
+        with self._lock:
+            self._run(lambda curs: curs.execute(
+                "INSERT INTO chat_summaries VALUES (%s, %s, %s, %s) ON CONFLICT (partition_key, session_id) "
+                "DO UPDATE SET upto_seq = EXCLUDED.upto_seq, summary = EXCLUDED.summary",
+                (partition, session_id, upto_seq, summary)), commit=True)
+
+
+class CosmosHistoryBackend(HistoryBackend):
+    """History in a Cosmos DB container partitioned on /customer_id, one small item per message.
+
+    Items are {"id": "<session>:<seq>", "type": "message", ...}; a turn's messages go in
+    one transactional batch when the SDK supports it. Whole-conversation documents written
+    by the earlier version (id == session id) are split into items the first time they are read.
+    """
+
+    def __init__(self, container):
+        self.container = container
+
+    def _item(self, partition, session_id, seq, message):
+        return {"id": f"{session_id}:{seq:08d}", "type": "message", "customer_id": partition,
+                "session_id": session_id, "seq": seq, "message": message}
+
+    def append(self, partition, session_id, start_seq, messages):
+        items = [self._item(partition, session_id, start_seq + i, m) for i, m in enumerate(messages)]
+        if hasattr(self.container, "execute_item_batch"):
+            # a transactional batch holds at most 100 operations
+            for i in range(0, len(items), 100):
+                self.container.execute_item_batch(
+                    [("upsert", (item,)) for item in items[i:i + 100]], partition_key=partition)
+        else:
+            for item in items:
+                self.container.upsert_item(item)
+
+    def _query(self, query, parameters, partition):
+        return list(self.container.query_items(query=query, parameters=parameters, partition_key=partition))
+
+    def load_tail(self, partition, session_id, limit):
+        items = self._query(
+            "SELECT TOP @limit c.seq, c.message FROM c WHERE c.type = 'message' AND c.session_id = @session "
+            "ORDER BY c.seq DESC",
+            [{"name": "@limit", "value": limit}, {"name": "@session", "value": session_id}], partition)
+        if not items:
+            return self._migrate_legacy(partition, session_id)[-limit:]
+        return [(item["seq"], item["message"]) for item in reversed(items)]
+
+    def load_range(self, partition, session_id, start, end):
+        items = self._query(
+            "SELECT c.seq, c.message FROM c WHERE c.type = 'message' AND c.session_id = @session "
+            "AND c.seq >= @start AND c.seq < @end ORDER BY c.seq",
+            [{"name": "@session", "value": session_id}, {"name": "@start", "value": start},
+             {"name": "@end", "value": end}], partition)
+        return [(item["seq"], item["message"]) for item in items]
+
+    def _migrate_legacy(self, partition, session_id):
+        from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+        try:
+            document = self.container.read_item(item=session_id, partition_key=partition)
+        except CosmosResourceNotFoundError:
+            return []
+        messages = document.get("messages", [])
+        if messages:
+            self.append(partition, session_id, 0, messages)
+        self.container.delete_item(item=session_id, partition_key=partition)
+        return list(enumerate(messages))
+
+    def load_summary(self, partition, session_id):
+        from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+        try:
+            item = self.container.read_item(item=f"{session_id}:summary", partition_key=partition)
+        except CosmosResourceNotFoundError:
+            return None
+        return item["summary"], item["upto_seq"]
+
+    def save_summary(self, partition, session_id, summary, upto_seq):
+        self.container.upsert_item({"id": f"{session_id}:summary", "type": "summary", "customer_id": partition,
+                                    "session_id": session_id, "summary": summary, "upto_seq": upto_seq})
+
+
+def chat_service_summarizer(service, settings=None):
+    """Returns a summarizer that asks a chat completion service to condense old turns."""
+    from semantic_kernel.contents import ChatHistory
+
+    async def summarize(previous_summary, messages):
+        history = ChatHistory(system_message=SUMMARY_PROMPT)
+        if previous_summary:
+            history.add_user_message(f"Summary so far: {previous_summary}")
+        for message in messages:
+            if message.role in (AuthorRole.USER, AuthorRole.ASSISTANT) and message.content:
+                history.add_user_message(f"{message.role.value}: {message.content}")
+        if settings is None:
+            from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+            result = await service.get_chat_message_content(history, PromptExecutionSettings())
+        else:
+            result = await service.get_chat_message_content(history, settings)
+        return str(result)
+
+    return summarize
+
+
+class IncrementalChatHistory(ChatHistoryAgentThread):
+    """Agent thread whose history is persisted one message at a time.
+
+    store_history() only appends the messages added since the last call, so a turn costs
+    the same however long the conversation is; call it after every turn. read_history()
+    loads the last `tail` messages, preceded by the stored summary of older turns when
+    there is one (and by any messages after the summary that are older than the tail). With a summarizer (an async (previous_summary, messages) -> str, see
+    chat_service_summarizer), messages that fall out of the tail are folded into the
+    summary once summarize_every of them have accumulated.
+    """
+
+    def __init__(self, session_id: str, customer_id, backend: HistoryBackend, tail: int = 20,
+                 summarizer=None, summarize_every: int = 20):
+        super().__init__()
+        self.session_id = session_id
+        self.customer_id = customer_id
+        self.backend = backend
+        self.tail = tail
+        self.summarizer = summarizer
+        self.summarize_every = summarize_every
+        self._partition = str(customer_id)
+        self._persisted = 0  # messages in this thread that are already stored (or came from storage)
+        self._next_seq = 0
+        self._summary = None
+
+    async def read_history(self) -> bool:
+        """Loads the summary and the tail of the stored conversation; False if there is none."""
+        call = asyncio.to_thread
+        rows = await call(self.backend.load_tail, self._partition, self.session_id, self.tail)
+        if not rows:
+            print("No chat history for this customer and session_id was retrieved.")
+            return False
+        self._next_seq = rows[-1][0] + 1
+        self._summary = await call(self.backend.load_summary, self._partition, self.session_id)
+        if self._summary and self._summary[1] < rows[0][0]:
+            # messages newer than the summary but older than the tail are in neither; load them too
+            rows = await call(self.backend.load_range, self._partition, self.session_id,
+                              self._summary[1], rows[0][0]) + rows
+        # a tail must not open with tool results or calls whose request was cut off
+        while rows and rows[0][1].get("role") != AuthorRole.USER.value:
+            rows = rows[1:]
+        if self._summary and (not rows or rows[0][0] > 0):
+            await self.on_new_message(ChatMessageContent(
+                role=AuthorRole.SYSTEM, content=f"Summary of the earlier conversation: {self._summary[0]}"))
+        for _, message in rows:
+            await self.on_new_message(ChatMessageContent.model_validate(message))
+        self._persisted = len([m async for m in self.get_messages()])
+        print(f"Loaded the last {len(rows)} messages of this session")
+        return True
+
+    async def store_history(self):
+        """Appends the messages added since the last store."""
+        messages = [msg async for msg in self.get_messages()]
+        new = messages[self._persisted:]
+        if new:
+            await asyncio.to_thread(self.backend.append, self._partition, self.session_id, self._next_seq,
+                                    [m.model_dump() for m in new])
+            self._persisted = len(messages)
+            self._next_seq += len(new)
+        if self.summarizer is not None:
+            await self._maybe_summarize()
+
+    async def _maybe_summarize(self):
+        upto = self._summary[1] if self._summary else 0
+        end = self._next_seq - self.tail
+        if end - upto < self.summarize_every:
+            return
+        rows = await asyncio.to_thread(self.backend.load_range, self._partition, self.session_id, upto, end)
+        # end the summary where a user turn starts, so the messages reloaded after it never
+        # open with tool results or replies that read_history would have to drop
+        turns = [i for i, (_, m) in enumerate(rows) if i and m.get("role") == AuthorRole.USER.value]
+        if turns:
+            end = rows[turns[-1]][0]
+            rows = rows[:turns[-1]]
+        old = [ChatMessageContent.model_validate(m) for _, m in rows]
+        summary = await self.summarizer(self._summary[0] if self._summary else None, old)
+        await asyncio.to_thread(self.backend.save_summary, self._partition, self.session_id, summary, end)
+        self._summary = (summary, end)
@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import time
+
+try:
+    from vector_copy import VECTOR_TABLES, copy_rows
+except ImportError:  # imported as src.embedding_sync from the notebooks
+    from .vector_copy import VECTOR_TABLES, copy_rows
+
+# Embedding table -> (source table, source key column); the embedding table's key column
+# and text column come from VECTOR_TABLES
+SYNC_SOURCES = {
+    "product_desc_ann": ("products", "product_id"),
+    "product_catalogue_vectors": ("product_catalogue", "id"),
+}
+
+# Every insert, delete or description change of a source row appends its key to the queue.
+# The worker re-reads the current row, so the queue only says *which* rows to look at:
+# repeated edits of one row collapse into one embedding, and a change that lands while the
+# row is being processed is a new queue entry for the next batch rather than a lost update.
+SYNC_SETUP_SQL = """
+CREATE SCHEMA IF NOT EXISTS mcp_meta;
+CREATE TABLE IF NOT EXISTS mcp_meta.embedding_queue (
+    change_id BIGSERIAL PRIMARY KEY,
+    source_table TEXT NOT NULL,
+    source_id BIGINT NOT NULL,
+    enqueued_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+CREATE INDEX IF NOT EXISTS embedding_queue_source_idx ON mcp_meta.embedding_queue (source_table, change_id);
+
+CREATE OR REPLACE FUNCTION mcp_meta.enqueue_embedding_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO mcp_meta.embedding_queue (source_table, source_id)
+        VALUES (TG_TABLE_NAME, (to_jsonb(OLD) ->> TG_ARGV[0])::bigint);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND to_jsonb(OLD) ->> TG_ARGV[0] IS DISTINCT FROM to_jsonb(NEW) ->> TG_ARGV[0]) THEN
+        INSERT INTO mcp_meta.embedding_queue (source_table, source_id)
+        VALUES (TG_TABLE_NAME, (to_jsonb(NEW) ->> TG_ARGV[0])::bigint);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+"""
+
+SYNC_TABLE_SQL = """
+-- hash of the text each vector was computed from; the stored description is the source of truth
+ALTER TABLE {target} ADD COLUMN IF NOT EXISTS description_hash BYTEA
+    GENERATED ALWAYS AS (sha256(convert_to(description, 'UTF8'))) STORED;
+CREATE UNIQUE INDEX IF NOT EXISTS {target}_{target_key}_sync_idx ON {target} ({target_key});
+
+DROP TRIGGER IF EXISTS mcp_embedding_queue ON {source};
+CREATE TRIGGER mcp_embedding_queue AFTER INSERT OR DELETE OR UPDATE OF {source_key}, description ON {source}
+    FOR EACH ROW EXECUTE FUNCTION mcp_meta.enqueue_embedding_change('{source_key}');
+"""
+
+# Source rows whose vector is missing or was computed from a different description, and
+# vectors whose source row is gone
+STALE_QUERY = """
+SELECT s.{source_key} FROM {source} s
+LEFT JOIN {target} t ON t.{target_key} = s.{source_key}
+WHERE s.description IS NOT NULL
+  AND t.description_hash IS DISTINCT FROM sha256(convert_to(s.description, 'UTF8'))
+UNION ALL
+SELECT t.{target_key} FROM {target} t
+WHERE NOT EXISTS (SELECT 1 FROM {source} s WHERE s.{source_key} = t.{target_key} AND s.description IS NOT NULL)
+"""
+
+CLAIM_QUERY = """
+SELECT change_id, source_id, enqueued_at FROM mcp_meta.embedding_queue
+WHERE source_table = %s
+ORDER BY change_id
+LIMIT %s
+FOR UPDATE SKIP LOCKED
+"""
+
+CHANGED_ROWS_QUERY = """
+SELECT s.{source_key}, s.description FROM {source} s
+LEFT JOIN {target} t ON t.{target_key} = s.{source_key}
+WHERE s.{source_key} = ANY(%s) AND s.description IS NOT NULL
+  AND t.description_hash IS DISTINCT FROM sha256(convert_to(s.description, 'UTF8'))
+"""
+
+DELETE_VECTORS_SQL = """
+DELETE FROM {target} t
+WHERE t.{target_key} = ANY(%s)
+  AND NOT EXISTS (SELECT 1 FROM {source} s WHERE s.{source_key} = t.{target_key} AND s.description IS NOT NULL)
+"""
+
+# A re-embedded row also gets a new vector_id: readers that sync incrementally by vector_id
+# (LocalVectorIndex.sync) pick it up as a new row and keep only the newest row per product
+UPSERT_SQL = """
+INSERT INTO {target} ({target_key}, description, embedding)
+SELECT {target_key}, description, embedding FROM embedding_sync_stage
+ON CONFLICT ({target_key}) DO UPDATE
+SET description = EXCLUDED.description, embedding = EXCLUDED.embedding, vector_id = DEFAULT
+"""
+
+LAG_QUERY = """
+SELECT count(*), count(DISTINCT source_id), extract(epoch FROM clock_timestamp() - min(enqueued_at))
+FROM mcp_meta.embedding_queue WHERE source_table = %s
+"""
+
+
+def install_sync(conn, target: str):
+    """Adds the hash column, the unique key for upserts and the queue trigger for one embedding table.
+
+    Foreign keys from the embedding table to its source are switched to ON DELETE CASCADE,
+    otherwise deleting a product would fail while its vector still exists.
+    """
+    source, source_key = SYNC_SOURCES[target]
+    target_key = VECTOR_TABLES[target][0]
+    with conn.cursor() as cur:
+        cur.execute(SYNC_SETUP_SQL)
+        cur.execute(SYNC_TABLE_SQL.format(target=target, target_key=target_key, source=source, source_key=source_key))
+        cur.execute("""
+            SELECT conname FROM pg_constraint
+            WHERE contype = 'f' AND conrelid = %s::regclass AND confrelid = %s::regclass AND confdeltype <> 'c'
+        """, (target, source))
+        for (name,) in cur.fetchall():
+            cur.execute(f'ALTER TABLE {target} DROP CONSTRAINT "{name}", ADD CONSTRAINT "{name}" '
+                        f'FOREIGN KEY ({target_key}) REFERENCES {source} ({source_key}) ON DELETE CASCADE')
+    conn.commit()
+
+
+class EmbeddingSync:
+    """Keeps an embedding table in step with its source table, one bounded batch at a time.
+
+    Each batch claims up to batch_size queue entries with FOR UPDATE SKIP LOCKED, so several
+    workers can run side by side. Only rows whose description hash differs from the stored
+    vector's are embedded (through the EmbeddingPipeline, so retries and the disk cache
+    apply); they are staged with a binary COPY and upserted, with a new vector_id for rows
+    that are re-embedded, so every change is visible to readers syncing on vector_id.
+    Vectors of deleted products are removed. The claimed entries are deleted in the same transaction as the vector changes,
+    so a failed batch is simply retried.
+    """
+
+    def __init__(self, conn, target: str, pipeline, batch_size: int = 256):
+        self.conn = conn
+        self.target = target
+        self.pipeline = pipeline
+        self.batch_size = batch_size
+        source, source_key = SYNC_SOURCES[target]
+        self._names = {"target": target, "target_key": VECTOR_TABLES[target][0],
+                       "source": source, "source_key": source_key}
+        self.source = source
+        self.stats = {"batches": 0, "changes": 0, "embedded": 0, "unchanged": 0, "deleted": 0,
+                      "last_batch_seconds": 0.0, "last_lag_seconds": 0.0}
+
+    def _sql(self, template: str) -> str:
+        return template.format(**self._names)
+
+    def enqueue_stale(self) -> int:
+        """Queues every row that is out of step, e.g. after install_sync on a populated table."""
+        with self.conn.cursor() as cur:
+            cur.execute(f"INSERT INTO mcp_meta.embedding_queue (source_table, source_id) "
+                        f"SELECT %s, k FROM ({self._sql(STALE_QUERY)}) stale (k)", (self.source,))
+            count = cur.rowcount
+        self.conn.commit()
+        return count
+
+    async def sync_once(self) -> int:
+        """Processes one batch; returns the number of queue entries consumed (0 when idle)."""
+        start = time.perf_counter()
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(CLAIM_QUERY, (self.source, self.batch_size))
+                claimed = cur.fetchall()
+                if not claimed:
+                    self.conn.rollback()
+                    return 0
+                ids = sorted({source_id for _, source_id, _ in claimed})
+                cur.execute(self._sql(CHANGED_ROWS_QUERY), (ids,))
+                changed = cur.fetchall()
+                if changed:
+                    embeddings = await self.pipeline.embed([description for _, description in changed])
+                    cur.execute("CREATE TEMP TABLE IF NOT EXISTS embedding_sync_stage "
+                                "(" + self._names["target_key"] + " BIGINT, description TEXT, embedding vector) "
+                                "ON COMMIT DELETE ROWS")
+                    copy_rows(cur, "embedding_sync_stage", (self._names["target_key"], "description", "embedding"),
+                              ("int8", "text", "vector"),
+                              ((key, description, vector) for (key, description), vector in zip(changed, embeddings)))
+                    cur.execute(self._sql(UPSERT_SQL))
+                cur.execute(self._sql(DELETE_VECTORS_SQL), (ids,))
+                deleted = cur.rowcount
+                cur.execute("DELETE FROM mcp_meta.embedding_queue WHERE change_id = ANY(%s)",
+                            ([change_id for change_id, _, _ in claimed],))
+                cur.execute("SELECT extract(epoch FROM clock_timestamp() - %s::timestamptz)",
+                            (min(enqueued_at for _, _, enqueued_at in claimed),))
+                lag = float(cur.fetchone()[0])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.stats["batches"] += 1
+        self.stats["changes"] += len(claimed)
+        self.stats["embedded"] += len(changed)
+        self.stats["unchanged"] += len(ids) - len(changed) - deleted
+        self.stats["deleted"] += deleted
+        self.stats["last_batch_seconds"] = round(time.perf_counter() - start, 3)
+        self.stats["last_lag_seconds"] = round(lag, 3)
+        return len(claimed)
+
+    async def run(self, max_batches: int | None = None) -> dict:
+        """Processes batches until the queue is empty (or max_batches); returns stats."""
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            if not await self.sync_once():
+                break
+            batches += 1
+        return self.stats
+
+    async def run_forever(self, poll_interval: float = 5.0):
+        """Drains the queue, then polls it every poll_interval seconds."""
+        while True:
+            await self.run()
+            await asyncio.sleep(poll_interval)
+
+    def lag(self) -> dict:
+        """Queue depth and age: pending changes, distinct rows, and seconds since the oldest change."""
+        with self.conn.cursor() as cur:
+            cur.execute(LAG_QUERY, (self.source,))
+            pending, rows, oldest = cur.fetchone()
+        self.conn.rollback()
+        return {"pending_changes": pending, "pending_rows": rows,
+                "oldest_change_seconds": round(float(oldest), 3) if oldest is not None else 0.0}
+
+
+if __name__ == "__main__":
+    import os
+
+    from embeddings import EmbeddingPipeline, FakeEmbeddingService
+    from get_conn import connect
+
+    parser = argparse.ArgumentParser(description="Embed new and changed product descriptions.")
+    parser.add_argument("--table", choices=sorted(SYNC_SOURCES), default="product_catalogue_vectors")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--install", action="store_true", help="Install the trigger and queue all stale rows first.")
+    parser.add_argument("--watch", type=float, help="Keep polling the queue every WATCH seconds.")
+    parser.add_argument("--fake", action="store_true", help="Use the deterministic local embedding service.")
+    args = parser.parse_args()
+
+    if args.fake:
+        # fake vectors get their own cache key, so they never end up in the real model's cache
+        service, model = FakeEmbeddingService(), "fake"
+    else:
+        from semantic_kernel.connectors.ai.open_ai import AzureTextEmbedding
+        service = AzureTextEmbedding(deployment_name="text-embedding-ada-002", api_key=os.getenv("AZURE_OPENAI_KEY"),
+                                     endpoint=os.getenv("AZURE_OPENAI_EMBED_ENDPOINT"),
+                                     base_url=os.getenv("AZURE_OPENAI_BASE_EMBED_URL"))
+        model = "text-embedding-ada-002"
+    pipeline = EmbeddingPipeline(service, model=model, cache_dir=".embedding_cache")
+
+    conn = connect()
+    sync = EmbeddingSync(conn, args.table, pipeline, args.batch_size)
+    if args.install:
+        install_sync(conn, args.table)
+        print(f"Queued {sync.enqueue_stale()} stale rows")
+    print(f"Lag before: {sync.lag()}")
+    if args.watch:
+        asyncio.run(sync.run_forever(args.watch))
+    print(f"Sync: {asyncio.run(sync.run())}")
+    print(f"Lag after: {sync.lag()}")
+    conn.close()
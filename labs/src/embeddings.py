@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import os
+import random
+import threading
+
+import numpy as np
+
+
+def text_key(model: str, text: str) -> bytes:
+    """Content address of an embedding: sha256 over the model name and the text."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Append-only on-disk store of float32 embeddings keyed by model + text hash.
+
+    Vectors are kept as raw float32 rows in vectors.f32 and their 32-byte keys, in the
+    same order, in keys.bin. Rows are only ever appended, and vectors are written before
+    keys, so an interrupted write leaves at most an unindexed tail, which is cut off when
+    the cache is next opened so the next append lines up with its keys again.
+    """
+
+    KEY_SIZE = 32
+
+    def __init__(self, cache_dir: str, model: str, dim: int):
+        self.model = model
+        self.dim = dim
+        self.path = os.path.join(cache_dir, f"{model}-{dim}")
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._keys_path = os.path.join(self.path, "keys.bin")
+        self._lock = threading.Lock()
+        self._index = {}
+        self._rows = None
+        self._load()
+
+    def _load(self):
+        keys = b""
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, "rb") as f:
+                keys = f.read()
+        vector_bytes = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        count = min(len(keys) // self.KEY_SIZE, vector_bytes // (self.dim * 4))
+        # drop any tail left behind by an interrupted put_many
+        for path, size in ((self._keys_path, count * self.KEY_SIZE), (self._vectors_path, count * self.dim * 4)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+        self._index = {keys[i * self.KEY_SIZE:(i + 1) * self.KEY_SIZE]: i for i in range(count)}
+        self._count = count
+        self._rows = None
+
+    def _matrix(self):
+        if self._rows is None and self._count:
+            self._rows = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                   shape=(self._count, self.dim))
+        return self._rows
+
+    def __len__(self):
+        return self._count
+
+    def get_many(self, keys):
+        """Returns {position: vector} for the keys that are cached."""
+        with self._lock:
+            found = {i: self._index[k] for i, k in enumerate(keys) if k in self._index}
+            if not found:
+                return {}
+            rows = self._matrix()
+            return {i: np.array(rows[row]) for i, row in found.items()}
+
+    def put_many(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            new = [(k, v) for k, v in zip(keys, vectors) if k not in self._index]
+            if not new:
+                return
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.stack([v for _, v in new]).tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(k for k, _ in new))
+            for k, _ in new:
+                self._index[k] = self._count
+                self._count += 1
+            # the memory map has a fixed length, reopen it on the next read
+            self._rows = None
+
+
+class RateLimitedError(Exception):
+    """429-style error raised by FakeEmbeddingService."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.status_code = 429
+        self.retry_after = retry_after
+
+
+class FakeEmbeddingService:
+    """Deterministic local stand-in for an embedding deployment, for offline runs and benchmarks.
+
+    The same text always maps to the same unit vector. rate_limit_every makes every n-th
+    call fail with a 429-style error so retry handling can be exercised.
+    """
+
+    def __init__(self, dim: int = 1536, latency: float = 0.0, rate_limit_every: int = 0):
+        self.dim = dim
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def embed_one(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    async def generate_embeddings(self, texts, **kwargs) -> np.ndarray:
+        self.calls += 1
+        call = self.calls
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit_every and call % self.rate_limit_every == 0:
+            raise RateLimitedError("429 Too Many Requests (fake)", retry_after=0.01)
+        self.texts_embedded += len(texts)
+        return np.stack([self.embed_one(t) for t in texts])
+
+
+def _rate_limit_delay(exc):
+    """Returns (is_rate_limited, server suggested delay) by walking the exception chain."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+        if status == 429 or type(exc).__name__ == "RateLimitError" or "429" in str(exc):
+            delay = getattr(exc, "retry_after", None)
+            headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+            if delay is None and headers.get("retry-after"):
+                try:
+                    delay = float(headers["retry-after"])
+                except ValueError:
+                    delay = None
+            return True, delay
+        exc = exc.__cause__ or exc.__context__
+    return False, None
+
+
+class EmbeddingPipeline:
+    """Batched, concurrent and cached front end for an embedding service.
+
+    Texts are de-duplicated and looked up in the on-disk cache first; the rest are sent
+    in multi-input calls of batch_size texts, with at most max_concurrency calls in flight.
+    Rate-limited calls are retried with exponential backoff (honouring retry-after when
+    the service provides it). The pipeline has the same generate_embeddings coroutine as
+    Semantic Kernel's embedding services, so it can be used in their place.
+    """
+
+    def __init__(self, service, model: str, dim: int = 1536, cache_dir: str | None = None,
+                 batch_size: int = 16, max_concurrency: int = 4, max_retries: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.service = service
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cache = EmbeddingCache(cache_dir, model, dim) if cache_dir else None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.stats = {"requested": 0, "cache_hits": 0, "embedded": 0, "calls": 0, "retries": 0}
+
+    async def _call(self, texts):
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    self.stats["calls"] += 1
+                    vectors = await self.service.generate_embeddings(texts)
+                return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+            except Exception as e:
+                rate_limited, delay = _rate_limit_delay(e)
+                if not rate_limited or attempt >= self.max_retries:
+                    raise
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                attempt += 1
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+
+    async def embed(self, texts) -> np.ndarray:
+        """Embeds texts, returning an (n, dim) float32 matrix in input order."""
+        texts = list(texts)
+        self.stats["requested"] += len(texts)
+        result = np.empty((len(texts), self.dim), dtype=np.float32)
+        positions = {}
+        for i, text in enumerate(texts):
+            positions.setdefault(text, []).append(i)
+        unique = list(positions)
+        keys = [text_key(self.model, t) for t in unique]
+
+        cached = self.cache.get_many(keys) if self.cache is not None else {}
+        self.stats["cache_hits"] += len(cached)
+        for i, vector in cached.items():
+            result[positions[unique[i]]] = vector
+
+        async def embed_batch(batch):
+            vectors = await self._call([unique[i] for i in batch])
+            for i, vector in zip(batch, vectors):
+                result[positions[unique[i]]] = vector
+            # cache each batch as soon as it lands, so a failed run keeps its progress
+            if self.cache is not None:
+                self.cache.put_many([keys[i] for i in batch], vectors)
+            self.stats["embedded"] += len(batch)
+
+        missing = [i for i in range(len(unique)) if i not in cached]
+        await asyncio.gather(*(embed_batch(missing[i:i + self.batch_size])
+                               for i in range(0, len(missing), self.batch_size)))
+        return result
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        """Embeds a single search question through the same cache."""
+        return (await self.embed([text]))[0]
+
+    async def generate_embeddings(self, texts, **kwargs) -> np.ndarray:
+        return await self.embed(texts)
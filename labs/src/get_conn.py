@@ -1,9 +1,147 @@
 import urllib.parse
 import os
-from azure.identity import DefaultAzureCredential
+import logging
+import threading
+import time
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
+logger = logging.getLogger(__name__)
+
+# Scope requested when fetching tokens for Azure Database for PostgreSQL
+AAD_SCOPE = "https://ossrdbms-aad.database.windows.net/.default"
+
+# libpq TCP keepalives: a connection dropped by the network or a server failover is noticed
+# within about a minute instead of the OS default of hours, and idle sessions keep traffic flowing
+KEEPALIVES = {"keepalives": 1, "keepalives_idle": 30, "keepalives_interval": 10, "keepalives_count": 3}
+
+
+class EntraTokenProvider:
+    """Caches a Microsoft Entra access token and refreshes it ahead of expiry.
+
+    One credential is reused for the lifetime of the provider, so the credential chain
+    is only walked on the first fetch and on refreshes. Calling the provider returns the
+    token string, which makes it usable as a password callback for new connections.
+    """
+
+    def __init__(self, credential=None, scope: str = AAD_SCOPE, expiry_margin: float = 60,
+                 refresh_ahead: float = 300, background_refresh: bool = True, clock=time.time):
+        self.scope = scope
+        # a cached token is never handed out within expiry_margin seconds of expiring
+        self.expiry_margin = expiry_margin
+        # the background refresh fires refresh_ahead seconds before the token expires
+        self.refresh_ahead = refresh_ahead
+        self.background_refresh = background_refresh
+        self._credential = credential
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._token = None
+        self._timer = None
+        self.fetch_count = 0
+
+    @property
+    def credential(self):
+        if self._credential is None:
+            # azure.identity is slow to import, so it is only loaded when a token is needed
+            from azure.identity import DefaultAzureCredential
+
+            self._credential = DefaultAzureCredential()
+        return self._credential
+
+    @property
+    def expires_on(self):
+        """Expiry (epoch seconds) of the cached token, or None if nothing is cached."""
+        token = self._token
+        return token.expires_on if token is not None else None
+
+    def _is_fresh(self, token) -> bool:
+        return token is not None and self._clock() < token.expires_on - self.expiry_margin
+
+    def get_token(self) -> str:
+        """Returns a valid access token, fetching a new one only when the cached one is stale."""
+        token = self._token
+        if self._is_fresh(token):
+            return token.token
+        with self._lock:
+            # another thread may have refreshed the token while we waited for the lock
+            if not self._is_fresh(self._token):
+                self._refresh_locked()
+            return self._token.token
+
+    def __call__(self) -> str:
+        return self.get_token()
+
+    def _refresh_locked(self):
+        token = self.credential.get_token(self.scope)
+        self.fetch_count += 1
+        self._token = token
+        self._schedule_refresh(token.expires_on)
+
+    def _schedule_refresh(self, expires_on):
+        if not self.background_refresh:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        delay = expires_on - self.refresh_ahead - self._clock()
+        if delay <= 0:
+            # token lifetime is shorter than the refresh window, refresh on demand instead
+            return
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            with self._lock:
+                self._refresh_locked()
+        except Exception as e:
+            # keep serving the cached token, the next stale read retries in the foreground
+            logger.warning(f"Background token refresh failed: {e}")
+
+    def close(self):
+        """Stops the background refresh timer."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+_token_provider = None
+_token_provider_lock = threading.Lock()
+
+
+def get_token_provider() -> EntraTokenProvider:
+    """Returns the process-wide token provider, creating it on first use."""
+    global _token_provider
+    if _token_provider is None:
+        with _token_provider_lock:
+            if _token_provider is None:
+                _token_provider = EntraTokenProvider()
+    return _token_provider
+
+
+def get_connection_params() -> dict:
+    """Reads the connection parameters (without password) from the environment."""
+    return {
+        "host": os.getenv('POSTGRES_HOST'),
+        "port": os.getenv('POSTGRES_PORT'),
+        "dbname": os.getenv('POSTGRES_DB'),
+        "user": os.getenv('POSTGRES_USER'),
+        "sslmode": os.getenv('SSLMODE'),
+    }
+
+
+def connect(**kwargs):
+    """Opens a psycopg2 connection, using the cached Entra token as the password."""
+    import psycopg2
+
+    params = {**get_connection_params(), **KEEPALIVES}
+    params.update(kwargs)
+    params["password"] = get_token_provider()()
+    return psycopg2.connect(**params)
+
+
 # for help to enable Microsoft Entra ID authentication for Azure Database for PostgreSQL, see:
 # https://learn.microsoft.com/en-us/azure/postgresql/flexible-server/how-to-configure-sign-in-azure-ad-authentication
 def get_connection_uri():
@@ -13,23 +151,20 @@ def get_connection_uri():
     dbname = os.getenv('POSTGRES_DB')
     dbuser = urllib.parse.quote(os.getenv('POSTGRES_USER'))
     sslmode = os.getenv('SSLMODE')
-    dbport = os.getenv('POSTGRES_PORT') 
-
-    # Use passwordless authentication via DefaultAzureCredential.
-    # IMPORTANT! This code is for demonstration purposes only. DefaultAzureCredential() is invoked on every call.
-    # In practice, it's better to persist the credential across calls and reuse it so you can take advantage of token
-    # caching and minimize round trips to the identity provider. To learn more, see:
-    # https://github.com/Azure/azure-sdk-for-python/blob/main/sdk/identity/azure-identity/TOKEN_CACHING.md 
-    credential = DefaultAzureCredential()
-
-    # Call get_token() to get a token from Microsft Entra ID and add it as the password in the URI.
-    # Note the requested scope parameter in the call to get_token, "https://ossrdbms-aad.database.windows.net/.default".
-    password = credential.get_token("https://ossrdbms-aad.database.windows.net/.default").token
+    dbport = os.getenv('POSTGRES_PORT')
+
+    # Use passwordless authentication via a process-wide token provider. The provider persists
+    # the DefaultAzureCredential across calls and caches the token until shortly before it expires,
+    # so repeated calls don't round trip to the identity provider. To learn more, see:
+    # https://github.com/Azure/azure-sdk-for-python/blob/main/sdk/identity/azure-identity/TOKEN_CACHING.md
+    # Note the requested scope, "https://ossrdbms-aad.database.windows.net/.default" (see AAD_SCOPE).
+    password = get_token_provider().get_token()
     password_encoded = urllib.parse.quote_plus(password)
 
-    db_uri = f"postgresql://{dbuser}:{password_encoded}@{dbhost}:{dbport}/{dbname}?sslmode={sslmode}"
+    keepalives = urllib.parse.urlencode(KEEPALIVES)
+    db_uri = f"postgresql://{dbuser}:{password_encoded}@{dbhost}:{dbport}/{dbname}?sslmode={sslmode}&{keepalives}"
     print("Connection uri was rertieved successfully.")
     return db_uri
 
 # if __name__ == "__main__":
-#     print(get_connection_uri())
\ No newline at end of file
+#     print(get_connection_uri())
@@ -0,0 +1,160 @@
+import re
+from typing import Annotated
+
+from semantic_kernel.functions import kernel_function
+
+try:
+    from get_conn import connect
+    from async_pool import AsyncConnectionPool
+except ImportError:  # imported as src.hybrid_search from the notebooks
+    from .get_conn import connect
+    from .async_pool import AsyncConnectionPool
+
+# For catalogues created before search_tsv was part of product_catalogue.sql
+HYBRID_SEARCH_SETUP_SQL = """
+ALTER TABLE product_catalogue ADD COLUMN IF NOT EXISTS search_tsv tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english'::regconfig, coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english'::regconfig, coalesce(category, '')), 'B') ||
+    setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'C')
+) STORED;
+CREATE INDEX IF NOT EXISTS product_catalogue_search_tsv_idx ON product_catalogue USING gin (search_tsv);
+"""
+
+# Both branches rank their own candidates; the fused score is sum(1 / (rrf_k + rank)) over
+# the branches a product appears in. {filters} is spliced into both branches so category
+# and price limits are applied during each scan rather than after fusion.
+HYBRID_SEARCH_SQL = """
+WITH lexical AS (
+    SELECT id, row_number() OVER (ORDER BY score DESC, id) AS rank
+    FROM (
+        SELECT p.id, ts_rank_cd(p.search_tsv, q.query) AS score
+        FROM product_catalogue p,
+             -- match any of the words' lexemes (agents pass whole questions), ranking docs matching
+             -- more of them, and closer together, higher; -word excludes docs containing word
+             (SELECT (SELECT string_agg(quote_literal(l), ' | ')
+                      FROM unnest(tsvector_to_array(to_tsvector('english', %(terms)s))) l)::tsquery,
+                     (SELECT string_agg(quote_literal(l), ' | ')
+                      FROM unnest(tsvector_to_array(to_tsvector('english', %(excluded)s))) l)::tsquery
+             ) AS q(query, excluded)
+        WHERE p.search_tsv @@ q.query AND NOT coalesce(p.search_tsv @@ q.excluded, false){filters}
+        ORDER BY score DESC
+        LIMIT %(candidates)s
+    ) l
+),
+semantic AS (
+    SELECT id, row_number() OVER (ORDER BY distance, id) AS rank
+    FROM (
+        SELECT v.id, v.embedding <=> %(embedding)s::vector AS distance
+        FROM product_catalogue_vectors v
+        JOIN product_catalogue p ON p.id = v.id
+        WHERE true{filters}
+        ORDER BY v.embedding <=> %(embedding)s::vector
+        LIMIT %(candidates)s
+    ) s
+),
+fused AS (
+    SELECT coalesce(l.id, s.id) AS id,
+           (coalesce(1.0 / (%(rrf_k)s + l.rank), 0) + coalesce(1.0 / (%(rrf_k)s + s.rank), 0))::float8 AS score,
+           l.rank AS lexical_rank,
+           s.rank AS semantic_rank
+    FROM lexical l
+    FULL OUTER JOIN semantic s ON s.id = l.id
+)
+SELECT p.id, p.name, p.category, p.price, p.description, f.score, f.lexical_rank, f.semantic_rank
+FROM fused f
+JOIN product_catalogue p ON p.id = f.id
+ORDER BY f.score DESC, f.id
+LIMIT %(limit)s
+"""
+
+RESULT_COLUMNS = ("id", "name", "category", "price", "description", "score", "lexical_rank", "semantic_rank")
+
+
+def install_hybrid_search(conn):
+    """Adds the generated search_tsv column and its GIN index to an existing product_catalogue."""
+    with conn.cursor() as cur:
+        cur.execute(HYBRID_SEARCH_SETUP_SQL)
+    conn.commit()
+
+
+def build_hybrid_query(category=None, min_price=None, max_price=None):
+    """Returns the hybrid search statement with the requested filters and their parameters."""
+    filters = []
+    params = {}
+    if category:
+        filters.append("p.category = %(category)s")
+        params["category"] = category
+    if min_price is not None:
+        filters.append("p.price >= %(min_price)s")
+        params["min_price"] = min_price
+    if max_price is not None:
+        filters.append("p.price <= %(max_price)s")
+        params["max_price"] = max_price
+    # filters are only added when set, so the planner never sees "x IS NULL OR ..." predicates
+    clause = "".join(f" AND {f}" for f in filters)
+    return HYBRID_SEARCH_SQL.format(filters=clause), params
+
+
+def split_query(query: str) -> tuple[str, str]:
+    """Splits a websearch-style query into (words to match, words to exclude).
+
+    A word or "quoted phrase" written with a leading - is excluded, as in websearch_to_tsquery.
+    """
+    terms, excluded = [], []
+    for token in re.findall(r'-?"[^"]*"?|\S+', query):
+        if token.startswith("-") and len(token) > 1:
+            excluded.append(token[1:].strip('"'))
+        else:
+            terms.append(token.strip('"'))
+    return " ".join(terms), " ".join(excluded)
+
+
+def hybrid_search(conn, query: str, embedding, limit: int = 10, category=None, min_price=None,
+                  max_price=None, candidates: int = 50, rrf_k: int = 60) -> list[dict]:
+    """Runs full-text and vector search over product_catalogue in one statement, fused with RRF."""
+    sql, params = build_hybrid_query(category, min_price, max_price)
+    terms, excluded = split_query(query)
+    params.update({
+        "terms": terms,
+        "excluded": excluded,
+        "embedding": "[" + ",".join(str(float(x)) for x in embedding) + "]",
+        "candidates": max(candidates, limit),
+        "rrf_k": rrf_k,
+        "limit": limit,
+    })
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    conn.rollback()
+    return [dict(zip(RESULT_COLUMNS, row)) for row in rows]
+
+
+class ProductSearchPlugin:
+    """Kernel functions for searching product_catalogue.
+
+    embedding_service is anything with an async generate_embeddings(texts) (an SK
+    embedding service or an EmbeddingPipeline).
+    """
+
+    def __init__(self, embedding_service, pool=None):
+        self.embedding_service = embedding_service
+        self.pool = pool or AsyncConnectionPool(connect=connect, minconn=1, maxconn=4)
+
+    @kernel_function
+    async def search_products(
+        self,
+        query: Annotated[str, "What the user is looking for, in their own words."],
+        category: Annotated[str | None, "Only return products in this category, e.g. 'GPS Watch'."] = None,
+        min_price: Annotated[float | None, "Lowest acceptable price."] = None,
+        max_price: Annotated[float | None, "Highest acceptable price."] = None,
+        limit: Annotated[int, "Number of products to return."] = 5,
+    ) -> list[dict]:
+        """Finds products matching a question by combining keyword and semantic search in one query."""
+        embedding = (await self.embedding_service.generate_embeddings([query]))[0]
+        try:
+            # a search is safe to repeat on another connection if this one turns out to be broken
+            return await self.pool.run_with_retry(hybrid_search, query, embedding, limit,
+                                                  category, min_price, max_price)
+        except Exception as e:
+            print(f"Could not search products: {e}")
+            return []
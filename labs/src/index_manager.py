@@ -0,0 +1,270 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Every build is recorded here, so build times can be compared as the catalogue grows
+INDEX_BUILD_LOG_SQL = """
+CREATE SCHEMA IF NOT EXISTS mcp_meta;
+CREATE TABLE IF NOT EXISTS mcp_meta.index_builds (
+    build_id BIGSERIAL PRIMARY KEY,
+    index_name TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    definition TEXT NOT NULL,
+    maintenance_work_mem TEXT,
+    parallel_workers INTEGER,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at TIMESTAMPTZ,
+    seconds DOUBLE PRECISION,
+    index_mb DOUBLE PRECISION,
+    status TEXT NOT NULL DEFAULT 'building',
+    error TEXT
+);
+"""
+
+PROGRESS_QUERY = """
+SELECT phase, blocks_done, blocks_total, tuples_done, tuples_total, lockers_done, lockers_total
+FROM pg_stat_progress_create_index
+WHERE pid = %s
+"""
+
+PROGRESS_COLUMNS = ("phase", "blocks_done", "blocks_total", "tuples_done", "tuples_total",
+                    "lockers_done", "lockers_total")
+
+
+def format_progress(progress: dict) -> str:
+    """One line like "building index: loading tuples (42.0% of tuples)"."""
+    for done, total in (("tuples_done", "tuples_total"), ("blocks_done", "blocks_total"),
+                        ("lockers_done", "lockers_total")):
+        if progress.get(total):
+            percent = 100.0 * progress[done] / progress[total]
+            return f"{progress['phase']} ({percent:.1f}% of {total.split('_')[0]})"
+    return progress["phase"]
+
+
+def _index_state(cur, name):
+    # (definition, valid, unique, backing constraint or None) of an index in the current schema, or None
+    cur.execute("""
+        SELECT pg_get_indexdef(c.oid), x.indisvalid, x.indisunique,
+               (SELECT con.conname FROM pg_constraint con WHERE con.conindid = c.oid AND con.contype IN ('p', 'u', 'x')
+                LIMIT 1)
+        FROM pg_class c JOIN pg_index x ON x.indexrelid = c.oid
+        WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+    """, (name,))
+    return cur.fetchone()
+
+
+def _refuse_constraint_index(name, state):
+    # a constraint's index cannot be renamed away and dropped; REINDEX CONCURRENTLY rebuilds it in place
+    if state is not None and state[3]:
+        raise ValueError(f"index {name} backs constraint {state[3]} and cannot be swapped; "
+                         f"use REINDEX INDEX CONCURRENTLY {name} instead")
+
+
+class IndexManager:
+    """Builds and rebuilds indexes without blocking writes to the table.
+
+    Each build runs CREATE INDEX CONCURRENTLY under a temporary name, on its own
+    connection with its own maintenance_work_mem and parallel worker settings, while a
+    second connection reports progress from pg_stat_progress_create_index. The finished
+    index then replaces the old one by renaming both in one short transaction, and the old
+    index is dropped CONCURRENTLY. Reads and writes continue throughout; queries see either
+    the old index or the new one. Unique indexes stay unique; indexes that back a primary
+    key, unique or exclusion constraint are refused (REINDEX CONCURRENTLY handles those).
+
+    connect() must return a new psycopg2 connection.
+    """
+
+    def __init__(self, connect, maintenance_work_mem: str = "1GB", parallel_workers: int | None = None,
+                 poll_interval: float = 2.0, on_progress=None, swap_lock_timeout: str = "5s"):
+        self.connect = connect
+        self.maintenance_work_mem = maintenance_work_mem
+        self.parallel_workers = parallel_workers
+        self.poll_interval = poll_interval
+        self.on_progress = on_progress if on_progress is not None else \
+            (lambda name, progress: print(f"{name}: {format_progress(progress)}"))
+        self.swap_lock_timeout = swap_lock_timeout
+        self._log_ready = False
+
+    def _autocommit(self):
+        conn = self.connect()
+        conn.autocommit = True  # CONCURRENTLY cannot run inside a transaction block
+        return conn
+
+    def _log(self, cur, sql, params):
+        if not self._log_ready:
+            cur.execute(INDEX_BUILD_LOG_SQL)
+            self._log_ready = True
+        cur.execute(sql, params)
+        return cur.fetchone()[0] if cur.description else None
+
+    def _watch(self, future, pid, name):
+        # polls the build's progress row until the build finishes
+        monitor = self._autocommit()
+        try:
+            with monitor.cursor() as cur:
+                last = None
+                while not future.done():
+                    cur.execute(PROGRESS_QUERY, (pid,))
+                    row = cur.fetchone()
+                    if row is not None:
+                        progress = dict(zip(PROGRESS_COLUMNS, row))
+                        if progress != last:
+                            self.on_progress(name, progress)
+                            last = progress
+                    wait([future], timeout=self.poll_interval)
+        except KeyboardInterrupt:
+            with monitor.cursor() as cur:
+                cur.execute("SELECT pg_cancel_backend(%s)", (pid,))
+            raise
+        finally:
+            monitor.close()
+
+    def build(self, name: str, table: str, using: str, unique: bool = False) -> dict:
+        """Creates (or replaces) index name ON table USING using, e.g. "diskann (embedding vector_cosine_ops)".
+
+        Returns the build record: seconds, size and whether an old index was replaced.
+        """
+        temp_name = f"{name[:59]}_new"
+        definition = f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY {temp_name} ON {table} USING {using}"
+        conn = self._autocommit()
+        record = {"index": name, "table": table, "using": using, "unique": unique}
+        try:
+            with conn.cursor() as cur:
+                _refuse_constraint_index(name, _index_state(cur, name))
+                # a build that failed or was cancelled leaves an INVALID index behind
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {temp_name}")
+                cur.execute("SET maintenance_work_mem = %s", (self.maintenance_work_mem,))
+                if self.parallel_workers is not None:
+                    cur.execute("SET max_parallel_maintenance_workers = %s", (self.parallel_workers,))
+                build_id = self._log(cur, """
+                    INSERT INTO mcp_meta.index_builds (index_name, table_name, definition, maintenance_work_mem,
+                                                       parallel_workers)
+                    VALUES (%s, %s, %s, %s, %s) RETURNING build_id
+                """, (name, table, definition, self.maintenance_work_mem, self.parallel_workers))
+                pid = conn.get_backend_pid()
+
+                start = time.perf_counter()
+                try:
+                    with ThreadPoolExecutor(max_workers=1) as pool:
+                        future = pool.submit(cur.execute, definition)
+                        self._watch(future, pid, name)
+                        error = future.exception()
+                except KeyboardInterrupt as interrupt:
+                    # _watch cancelled the build on the server; the executor waited for it to stop
+                    record["seconds"] = round(time.perf_counter() - start, 3)
+                    self._failed(cur, build_id, temp_name, "cancelled", interrupt, record["seconds"])
+                    raise
+                record["seconds"] = round(time.perf_counter() - start, 3)
+                if error is not None:
+                    self._failed(cur, build_id, temp_name, "failed", error, record["seconds"])
+                    raise error
+
+                record["replaced"] = self._swap(conn, cur, name, temp_name)
+                cur.execute("SELECT pg_relation_size(%s::regclass)", (name,))
+                record["index_mb"] = round(cur.fetchone()[0] / (1024 * 1024), 2)
+                self._log(cur, "UPDATE mcp_meta.index_builds SET status = 'done', finished_at = now(), "
+                               "seconds = %s, index_mb = %s WHERE build_id = %s",
+                          (record["seconds"], record["index_mb"], build_id))
+        finally:
+            conn.close()
+        return record
+
+    def _failed(self, cur, build_id, temp_name, status, error, seconds):
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {temp_name}")
+        self._log(cur, "UPDATE mcp_meta.index_builds SET status = %s, error = %s, "
+                       "finished_at = now(), seconds = %s WHERE build_id = %s",
+                  (status, str(error).strip() or type(error).__name__, seconds, build_id))
+
+    def _swap(self, conn, cur, name, temp_name) -> bool:
+        state = _index_state(cur, temp_name)
+        if state is None or not state[1]:
+            raise RuntimeError(f"{temp_name} was not built (or is invalid); {name} was left unchanged")
+        old_name = f"{name[:59]}_old"
+        replaced = _index_state(cur, name) is not None
+        # the renames take a brief lock on the table; give up rather than queue behind a long writer
+        conn.autocommit = False
+        try:
+            cur.execute("SET LOCAL lock_timeout = %s", (self.swap_lock_timeout,))
+            if replaced:
+                cur.execute(f"DROP INDEX IF EXISTS {old_name}")
+                cur.execute(f"ALTER INDEX {name} RENAME TO {old_name}")
+            cur.execute(f"ALTER INDEX {temp_name} RENAME TO {name}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+        if replaced:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {old_name}")
+        return replaced
+
+    def rebuild(self, name: str) -> dict:
+        """Rebuilds an existing index with the same definition, without blocking writes."""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                state = _index_state(cur, name)
+                cur.execute("SELECT indrelid::regclass::text FROM pg_index WHERE indexrelid = %s::regclass", (name,))
+                table = cur.fetchone()[0] if state else None
+            conn.rollback()
+        finally:
+            conn.close()
+        if state is None:
+            raise ValueError(f"index {name} does not exist")
+        _refuse_constraint_index(name, state)
+        using = state[0].split(" USING ", 1)[1]
+        return self.build(name, table, using, unique=state[2])
+
+    def ensure(self, name: str, table: str, using: str, unique: bool = False) -> dict | None:
+        """Builds the index unless a valid one with this name already exists; returns the build record or None."""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                state = _index_state(cur, name)
+            conn.rollback()
+        finally:
+            conn.close()
+        if state is not None and state[1]:
+            return None
+        return self.build(name, table, using, unique)
+
+    def history(self, name: str | None = None, limit: int = 20) -> list:
+        """The most recent builds from mcp_meta.index_builds, newest first."""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(INDEX_BUILD_LOG_SQL)
+                cur.execute("""
+                    SELECT index_name, table_name, started_at, seconds, index_mb, status, error,
+                           maintenance_work_mem, parallel_workers
+                    FROM mcp_meta.index_builds
+                    WHERE %(name)s::text IS NULL OR index_name = %(name)s
+                    ORDER BY build_id DESC LIMIT %(limit)s
+                """, {"name": name, "limit": limit})
+                columns = [d[0] for d in cur.description]
+                rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+            conn.commit()
+        finally:
+            conn.close()
+        return rows
+
+
+if __name__ == "__main__":
+    from get_conn import connect
+
+    parser = argparse.ArgumentParser(description="Build or rebuild an index without blocking writes.")
+    parser.add_argument("name", help="Index name.")
+    parser.add_argument("--table", help="Table to index; omit to rebuild the existing index.")
+    parser.add_argument("--using", help='Access method and columns, e.g. "diskann (embedding vector_cosine_ops)".')
+    parser.add_argument("--unique", action="store_true", help="Build a unique index (with --table).")
+    parser.add_argument("--maintenance-work-mem", default="1GB")
+    parser.add_argument("--parallel-workers", type=int, help="max_parallel_maintenance_workers for the build.")
+    args = parser.parse_args()
+
+    manager = IndexManager(connect, maintenance_work_mem=args.maintenance_work_mem,
+                           parallel_workers=args.parallel_workers)
+    if args.table:
+        print(manager.build(args.name, args.table, args.using, args.unique))
+    else:
+        print(manager.rebuild(args.name))
@@ -1,6 +1,10 @@
 import pyodbc
 import json
 import os
+import queue
+import threading
+import time
+from itertools import islice
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,9 +13,15 @@ load_dotenv()
 server = os.getenv('SQL_SERVER')
 database = os.getenv('SQL_DB_NAME')
 username = os.getenv('SQL_UID')
-password = input("Enter your SQL password: ")
 
-connection_string = f"""
+_connection_string = None
+
+def get_connection_string():
+    """Builds the ODBC connection string, asking for the password once per process"""
+    global _connection_string
+    if _connection_string is None:
+        password = os.getenv('SQL_PASSWORD') or input("Enter your SQL password: ")
+        _connection_string = f"""
 DRIVER={{ODBC Driver 18 for SQL Server}};
 SERVER={server};
 DATABASE={database};
@@ -20,12 +30,182 @@ PWD={password};
 Encrypt=yes;
 TrustServerCertificate=no;
 """
+    return _connection_string
+
+
+INSERT_SQL = """
+INSERT INTO dbo.products_catalogue (id, prod_id, name, category, description, description_dup, price)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Parameter types for fast_executemany. Without them pyodbc sizes NVARCHAR(MAX)
+# parameters from the first row and re-binds whenever a longer value shows up.
+INSERT_INPUT_SIZES = [
+    (pyodbc.SQL_INTEGER, 0, 0),
+    (pyodbc.SQL_INTEGER, 0, 0),
+    (pyodbc.SQL_WVARCHAR, 0, 0),
+    (pyodbc.SQL_WVARCHAR, 255, 0),
+    (pyodbc.SQL_WVARCHAR, 0, 0),
+    (pyodbc.SQL_WVARCHAR, 0, 0),
+    (pyodbc.SQL_REAL, 0, 0),
+]
+
+
+# Set-based apply of a staged batch. #products_stage lives for the whole session, so it
+# is created on the first batch of each connection and only truncated afterwards.
+STAGE_SETUP_SQL = """
+SET NOCOUNT ON;
+IF OBJECT_ID('tempdb..#products_stage') IS NULL
+    CREATE TABLE #products_stage (
+        id INTEGER PRIMARY KEY,
+        prod_id INTEGER,
+        name NVARCHAR(MAX),
+        category NVARCHAR(255),
+        description NVARCHAR(MAX),
+        description_dup NVARCHAR(MAX),
+        price REAL
+    );
+ELSE
+    TRUNCATE TABLE #products_stage;
+"""
+
+STAGE_INSERT_SQL = """
+INSERT INTO #products_stage (id, prod_id, name, category, description, description_dup, price)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Insert new ids, update rows whose values changed, leave identical rows alone.
+# The EXCEPT comparison treats NULLs as equal.
+STAGE_MERGE_SQL = """
+SET NOCOUNT ON;
+DECLARE @changes TABLE (change_type NVARCHAR(10));
+MERGE dbo.products_catalogue WITH (HOLDLOCK) AS t
+USING #products_stage AS s
+    ON t.id = s.id
+WHEN MATCHED AND EXISTS (
+        SELECT s.prod_id, s.name, s.category, s.description, s.description_dup, s.price
+        EXCEPT
+        SELECT t.prod_id, t.name, t.category, t.description, t.description_dup, t.price)
+    THEN UPDATE SET
+        prod_id = s.prod_id,
+        name = s.name,
+        category = s.category,
+        description = s.description,
+        description_dup = s.description_dup,
+        price = s.price
+WHEN NOT MATCHED BY TARGET
+    THEN INSERT (id, prod_id, name, category, description, description_dup, price)
+    VALUES (s.id, s.prod_id, s.name, s.category, s.description, s.description_dup, s.price)
+OUTPUT $action INTO @changes;
+SELECT
+    COALESCE(SUM(CASE WHEN change_type = 'INSERT' THEN 1 ELSE 0 END), 0),
+    COALESCE(SUM(CASE WHEN change_type = 'UPDATE' THEN 1 ELSE 0 END), 0)
+FROM @changes;
+"""
+
+# Insert new ids only, existing rows are skipped.
+STAGE_INSERT_NEW_SQL = """
+SET NOCOUNT ON;
+INSERT INTO dbo.products_catalogue (id, prod_id, name, category, description, description_dup, price)
+SELECT s.id, s.prod_id, s.name, s.category, s.description, s.description_dup, s.price
+FROM #products_stage AS s
+WHERE NOT EXISTS (
+    SELECT 1 FROM dbo.products_catalogue AS t WITH (UPDLOCK, HOLDLOCK) WHERE t.id = s.id
+);
+SELECT @@ROWCOUNT, 0;
+"""
+
+LOAD_MODES = ("insert", "insert_new", "upsert")
+
+
+def resolve_json_path(json_file_path):
+    """Find the JSON file in the usual locations relative to the working directory"""
+    possible_paths = [
+        json_file_path,
+        os.path.join('src', json_file_path),
+        os.path.join('labs', 'src', json_file_path),
+        os.path.join('..', json_file_path),
+        os.path.join('..', '..', json_file_path)
+    ]
+    for path in possible_paths:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Yield the elements of a top-level JSON array one at a time.
+
+    Only the current chunk and the element being decoded are held in memory, so memory
+    use does not grow with the size of the file.
+    """
+    decoder = json.JSONDecoder()
+    buf = file.read(chunk_size).lstrip()
+    if not buf.startswith('['):
+        raise json.JSONDecodeError("Expected a JSON array", buf, 0)
+    pos = 1
+    eof = False
+    while True:
+        # skip whitespace and the separator between elements
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buf, pos = chunk, 0
+        if pos >= len(buf):
+            raise json.JSONDecodeError("Unterminated JSON array", buf, pos)
+        if buf[pos] == ']':
+            return
+        try:
+            element, end = decoder.raw_decode(buf, pos)
+            # a number is only complete once a delimiter follows it: "2." + "5" decodes as 2,
+            # and one running up to the end of the chunk may continue in the next one
+            truncated = (not eof and isinstance(element, (int, float)) and not isinstance(element, bool)
+                         and (end == len(buf) or buf[end] not in ' \t\r\n,]'))
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            truncated = True
+        if truncated:
+            # the element is cut off at the end of the chunk, read more and retry
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield element
+        pos = end
+
+
+def clean_product(product):
+    """Validate and cast one JSON record into an insert tuple"""
+    description = str(product['description']).strip()
+    return (
+        int(product['id']),
+        int(product['id']),
+        str(product['name']).strip(),
+        str(product['category']).strip(),
+        description,
+        description,
+        float(product['price']),
+    )
+
+
+def batched(iterable, batch_size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
 
 class JSONToSQLInserter:
-    def __init__(self):
-        """Initialize database connection"""
+    def __init__(self, connection_string=None):
+        """Initialize database connection (default: the SQL_* environment settings)"""
+        self.invalid_count = 0
+        self.connection_string = connection_string or get_connection_string()
         try:
-            self.conn = pyodbc.connect(connection_string)
+            self.conn = pyodbc.connect(self.connection_string)
             print("Database connection established successfully")
         except Exception as e:
             print(f"Database connection failed: {e}")
@@ -79,127 +259,175 @@ class JSONToSQLInserter:
 
     def load_json_data(self, json_file_path):
         """Load and validate JSON data from file"""
+        return list(self.iter_json_data(json_file_path))
+
+    def iter_json_data(self, json_file_path):
+        """Stream JSON records from file without loading the whole document"""
+        used_path = resolve_json_path(json_file_path)
+        if used_path is None:
+            print(f"Could not find {json_file_path} in any expected locations")
+            return
         try:
-            # Try different possible paths
-            possible_paths = [
-                json_file_path,
-                os.path.join('src', json_file_path),
-                os.path.join('labs', 'src', json_file_path),
-                os.path.join('..', json_file_path),
-                os.path.join('..', '..', json_file_path)
-            ]
-            
-            json_data = None
-            used_path = None
-            
-            for path in possible_paths:
-                try:
-                    with open(path, 'r', encoding='utf-8') as file:
-                        json_data = json.load(file)
-                        used_path = path
-                        break
-                except FileNotFoundError:
-                    continue
-            
-            if json_data is None:
-                print(f"Could not find {json_file_path} in any expected locations")
-                return []
-            
-            return json_data
-            
+            with open(used_path, 'r', encoding='utf-8') as file:
+                yield from iter_json_array(file)
         except json.JSONDecodeError as e:
             print(f"Invalid JSON format: {e}")
-            return []
         except Exception as e:
             print(f"Error loading JSON file: {e}")
-            return []
 
-    def get_data(self, json_data):
-        """Validate and clean JSON data before insertion"""
-        valid_products = []
-        invalid_count = 0
+    def iter_clean_rows(self, json_data):
+        """Validate and cast records on the fly, yielding insert tuples"""
         for i, product in enumerate(json_data):
             try:
-
-                # Clean and validate data types
-                product = {
-                    'id': int(product['id']),
-                    'prod_id': int(product['id']),
-                    'name': str(product['name']).strip(),
-                    'category': str(product['category']).strip(),
-                    'description': str(product['description']).strip(),
-                    'description_dup': str(product['description']).strip(),
-                    'price': float(product['price'])
-                }
-                
-                valid_products.append(product)
-                
+                yield clean_product(product)
             except (ValueError, KeyError, TypeError) as e:
                 print(f"Record {i+1} validation error: {e}")
-                invalid_count += 1
-                continue
-        
+                self.invalid_count += 1
+
+    def get_data(self, json_data):
+        """Validate and clean JSON data before insertion"""
+        self.invalid_count = 0
+        columns = ('id', 'prod_id', 'name', 'category', 'description', 'description_dup', 'price')
+        valid_products = [dict(zip(columns, row)) for row in self.iter_clean_rows(json_data)]
+
         print(f"Valid records: {len(valid_products)}")
-        print(f"Invalid records: {invalid_count}")
-        
+        print(f"Invalid records: {self.invalid_count}")
+
         return valid_products
 
-    def insert_products(self, products, batch_size=100):
-        """Insert products into the database"""
+    @staticmethod
+    def _prepare_cursor(conn):
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+        cursor.setinputsizes(INSERT_INPUT_SIZES)
+        return cursor
+
+    @staticmethod
+    def _apply_staged_batch(conn, cursor, batch_data, mode):
+        """Stage a batch in a temp table and apply it with one set-based statement.
+
+        Returns (inserted, updated, skipped) counts for the batch.
+        """
+        # the staging table has a primary key, keep the last occurrence of repeated ids
+        unique_rows = list({row[0]: row for row in batch_data}.values())
+        cursor.execute(STAGE_SETUP_SQL)
+        cursor.executemany(STAGE_INSERT_SQL, unique_rows)
+        cursor.execute(STAGE_MERGE_SQL if mode == "upsert" else STAGE_INSERT_NEW_SQL)
+        inserted, updated = cursor.fetchone()
+        conn.commit()
+        return inserted, updated, len(batch_data) - inserted - updated
+
+    @classmethod
+    def _insert_batch(cls, conn, cursor, batch_data, mode="insert"):
+        """Write one batch in a single round trip, returns (inserted, updated, skipped)"""
+        if mode != "insert":
+            return cls._apply_staged_batch(conn, cursor, batch_data, mode)
+        try:
+            cursor.executemany(INSERT_SQL, batch_data)
+            conn.commit()
+            return len(batch_data), 0, 0
+        except pyodbc.IntegrityError as e:
+            conn.rollback()
+            if "PRIMARY KEY constraint" not in str(e):
+                raise e
+            # Some products already exist, insert the rest of the batch set-based
+            return cls._apply_staged_batch(conn, cursor, batch_data, "insert_new")
+
+    def insert_products(self, products, batch_size=100, mode="insert"):
+        """Insert products into the database.
+
+        mode "insert" does plain inserts and skips rows whose id already exists,
+        "insert_new" only adds new ids and "upsert" also updates changed rows.
+        Returns the inserted, updated and skipped counts, or False on failure.
+        """
         if not self.conn or not products:
             print("No connection or no products to insert")
             return False
-        
+        if mode not in LOAD_MODES:
+            raise ValueError(f"mode must be one of {LOAD_MODES}")
+
         try:
-            cursor = self.conn.cursor()
-            
-            
-            # Prepare INSERT statement
-            insert_sql = """
-            INSERT INTO dbo.products_catalogue (id, prod_id, name, category, description, description_dup, price)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """
-            
+            cursor = self._prepare_cursor(self.conn)
+            columns = ('id', 'prod_id', 'name', 'category', 'description', 'description_dup', 'price')
+            rows = (tuple(p[c] for c in columns) for p in products)
+
             # Insert in batches for better performance
-            total_inserted = 0
-            batch_count = 0
-            
-            for i in range(0, len(products), batch_size):
-                batch = products[i:i + batch_size]
-                batch_data = [
-                    (p['id'], p['prod_id'], p['name'], p['category'], p['description'], p['description_dup'], p['price'])
-                    for p in batch
-                ]
-                
-                try:
-                    cursor.executemany(insert_sql, batch_data)
-                    self.conn.commit()
-                    total_inserted += len(batch)
-                    batch_count += 1
-                    print(f"Batch {batch_count}: Inserted {len(batch)} products")
-                    
-                except pyodbc.IntegrityError as e:
-                    if "PRIMARY KEY constraint" in str(e):
-                        print(f"Batch {batch_count}: Some products already exist, trying individual inserts...")
-                        # Try inserting one by one to handle duplicates
-                        for product_data in batch_data:
-                            try:
-                                cursor.execute(insert_sql, product_data)
-                                self.conn.commit()
-                                total_inserted += 1
-                            except pyodbc.IntegrityError:
-                                print(f"Skipping duplicate product ID: {product_data[0]}")
-                                continue
-                    else:
-                        raise e
-            
-            print(f"Successfully inserted {total_inserted} products!")
-            return True
-            
+            totals = {"inserted": 0, "updated": 0, "skipped": 0}
+            for batch_count, batch_data in enumerate(batched(rows, batch_size), start=1):
+                inserted, updated, skipped = self._insert_batch(self.conn, cursor, batch_data, mode)
+                totals["inserted"] += inserted
+                totals["updated"] += updated
+                totals["skipped"] += skipped
+                print(f"Batch {batch_count}: Inserted {inserted}, updated {updated}, skipped {skipped} products")
+
+            print(f"Successfully inserted {totals['inserted']} and updated {totals['updated']} products "
+                  f"({totals['skipped']} unchanged or duplicate)!")
+            return totals
+
         except Exception as e:
             print(f"Error inserting products: {e}")
             return False
 
+    def stream_insert(self, json_file_path, batch_size=1000, writers=4, mode="insert"):
+        """Parse, validate and insert products as a pipeline with constant memory use.
+
+        The calling thread parses and casts records into fixed-size batches and hands them
+        to `writers` threads, each with its own connection. The queue between the stages
+        is bounded, so parsing never runs more than a couple of batches ahead of the
+        writers and casting overlaps with the inserts. See insert_products for the modes.
+        """
+        if mode not in LOAD_MODES:
+            raise ValueError(f"mode must be one of {LOAD_MODES}")
+        self.invalid_count = 0
+        batches = queue.Queue(maxsize=writers * 2)
+        lock = threading.Lock()
+        stats = {"inserted": 0, "updated": 0, "skipped": 0, "batches": 0, "errors": 0}
+        start = time.perf_counter()
+
+        def writer():
+            try:
+                conn = pyodbc.connect(self.connection_string)
+            except Exception as e:
+                print(f"Writer could not connect: {e}")
+                conn = None
+            cursor = self._prepare_cursor(conn) if conn else None
+            while (batch_data := batches.get()) is not None:
+                try:
+                    if conn is None:
+                        raise RuntimeError("no database connection")
+                    inserted, updated, skipped = self._insert_batch(conn, cursor, batch_data, mode)
+                    with lock:
+                        stats["inserted"] += inserted
+                        stats["updated"] += updated
+                        stats["skipped"] += skipped
+                        stats["batches"] += 1
+                except Exception as e:
+                    print(f"Error inserting batch: {e}")
+                    with lock:
+                        stats["errors"] += 1
+            if conn:
+                conn.close()
+
+        threads = [threading.Thread(target=writer, daemon=True) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        try:
+            rows = self.iter_clean_rows(self.iter_json_data(json_file_path))
+            for batch_data in batched(rows, batch_size):
+                batches.put(batch_data)
+        finally:
+            for _ in threads:
+                batches.put(None)
+            for thread in threads:
+                thread.join()
+
+        stats["invalid"] = self.invalid_count
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        print(f"Inserted {stats['inserted']}, updated {stats['updated']} and skipped {stats['skipped']} products "
+              f"in {stats['batches']} batches ({stats['invalid']} invalid records, {stats['errors']} failed batches) "
+              f"in {stats['seconds']}s")
+        return stats
+
 
 def main():
     # Initialize inserter
@@ -215,28 +443,14 @@ def main():
             print("Failed to create/verify table")
             return
         
-        # Load JSON data
+        # Stream, validate and insert products
         json_file = 'sample_products.json'
-        json_data = inserter.load_json_data(json_file)
-        
-        if not json_data:
-            print("No data loaded from JSON file")
-            return
-        
-        # Validate and clean data
-        valid_products = inserter.get_data(json_data)
-        
-        if not valid_products:
-            print("No valid products found after validation")
-            return
-
-        
-        # Insert products
-        _ = inserter.insert_products(
-            valid_products, 
-            batch_size=100
+        _ = inserter.stream_insert(
+            json_file,
+            batch_size=1000,
+            writers=int(os.getenv('SQL_INSERT_WRITERS', '4')),
+            mode=os.getenv('SQL_LOAD_MODE', 'upsert')
         )
-        
 
     except KeyboardInterrupt:
         print("Process interrupted by user")
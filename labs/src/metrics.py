@@ -0,0 +1,209 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency buckets: 50us .. 60s, roughly 2.5x apart
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and two additions under a lock."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float):
+        """Estimates a quantile by linear interpolation inside its bucket."""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+            largest = self.max
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else largest
+                return min(largest, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return largest
+
+    def summary(self) -> dict:
+        ms = lambda v: None if v is None else round(v * 1000, 3)
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "max_ms": ms(self.max) if self.count else None,
+        }
+
+
+def _label_text(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    """Process-wide registry of histograms, counters and gauges, keyed by name and labels.
+
+    Gauges are callbacks read at export time, so nothing is tracked on the hot path for them.
+    """
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, Histogram())
+        return hist
+
+    def observe(self, name: str, seconds: float, **labels):
+        self.histogram(name, **labels).observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name, **labels).observe(time.perf_counter() - start)
+
+    def inc(self, name: str, amount: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name: str, func, **labels):
+        """Registers func() as the current value of a gauge."""
+        self._gauges[(name, tuple(sorted(labels.items())))] = func
+
+    def _gauge_values(self):
+        values = {}
+        for key, func in list(self._gauges.items()):
+            try:
+                values[key] = func()
+            except Exception:
+                values[key] = None
+        return values
+
+    def snapshot(self) -> dict:
+        """Current values as plain JSON-serializable data."""
+        key_text = lambda key: key[0] + ("{" + ",".join(f"{k}={v}" for k, v in key[1]) + "}" if key[1] else "")
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "latency": {key_text(k): h.summary() for k, h in sorted(self._histograms.items())},
+            "counters": {key_text(k): v for k, v in sorted(self._counters.items())},
+            "gauges": {key_text(k): v for k, v in sorted(self._gauge_values().items())},
+        }
+
+    def to_prometheus(self) -> str:
+        """Renders everything in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), hist in sorted(self._histograms.items()):
+            full = f"{self.prefix}{name}_seconds"
+            header(full, "histogram")
+            with hist._lock:
+                counts, total, count = list(hist.counts), hist.sum, hist.count
+            cumulative = 0
+            for bound, n in zip(hist.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{full}_bucket{_label_text(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{full}_sum{_label_text(labels)} {total}")
+            lines.append(f"{full}_count{_label_text(labels)} {count}")
+        for (name, labels), value in sorted(self._counters.items()):
+            full = f"{self.prefix}{name}_total"
+            header(full, "counter")
+            lines.append(f"{full}{_label_text(labels)} {value}")
+        for (name, labels), value in sorted(self._gauge_values().items()):
+            if value is None:
+                continue
+            full = f"{self.prefix}{name}"
+            header(full, "gauge")
+            lines.append(f"{full}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Writes the text format to path atomically (e.g. for node_exporter's textfile collector)."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+
+def start_file_exporter(metrics: Metrics, path: str, interval: float = 15.0) -> threading.Thread:
+    """Rewrites the Prometheus file every interval seconds from a daemon thread."""
+    def loop():
+        while True:
+            try:
+                metrics.write_prometheus(path)
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="metrics_file", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_http_exporter(metrics: Metrics, port: int, host: str = "127.0.0.1"):
+    """Serves GET /metrics in the Prometheus text format from a daemon thread."""
+    # imported here, http.server is slow to import and most runs never need it
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            # the default handler logs to stderr for every scrape
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics_http", daemon=True).start()
+    return server
@@ -0,0 +1,80 @@
+import base64
+import hashlib
+import json
+
+# Rows pulled per round trip by the named (server-side) cursors
+FETCH_SIZE = 500
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+
+def encode_page_token(state: dict) -> str:
+    """Packs paging state into an opaque, URL-safe continuation token."""
+    raw = json.dumps(state, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token: str) -> dict:
+    """Inverse of encode_page_token; raises ValueError for anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        state = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("invalid page_token") from e
+    if not isinstance(state, dict):
+        raise ValueError("invalid page_token")
+    return state
+
+
+def fingerprint(*parts) -> str:
+    """Short hash tying a token to the query (and data version) it was issued for."""
+    return hashlib.sha1("\x1f".join(map(str, parts)).encode("utf-8")).hexdigest()[:12]
+
+
+def clamp_page_size(page_size) -> int:
+    return max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+def encode_rows(description, rows, drop_nulls=True) -> list:
+    """Encodes each row as its own compact JSON object, using cursor.description for the keys."""
+    columns = [desc[0] for desc in description]
+    encoded = []
+    for row in rows:
+        record = {c: v for c, v in zip(columns, row) if not (drop_nulls and v is None)}
+        encoded.append(json.dumps(record, separators=(",", ":"), default=str))
+    return encoded
+
+
+def page_json(encoded_rows, start, page_size, next_state=None, key="records") -> str:
+    """Joins pre-encoded rows [start:start + page_size] into {key: [...], "next_page_token": ...}."""
+    end = start + page_size
+    rows = encoded_rows[start:end]
+    token = encode_page_token({**(next_state or {}), "offset": end}) if end < len(encoded_rows) else None
+    return '{"%s":[%s],"next_page_token":%s}' % (key, ",".join(rows), json.dumps(token))
+
+
+def fetch_keyset_page(cursor, table, key_column, page_size=DEFAULT_PAGE_SIZE, page_token=None, columns="*"):
+    """Returns {"records": [...], "next_page_token": ...} for one page of table ordered by key_column.
+
+    Keyset paging (WHERE key > last key seen) costs the same for every page, unlike OFFSET,
+    and needs an index on key_column. table, key_column and columns are trusted SQL.
+    """
+    page_size = clamp_page_size(page_size)
+    check = fingerprint(table, key_column, columns)
+    after = None
+    if page_token:
+        state = decode_page_token(page_token)
+        if state.get("q") != check:
+            raise ValueError("page_token was issued for a different query")
+        after = state.get("after")
+    where = f"WHERE {key_column} > %s " if after is not None else ""
+    params = ([after] if after is not None else []) + [page_size + 1]
+    # one extra row tells whether there is a next page without a COUNT
+    cursor.execute(f"SELECT {columns} FROM {table} {where}ORDER BY {key_column} LIMIT %s", params)
+    rows = cursor.fetchall()
+    names = [desc[0] for desc in cursor.description]
+    records = [dict(zip(names, row)) for row in rows[:page_size]]
+    next_token = None
+    if len(rows) > page_size:
+        next_token = encode_page_token({"q": check, "after": records[-1][key_column]})
+    return {"records": records, "next_page_token": next_token}
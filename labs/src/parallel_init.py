@@ -0,0 +1,333 @@
+import argparse
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sql_script import iter_statements, parse_insert, execute_sql_script
+
+_CREATE_TABLE = re.compile(r"CREATE\s+(?:UNLOGGED\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+                           r"(\"[^\"]+\"|[A-Za-z_][\w$]*)\s*\(", re.I)
+_CREATE_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\b.*?\bON\s+(?:ONLY\s+)?(\"[^\"]+\"|[A-Za-z_][\w$]*)",
+                           re.I | re.S)
+_REFERENCES = re.compile(r"\s+REFERENCES\s+(\"[^\"]+\"|[A-Za-z_][\w$]*)\s*(\([^)]*\))?"
+                         r"((?:\s+ON\s+(?:DELETE|UPDATE)\s+(?:CASCADE|RESTRICT|NO\s+ACTION|SET\s+NULL|SET\s+DEFAULT))*)",
+                         re.I)
+_PRIMARY_KEY = re.compile(r"\s+PRIMARY\s+KEY\b", re.I)
+_UNIQUE = re.compile(r"\s+UNIQUE\b", re.I)
+_TABLE_CONSTRAINT = re.compile(r"(?:CONSTRAINT\s+\S+\s+)?(PRIMARY\s+KEY|UNIQUE|FOREIGN\s+KEY)\b", re.I)
+_FK_TARGET = re.compile(r"\bREFERENCES\s+(\"[^\"]+\"|[A-Za-z_][\w$]*)", re.I)
+
+
+def _split_top_level(body: str):
+    # splits a column list on commas that are not inside parentheses or quotes
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(body):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(body[start:i].strip())
+            start = i + 1
+    parts.append(body[start:].strip())
+    return [p for p in parts if p]
+
+
+def _outside_quotes(text: str, pos: int) -> bool:
+    return text.count("'", 0, pos) % 2 == 0
+
+
+def _unquote(name: str) -> str:
+    return name[1:-1] if name.startswith('"') else name.lower()
+
+
+class TablePlan:
+    """A CREATE TABLE with its keys and foreign keys split off, to be added after the load."""
+
+    def __init__(self, name: str, create_sql: str, keys: list, foreign_keys: list):
+        self.name = name
+        self.create_sql = create_sql
+        self.keys = keys  # ALTER TABLE ... ADD PRIMARY KEY / UNIQUE statements
+        self.foreign_keys = foreign_keys  # (constraint name, referenced table, ADD CONSTRAINT sql)
+
+    @property
+    def parents(self) -> set:
+        return {parent for _, parent, _ in self.foreign_keys if parent != self.name}
+
+
+def plan_create_table(statement: str) -> TablePlan | None:
+    """Rewrites a CREATE TABLE without its PRIMARY KEY, UNIQUE and REFERENCES clauses.
+
+    The removed constraints come back as ALTER TABLE statements named the way PostgreSQL
+    names inline constraints (<table>_pkey, <table>_<column>_key, <table>_<column>_fkey),
+    so the finished schema is indistinguishable from running the original DDL.
+    Returns None for statements it does not understand, which are then run unchanged.
+    """
+    m = _CREATE_TABLE.match(statement)
+    if m is None or not statement.rstrip().endswith(")"):
+        return None
+    table = _unquote(m.group(1))
+    quoted = m.group(1)
+    columns = []
+    keys, foreign_keys = [], []
+    for item in _split_top_level(statement[m.end():statement.rstrip().rfind(")")]):
+        constraint = _TABLE_CONSTRAINT.match(item)
+        if constraint:
+            kind = constraint.group(1).upper()
+            if kind.startswith("FOREIGN"):
+                parent = _unquote(_FK_TARGET.search(item).group(1))
+                if item.upper().startswith("CONSTRAINT"):
+                    name, body = item.split()[1], item
+                else:
+                    cols = item[item.index("(") + 1:item.index(")")].split(",")
+                    name = f"{table}_{'_'.join(_unquote(c.strip()) for c in cols)}_fkey"
+                    body = f"CONSTRAINT {name} {item}"
+                foreign_keys.append((name, parent, f"ALTER TABLE {quoted} ADD {body} NOT VALID"))
+            else:
+                keys.append(f"ALTER TABLE {quoted} ADD {item}")
+            continue
+        if item.upper().startswith("CHECK") or item.upper().startswith("CONSTRAINT") or item.upper().startswith("LIKE"):
+            columns.append(item)
+            continue
+        column = item.split()[0]
+        ref = _REFERENCES.search(item)
+        if ref and _outside_quotes(item, ref.start()):
+            parent = ref.group(1)
+            target = ref.group(2) or ""
+            name = f"{table}_{_unquote(column)}_fkey"
+            foreign_keys.append((name, _unquote(parent), f"ALTER TABLE {quoted} ADD CONSTRAINT {name} "
+                                                         f"FOREIGN KEY ({column}) REFERENCES {parent}{target}"
+                                                         f"{ref.group(3)} NOT VALID"))
+            item = item[:ref.start()] + item[ref.end():]
+        pk = _PRIMARY_KEY.search(item)
+        if pk and _outside_quotes(item, pk.start()):
+            keys.insert(0, f"ALTER TABLE {quoted} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({column})")
+            item = item[:pk.start()] + item[pk.end():]
+        unique = _UNIQUE.search(item)
+        if unique and _outside_quotes(item, unique.start()):
+            keys.append(f"ALTER TABLE {quoted} ADD CONSTRAINT {table}_{_unquote(column)}_key UNIQUE ({column})")
+            item = item[:unique.start()] + item[unique.end():]
+        columns.append(item)
+    create_sql = statement[:m.end()] + "\n    " + ",\n    ".join(columns) + "\n)"
+    return TablePlan(table, create_sql, keys, foreign_keys)
+
+
+def dependency_levels(plans: dict) -> list:
+    """Groups tables so that every table comes after the tables its foreign keys point to.
+
+    Tables in the same level do not depend on each other and can be loaded at the same time.
+    """
+    remaining = {name: plan.parents & plans.keys() for name, plan in plans.items()}
+    levels = []
+    while remaining:
+        ready = sorted(name for name, parents in remaining.items() if not parents)
+        if not ready:
+            raise ValueError(f"foreign key cycle between tables: {sorted(remaining)}")
+        levels.append(ready)
+        for name in ready:
+            del remaining[name]
+        for parents in remaining.values():
+            parents.difference_update(ready)
+    return levels
+
+
+class ParallelInitializer:
+    """Runs a schema + data script like contoso_db.sql over several connections.
+
+    1. setup: DROP/CREATE EXTENSION/... as written, and each CREATE TABLE without its
+       primary key, unique and foreign key constraints
+    2. load: every table's INSERTs (in file order, batched as COPY by sql_script) on its own
+       connection; with defer_foreign_keys=False, level by level along the FK graph
+    3. keys and indexes: primary keys, unique constraints and the script's CREATE INDEX
+       statements, built in parallel once the data is in
+    4. foreign keys: added NOT VALID (no scan, brief lock) and then VALIDATEd in parallel
+    5. the rest of the script, then ANALYZE per table
+
+    connect() must return a new psycopg2 connection. Statements other than INSERTs that
+    appear after the first INSERT run after the load, in their original order.
+    """
+
+    def __init__(self, connect, workers: int = 4, defer_foreign_keys: bool = True,
+                 maintenance_work_mem: str | None = "256MB", batch_rows: int = 5000):
+        self.connect = connect
+        self.workers = workers
+        self.defer_foreign_keys = defer_foreign_keys
+        self.maintenance_work_mem = maintenance_work_mem
+        self.batch_rows = batch_rows
+
+    def _split(self, sql_file_path, spool_dir):
+        setup, indexes, post = [], [], []
+        plans = {}
+        spools = {}
+        seen_insert = False
+        with open(sql_file_path, encoding="utf-8") as f:
+            for statement in iter_statements(f):
+                parsed = parse_insert(statement)
+                if parsed is not None:
+                    seen_insert = True
+                    table = _unquote(parsed[0].split(".")[-1])
+                    if table not in spools:
+                        spools[table] = open(os.path.join(spool_dir, f"{len(spools)}.sql"), "w", encoding="utf-8")
+                    spools[table].write(statement + ";\n")
+                    continue
+                index = _CREATE_INDEX.match(statement)
+                if index:
+                    indexes.append((_unquote(index.group(1)), statement))
+                    continue
+                plan = None if seen_insert else plan_create_table(statement)
+                if plan is not None:
+                    plans[plan.name] = plan
+                    if not self.defer_foreign_keys:
+                        # keep the FKs inline; loading in dependency order keeps them satisfied
+                        plan.create_sql = statement
+                        plan.foreign_keys = [(n, p, None) for n, p, _ in plan.foreign_keys]
+                        plan.keys = []
+                    setup.append(plan.create_sql)
+                elif seen_insert:
+                    post.append(statement)
+                else:
+                    setup.append(statement)
+        for spool in spools.values():
+            spool.close()
+        return setup, plans, {t: s.name for t, s in spools.items()}, indexes, post
+
+    def _session(self, conn):
+        with conn.cursor() as curs:
+            # nothing is lost if a bootstrap crashes, it is simply run again
+            curs.execute("SET synchronous_commit = off")
+            if self.maintenance_work_mem:
+                curs.execute(f"SET maintenance_work_mem = '{self.maintenance_work_mem}'")
+        conn.commit()
+
+    def _run(self, statements):
+        start = time.perf_counter()
+        conn = self.connect()
+        try:
+            self._session(conn)
+            with conn.cursor() as curs:
+                for statement in statements:
+                    curs.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+        return time.perf_counter() - start
+
+    def _load(self, spool_path):
+        start = time.perf_counter()
+        conn = self.connect()
+        try:
+            self._session(conn)
+            with conn.cursor() as curs:
+                report = execute_sql_script(curs, spool_path, batch_rows=self.batch_rows)
+            conn.commit()
+        finally:
+            conn.close()
+        return time.perf_counter() - start, report["rows_copied"] + report["rows_inserted"]
+
+    def run(self, sql_file_path) -> dict:
+        """Executes the script and returns per-phase and per-table timings (seconds)."""
+        started = time.perf_counter()
+        phases = {}
+        tables = {}
+
+        def entry(table):
+            return tables.setdefault(table, {"rows": 0, "load": 0.0, "keys_and_indexes": 0.0,
+                                             "validate": 0.0, "analyze": 0.0})
+
+        with tempfile.TemporaryDirectory(prefix="parallel_init_") as spool_dir, \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+            t = time.perf_counter()
+            setup, plans, spools, indexes, post = self._split(sql_file_path, spool_dir)
+            phases["split"] = time.perf_counter() - t
+
+            phases["setup"] = self._run(setup)
+
+            t = time.perf_counter()
+            graph = dependency_levels(plans)
+            # without foreign keys during the load, every table is independent of the others
+            levels = [sorted(spools)] if self.defer_foreign_keys else graph
+            for level in levels:
+                loading = [(name, pool.submit(self._load, spools[name])) for name in level if name in spools]
+                for name, future in loading:
+                    seconds, rows = future.result()
+                    entry(name).update(load=seconds, rows=rows)
+            phases["load"] = time.perf_counter() - t
+
+            # one job per table: its primary key first (the FKs and most indexes need it)
+            t = time.perf_counter()
+            jobs = {}
+            for plan in plans.values():
+                jobs.setdefault(plan.name, []).extend(plan.keys)
+            for table, statement in indexes:
+                jobs.setdefault(table, []).append(statement)
+            for name, future in [(n, pool.submit(self._run, s)) for n, s in jobs.items() if s]:
+                entry(name)["keys_and_indexes"] = future.result()
+            phases["keys_and_indexes"] = time.perf_counter() - t
+
+            t = time.perf_counter()
+            foreign_keys = [(plan.name, fk) for plan in plans.values() for fk in plan.foreign_keys if fk[2]]
+            if foreign_keys:
+                # adding NOT VALID only touches the catalogs; VALIDATE scans the child table
+                # under a lock that lets reads and validations of other tables proceed, so
+                # tables validate in parallel and a table's own constraints one after another
+                self._run([fk[2] for _, fk in foreign_keys])
+                by_table = {}
+                for table, fk in foreign_keys:
+                    by_table.setdefault(table, []).append(f'ALTER TABLE "{table}" VALIDATE CONSTRAINT "{fk[0]}"')
+                validating = [(table, pool.submit(self._run, statements)) for table, statements in by_table.items()]
+                for table, future in validating:
+                    entry(table)["validate"] = future.result()
+            phases["foreign_keys"] = time.perf_counter() - t
+
+            if post:
+                phases["post"] = self._run(post)
+
+            t = time.perf_counter()
+            analyzing = [(name, pool.submit(self._run, [f'ANALYZE "{name}"'])) for name in plans]
+            for name, future in analyzing:
+                entry(name)["analyze"] = future.result()
+            phases["analyze"] = time.perf_counter() - t
+
+        phases["total"] = time.perf_counter() - started
+        return {
+            "dependency_levels": graph,
+            "load_levels": levels,
+            "phases": {k: round(v, 4) for k, v in phases.items()},
+            "tables": {name: {k: round(v, 4) if isinstance(v, float) else v for k, v in stats.items()}
+                       for name, stats in sorted(tables.items())},
+        }
+
+
+def parallel_init(sql_file_path, workers: int = 4, connect=None, **options) -> dict:
+    """Runs sql_file_path with ParallelInitializer against the lab database and prints the timings."""
+    if connect is None:
+        import psycopg2
+        from get_conn import get_connection_uri
+
+        def connect():
+            return psycopg2.connect(get_connection_uri())
+
+    report = ParallelInitializer(connect, workers=workers, **options).run(sql_file_path)
+    print(f"Loaded {sum(t['rows'] for t in report['tables'].values())} rows into {len(report['tables'])} tables "
+          f"in {report['phases']['total']}s")
+    print(f"Phases (s): {report['phases']}")
+    for name, stats in report["tables"].items():
+        print(f"  {name}: {stats}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and load the lab database over parallel connections.")
+    parser.add_argument("file", nargs="?", default="contoso_db.sql")
+    parser.add_argument("--workers", type=int, default=4, help="Connections used at the same time.")
+    parser.add_argument("--keep-foreign-keys", action="store_true",
+                        help="Keep foreign keys inline and load tables level by level along them.")
+    args = parser.parse_args()
+    parallel_init(args.file, workers=args.workers, defer_foreign_keys=not args.keep_foreign_keys)
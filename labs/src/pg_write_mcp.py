@@ -1,157 +1,734 @@
 # Copyright (c) Microsoft. All rights reserved.
+import time
+_process_start = time.perf_counter()
+
 import argparse
+import asyncio
 import logging
+import sys
+import threading
+import weakref
+from contextlib import asynccontextmanager, nullcontext
 from typing import Annotated, Any, Literal
-import psycopg2
 import json
-import anyio
-
-from semantic_kernel.agents import ChatCompletionAgent
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
-from semantic_kernel.functions import kernel_function
+import functools
 
 logger = logging.getLogger(__name__)
 
+
+def _warm_up():
+    # Runs on a background thread at startup: loads the driver and fetches the Entra token
+    # while semantic_kernel is imported on the main thread, so the two costs overlap
+    try:
+        import psycopg2  # noqa: F401
+        from get_conn import get_token_provider
+        get_token_provider().get_token()
+    except Exception as e:
+        logger.warning("Startup warm-up failed, retrying on the first tool call: %s", e)
+
+
+if __name__ == "__main__":
+    threading.Thread(target=_warm_up, name="warm_up", daemon=True).start()
+
+# semantic_kernel dominates startup; only the decorator is needed to define the plugin,
+# the agent and chat service classes are imported in run()
+from semantic_kernel.functions import kernel_function
+
 # This script shows an example of exposing a Semantic Kernel agent as an MCP server
 
-from get_conn import get_connection_uri
-from psycopg2 import pool
+from schema_cache import SchemaCache
+from paging import FETCH_SIZE, clamp_page_size, decode_page_token, encode_rows, fingerprint, page_json
+from metrics import Metrics, start_file_exporter, start_http_exporter
+from write_guard import WriteGuard, split_statements
+from procedures import PROCEDURE_QUERY, ProcedureCallError, ProcedureCatalog
+
+# Seconds since process start at each startup milestone, see --startup-budget
+startup_timings = {"imports": round(time.perf_counter() - _process_start, 3)}
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Run the Semantic Kernel MCP server.")
     parser.add_argument(
         "--transport",
         type=str,
-        choices=["stdio"],
+        choices=["stdio", "streamable-http", "sse"],
         default="stdio",
-        help="Transport method to use (default: stdio).",
+        help="Transport method to use (default: stdio). The HTTP transports serve many clients "
+             "from one process, sharing its connection pool and caches.",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host for the HTTP transports.")
+    parser.add_argument("--port", type=int, default=8000, help="Port for the HTTP transports.")
+    parser.add_argument(
+        "--max-session-concurrency",
+        type=int,
+        default=4,
+        help="Maximum tool calls running at once for one MCP session (default: 4).",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=30.0,
+        help="Seconds to let in-flight requests finish on shutdown (HTTP transports).",
+    )
+    parser.add_argument(
+        "--startup-budget",
+        type=float,
+        default=2.0,
+        help="Seconds from process start to a ready MCP server before a warning is logged (default: 2).",
+    )
+    parser.add_argument(
+        "--check-startup",
+        action="store_true",
+        help="Only measure the startup imports against --startup-budget and exit non-zero if over.",
+    )
+    parser.add_argument(
+        "--pool-warmup",
+        type=int,
+        default=4,
+        help="Database connections to open at startup and keep healthy while idle (default: 4).",
+    )
+    parser.add_argument(
+        "--max-write-rows",
+        type=int,
+        default=1000,
+        help="Reject writes the planner expects to touch more rows than this (default: 1000).",
+    )
+    parser.add_argument(
+        "--max-write-cost",
+        type=float,
+        default=100_000,
+        help="Reject writes with a higher estimated plan cost than this (default: 100000).",
+    )
+    parser.add_argument(
+        "--write-statement-timeout",
+        type=str,
+        default="5s",
+        help="statement_timeout for each write call (default: 5s).",
+    )
+    parser.add_argument(
+        "--write-lock-timeout",
+        type=str,
+        default="2s",
+        help="lock_timeout for each write call (default: 2s).",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=str,
+        help="Periodically write Prometheus text-format metrics to this file.",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics on http://127.0.0.1:<port>/metrics.",
     )
     return parser.parse_args()
 
 connection_pool = None
+_pool_lock = threading.Lock()
+# Connections opened ahead of the first tool calls and kept healthy between them, see --pool-warmup
+pool_warmup = 4
+_pool_maintenance = None
 def init_pool():
-    # Initialize connection pool
+    # Initialize connection pool. Driver calls run on the pool's own threads so that
+    # concurrent tool calls overlap instead of blocking the event loop. Opening the first
+    # connection blocks, so this runs on a worker thread (see _get_pool), never at import.
     global connection_pool
-    if connection_pool is None:
-        conn_string = get_connection_uri()
-        connection_pool = pool.SimpleConnectionPool(
-            minconn=1,
-            maxconn=10,
-            dsn=conn_string
-        )
+    with _pool_lock:
+        if connection_pool is None:
+            from get_conn import connect
+            from async_pool import AsyncConnectionPool
+            from prepared import PreparingConnection
+
+            connection_pool = AsyncConnectionPool(
+                connect=functools.partial(connect, connection_factory=PreparingConnection),
+                minconn=1,
+                maxconn=10,
+                max_waiting=100,
+                timeout=30.0,
+                warmup=pool_warmup,
+                max_lifetime=3000.0,
+                max_idle=600.0,
+                check_after=10.0
+            )
+            startup_timings.setdefault("pool_ready", round(time.perf_counter() - _process_start, 3))
+    return connection_pool
+
+
+async def _get_pool():
+    # The pool is created on first use (or by the warm-up task in run)
+    global _pool_maintenance
+    if connection_pool is not None:
+        return connection_pool
+    pool = await asyncio.to_thread(init_pool)
+    if _pool_maintenance is None:
+        _pool_maintenance = asyncio.create_task(_maintain_pool(pool))
+    return pool
+
+
+async def _maintain_pool(pool):
+    # Opens the warm-up connections, then pings idle ones and replaces stale ones in the
+    # background, so the first call after an idle period does not pay for a reconnect
+    try:
+        await pool.warm_up()
+    except Exception as e:
+        logger.warning("Could not warm up the connection pool: %s", e)
+    await pool.keep_warm()
+
+# Introspection results are reused until a catalog version check sees DDL
+schema_cache = SchemaCache()
+
+# Per-tool timings: pool_wait (checkout), execute (database), serialize (JSON) and total
+metrics = Metrics(prefix="pg_write_mcp_")
+# Pool occupancy is read when metrics are exported; the lambdas see the pool once it exists
+metrics.gauge("pool_connections", lambda: connection_pool.size)
+metrics.gauge("pool_idle_connections", lambda: connection_pool.idle)
+metrics.gauge("pool_in_use_connections", lambda: connection_pool.size - connection_pool.idle)
+metrics.gauge("pool_waiting_callers", lambda: connection_pool.waiting)
+metrics.gauge("pool_max_connections", lambda: connection_pool.maxconn)
+# Connections opened, pinged and replaced (broken, past max lifetime or idle too long)
+for _event in ("opened", "pings", "broken", "expired", "idle_closed", "retries"):
+    metrics.gauge("pool_connection_events", lambda event=_event: connection_pool.stats[event], event=_event)
+
+# Plan-based row/cost limits and per-call timeouts for the write tools, see --max-write-rows
+write_guard = WriteGuard()
+
+
+SCHEMA_QUERY = """
+SELECT
+    cols.table_schema,
+    cols.table_name,
+    cols.column_name,
+    cols.data_type,
+    cols.is_nullable,
+    cons.constraint_type,
+    cons.constraint_name,
+    fk.references_table AS referenced_table,
+    fk.references_column AS referenced_column
+FROM information_schema.columns cols
+LEFT JOIN information_schema.key_column_usage kcu
+    ON cols.table_schema = kcu.table_schema
+    AND cols.table_name = kcu.table_name
+    AND cols.column_name = kcu.column_name
+LEFT JOIN information_schema.table_constraints cons
+    ON kcu.table_schema = cons.table_schema
+    AND kcu.table_name = cons.table_name
+    AND kcu.constraint_name = cons.constraint_name
+LEFT JOIN (
+    SELECT
+        rc.constraint_name,
+        kcu.table_name AS references_table,
+        kcu.column_name AS references_column
+    FROM information_schema.referential_constraints rc
+    JOIN information_schema.key_column_usage kcu
+        ON rc.unique_constraint_name = kcu.constraint_name
+) fk
+    ON cons.constraint_name = fk.constraint_name
+WHERE cols.table_schema = 'public'
+ORDER BY cols.table_schema, cols.table_name, cols.ordinal_position;
+"""
+
+
+def _fetch_json(conn, query, tool):
+    # Blocking helper, runs on a pool thread. Returns one compact JSON string per row (no
+    # indentation, null fields left out) so pages can be cut from the cached result without
+    # re-encoding. A named cursor keeps only FETCH_SIZE rows client-side at a time.
+    curs = conn.cursor(name=f"mcp_{tool}")
+    encoded = []
+    try:
+        with metrics.timer("tool", tool=tool, phase="execute"):
+            curs.execute(query)
+        while True:
+            with metrics.timer("tool", tool=tool, phase="execute"):
+                rows = curs.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            # a named cursor only has a description after the first fetch
+            with metrics.timer("tool", tool=tool, phase="serialize"):
+                encoded.extend(encode_rows(curs.description, rows))
+    finally:
+        curs.close()
+    conn.rollback()
+    return tuple(encoded)
+
+
+def _cached_page(conn, key, query, tool, page_size, page_token):
+    # Pages share the cached result; the token carries the offset and the catalog version
+    # it was cut from, so a schema change between pages is reported instead of mixed in
+    version, encoded = schema_cache.get_versioned(conn, key, lambda c: _fetch_json(c, query, tool))
+    check = fingerprint(key, version)
+    start = 0
+    if page_token:
+        try:
+            state = decode_page_token(page_token)
+        except ValueError as e:
+            return json.dumps({"error": str(e)})
+        if state.get("v") != check:
+            return json.dumps({"error": "The schema changed since the first page; call again without page_token."})
+        start = int(state.get("offset", 0))
+    with metrics.timer("tool", tool=tool, phase="serialize"):
+        return page_json(encoded, start, clamp_page_size(page_size), {"v": check})
+
+
+def _timed_out(e) -> bool:
+    from psycopg2 import errors
+    return isinstance(e, (errors.QueryCanceled, errors.LockNotAvailable))
+
+
+def _execute_write(conn, query):
+    # Blocking helper, runs on a pool thread. The statements run one at a time in one
+    # transaction, each checked against the write guard's plan limits just before it runs
+    # (so it is planned after the statements before it); a rejection rolls back all of them.
+    import psycopg2
+
+    query_cursor = conn.cursor()
+    try:
+        with metrics.timer("tool", tool="execute_write_query", phase="execute"):
+            write_guard.apply_timeouts(query_cursor)
+            for index, statement in enumerate(split_statements(query)):
+                rejection = write_guard.check(query_cursor, statement)
+                if rejection is not None:
+                    conn.rollback()
+                    metrics.inc("write_rejections", tool="execute_write_query")
+                    logger.warning("execute_write_query rejected: %s", rejection["error"])
+                    return [{**rejection, "statement": index}]
+                query_cursor.execute(statement)
+            conn.commit()
+        return ["Operation successful"]
+    except psycopg2.Error as e:
+        conn.rollback()
+        metrics.inc("rollbacks", tool="execute_write_query")
+        metrics.inc("errors", tool="execute_write_query")
+        logger.warning("execute_write_query failed: %s", e)
+        if _timed_out(e):
+            metrics.inc("write_timeouts", tool="execute_write_query")
+            return [{"status": "timed out", "error": str(e).strip(), "limits": write_guard.limits(),
+                     "hint": "The statement ran too long or waited too long for a lock; narrow it or retry later."}]
+        return ["Could not perform the operation due to error: " + str(e)]
+    finally:
+        query_cursor.close()
+
+
+# Parsed procedure signatures per (database, catalog version); rebuilt when DDL changes them
+_procedure_catalogs = {}
+
+
+def _procedure_catalog(conn):
+    # Same cached rows as get_procedure_info, so listing and calling share one catalog read
+    version, encoded = schema_cache.get_versioned(
+        conn, "procedures", lambda c: _fetch_json(c, PROCEDURE_QUERY, "get_procedure_info"))
+    key = (conn.info.dbname, version)
+    catalog = _procedure_catalogs.get(key)
+    if catalog is None:
+        _procedure_catalogs.clear()
+        catalog = _procedure_catalogs[key] = ProcedureCatalog(encoded)
+    return catalog
+
+
+def _call_procedure(conn, name, args):
+    # Blocking helper, runs on a pool thread. Arguments are checked against the signature
+    # before anything is sent; the CALL binds them as parameters under the write timeouts.
+    import psycopg2
+
+    try:
+        signature, sql, params = _procedure_catalog(conn).bind(name, args)
+    except ProcedureCallError as e:
+        metrics.inc("procedure_rejections", tool="call_procedure")
+        return e.result()
+    curs = conn.cursor()
+    try:
+        with metrics.timer("tool", tool="call_procedure", phase="execute"):
+            write_guard.apply_timeouts(curs)
+            curs.execute(sql, params)
+            # INOUT arguments come back as a single row
+            out = dict(zip([d[0] for d in curs.description], curs.fetchone())) if curs.description else None
+            conn.commit()
+        result = {"status": "ok", "procedure": signature}
+        if out:
+            result["out"] = json.loads(json.dumps(out, default=str))
+        return result
+    except psycopg2.Error as e:
+        conn.rollback()
+        metrics.inc("rollbacks", tool="call_procedure")
+        metrics.inc("errors", tool="call_procedure")
+        logger.warning("call_procedure %s failed: %s", name, e)
+        return {"status": "timed out" if _timed_out(e) else "failed", "procedure": signature,
+                "error": str(e).strip()}
+    finally:
+        curs.close()
+
+
+def _execute_write_batch(conn, statements, stop_on_error):
+    # Blocking helper, runs on a pool thread. All statements share one transaction and one
+    # commit; with stop_on_error=False each statement runs under a savepoint so a failing
+    # statement is undone on its own and the rest of the batch still commits.
+    with metrics.timer("tool", tool="execute_write_batch", phase="execute"):
+        result = _run_write_batch(conn, statements, stop_on_error)
+    if result["status"] != "committed":
+        metrics.inc("rollbacks", tool="execute_write_batch")
+        metrics.inc("errors", tool="execute_write_batch")
+    failed = sum(1 for r in result["results"] if "error" in r)
+    if failed:
+        metrics.inc("statement_errors", failed, tool="execute_write_batch")
+    rejected = sum(1 for r in result["results"] if r.get("status") == "rejected")
+    if rejected:
+        metrics.inc("write_rejections", rejected, tool="execute_write_batch")
+    timed_out = sum(1 for r in result["results"] if r.get("status") == "timed out")
+    if timed_out:
+        metrics.inc("write_timeouts", timed_out, tool="execute_write_batch")
+    return result
+
+
+def _run_write_batch(conn, statements, stop_on_error):
+    import psycopg2
+    from prepared import execute_prepared
+
+    results = []
+    savepoint = False
+    curs = conn.cursor()
+    try:
+        write_guard.apply_timeouts(curs)
+        for index, statement in enumerate(statements):
+            sql = statement.get("sql", "")
+            params = statement.get("params") or []
+            if sql.startswith("SELECT"):
+                results.append({"index": index, "error": "SELECT statements are not allowed"})
+                if stop_on_error:
+                    conn.rollback()
+                    return {"status": "rolled back", "results": results}
+                continue
+            prefix = ""
+            if not stop_on_error:
+                # savepoint commands travel in the same round trip as the statement
+                prefix = "RELEASE SAVEPOINT batch_statement; " if savepoint else ""
+                prefix += "SAVEPOINT batch_statement; "
+                savepoint = True
+            try:
+                if write_guard.explainable(sql):
+                    # the savepoint goes ahead of the EXPLAIN, so a statement that cannot be
+                    # planned is undone like one that fails to run
+                    rejection = write_guard.check(curs, sql, params, prefix=prefix)
+                    prefix = ""
+                    if rejection is not None:
+                        results.append({"index": index, **rejection})
+                        if stop_on_error:
+                            conn.rollback()
+                            return {"status": "rolled back", "results": results}
+                        continue
+                execute_prepared(curs, sql, params, prefix=prefix)
+                results.append({"index": index, "rowcount": curs.rowcount})
+            except psycopg2.Error as e:
+                results.append({"index": index, "error": str(e).strip()})
+                if _timed_out(e):
+                    results[-1]["status"] = "timed out"
+                if stop_on_error:
+                    conn.rollback()
+                    return {"status": "rolled back", "results": results}
+                curs.execute("ROLLBACK TO SAVEPOINT batch_statement")
+                metrics.inc("savepoint_rollbacks", tool="execute_write_batch")
+        conn.commit()
+        return {"status": "committed", "results": results}
+    except psycopg2.Error as e:
+        conn.rollback()
+        return {"status": "rolled back", "error": str(e).strip(), "results": results}
+    finally:
+        curs.close()
+
+
+@asynccontextmanager
+async def _checkout(tool):
+    # Checks out a pooled connection, recording how long the tool waited for it
+    start = time.perf_counter()
+    pool = await _get_pool()
+    async with pool.connection() as conn:
+        metrics.observe("tool", time.perf_counter() - start, tool=tool, phase="pool_wait")
+        yield conn
+
+
+async def _run_read(tool, func, *args):
+    # Reads are safe to repeat: if the connection breaks during the call it is discarded
+    # and the call runs once more on another connection (counted in the pool's "retries"
+    # stat). Writes are not retried.
+    start = time.perf_counter()
+    pool = await _get_pool()
+    waited = []
+
+    def timed(conn, *call_args):
+        # the first attempt's wait for a connection, as recorded by _checkout
+        if not waited:
+            waited.append(time.perf_counter() - start)
+            metrics.observe("tool", waited[0], tool=tool, phase="pool_wait")
+        return func(conn, *call_args)
+
+    return await pool.run_with_retry(timed, *args)
+
+
+# Tool calls running at once per MCP session; sessions share the pool, so one busy client
+# cannot take every connection
+max_session_concurrency = 4
+_session_slots = weakref.WeakKeyDictionary()
+metrics.gauge("mcp_sessions", lambda: len(_session_slots))
+
+
+def _session_semaphore():
+    # The MCP request context is only set while serving a request from a client
+    try:
+        from mcp.server.lowlevel.server import request_ctx
+        session = request_ctx.get().session
+    except (ImportError, LookupError):
+        return None
+    slots = _session_slots.get(session)
+    if slots is None:
+        slots = _session_slots[session] = asyncio.Semaphore(max_session_concurrency)
+    return slots
+
+
+@asynccontextmanager
+async def _tool_call(tool):
+    # Times the whole tool call and counts calls and errors
+    metrics.inc("calls", tool=tool)
+    start = time.perf_counter()
+    slots = _session_semaphore()
+    if slots is not None:
+        await slots.acquire()
+        metrics.observe("tool", time.perf_counter() - start, tool=tool, phase="session_wait")
+    try:
+        yield
+    except Exception:
+        metrics.inc("errors", tool=tool)
+        raise
+    finally:
+        if slots is not None:
+            slots.release()
+        metrics.observe("tool", time.perf_counter() - start, tool=tool, phase="total")
+
+
+def get_diagnostics() -> dict:
+    """Latency histograms, counters, pool occupancy and schema cache statistics."""
+    return {**metrics.snapshot(), "schema_cache": schema_cache.stats()}
 
 
 class Contoso_WritePlugin:
-    def __init__(self):
-        init_pool()
+    # The connection pool is opened on the first tool call, not here, so the MCP
+    # handshake does not wait for a token fetch and a database connection.
     @kernel_function
-    async def get_procedure_info(self) -> str:
-        global connection_pool
-        """Gets information about available stored procedures in the database."""
-        conn = connection_pool.getconn()
+    async def get_procedure_info(
+        self,
+        page_size: Annotated[int, "Procedures per page (default 200, max 1000)."] = 200,
+        page_token: Annotated[str | None, "next_page_token from the previous page, if any."] = None,
+    ) -> str:
+        """Gets the stored procedures and functions in the database with their argument names, types and modes. Results are paged: while next_page_token is not null, call again with it to get the rest."""
         res = ""
         try:
-            procedure_query = """
-            SELECT
-                routine_schema,
-                routine_name,
-                routine_type,
-                data_type AS return_type,
-                specific_name
-            FROM information_schema.routines
-            WHERE routine_schema = 'public'
-            ORDER BY routine_schema, routine_name;
-            """
-            curs = conn.cursor()
-            curs.execute(procedure_query)
-            columns = [desc[0] for desc in curs.description]
-            rows = curs.fetchall()
-            curs.close()
-            proc_info = [dict(zip(columns, row)) for row in rows]
-            res =  json.dumps(proc_info, indent=2)
+            async with _tool_call("get_procedure_info"):
+                res = await _run_read("get_procedure_info", _cached_page, "procedures", PROCEDURE_QUERY,
+                                      "get_procedure_info", page_size, page_token)
         except Exception as e:
-            print(f"Could not execute query: {e}")
-            res =  ""
-        finally:
-            connection_pool.putconn(conn)
+            logger.warning("Could not execute query: %s", e)
+            res = ""
         return res
 
+    @kernel_function
+    async def call_procedure(
+        self,
+        name: Annotated[str, "Procedure name, as listed by get_procedure_info."],
+        args: Annotated[dict | None, "Argument values by parameter name, e.g. "
+                        "{\"p_product_id\": 3, \"p_price\": 19.99}. Arguments with defaults can be left out."] = None,
+    ) -> dict:
+        """Calls a stored procedure with typed, bound arguments. The arguments are checked against the procedure's signature before the call; prefer this over CALL through execute_write_query."""
+        try:
+            async with _tool_call("call_procedure"), _checkout("call_procedure") as conn:
+                return await connection_pool.run(_call_procedure, conn, name, args or {})
+        except Exception as e:
+            logger.warning("call_procedure failed: %s", e)
+            return {"status": "failed", "error": str(e)}
+
     @kernel_function
     async def execute_write_query(self, query: str) -> list:
-        global connection_pool
+        """Executes a write operation (INSERT, UPDATE, DELETE, CALL, DDL) on the database. Writes the planner expects to touch too many rows, or that run or wait on locks too long, are rejected with a plan summary."""
         res = []
         if not query.startswith("SELECT"):
-            conn = connection_pool.getconn()
             try:
-                query_cursor = conn.cursor()
-                query_cursor.execute(query)
-                res = ["Operation successful"]
-                conn.commit()     
-            except psycopg2.Error as e:
-                conn.rollback()
-                res = ["Could not perform the operation due to error: " + str(e)]   
-            finally:
-                query_cursor.close()
-                connection_pool.putconn(conn)
-            return res
+                async with _tool_call("execute_write_query"), _checkout("execute_write_query") as conn:
+                    res = await connection_pool.run(_execute_write, conn, query)
+            except Exception as e:
+                logger.warning("execute_write_query failed: %s", e)
+                res = ["Could not perform the operation due to error: " + str(e)]
+        return res
+
+    @kernel_function
+    async def execute_write_batch(
+        self,
+        statements: Annotated[list[dict], "Write statements to run in one transaction. Each item is "
+                              "{\"sql\": \"UPDATE products SET price = %s WHERE product_id = %s\", "
+                              "\"params\": [10.5, 3]}, with %s placeholders for the bound values."],
+        stop_on_error: Annotated[bool, "Roll back the whole batch on the first error (default). "
+                                 "If false, only the failing statements are undone."] = True,
+    ) -> dict:
+        """Executes several parameterized write statements in a single transaction and returns per-statement row counts."""
+        try:
+            async with _tool_call("execute_write_batch"), _checkout("execute_write_batch") as conn:
+                return await connection_pool.run(_execute_write_batch, conn, statements, stop_on_error)
+        except Exception as e:
+            logger.warning("execute_write_batch failed: %s", e)
+            return {"status": "failed", "error": str(e)}
+
     @kernel_function
-    async def get_db_schema(self) -> str:
-        global connection_pool
-        """Gets the database schema."""
+    async def get_db_schema(
+        self,
+        page_size: Annotated[int, "Columns per page (default 200, max 1000)."] = 200,
+        page_token: Annotated[str | None, "next_page_token from the previous page, if any."] = None,
+    ) -> str:
+        """Gets the database schema, one row per column. Results are paged: while next_page_token is not null, call again with it to get the rest."""
         res = ""
-        conn = connection_pool.getconn()
         try:
-            
-            query = """
-            SELECT
-                cols.table_schema,
-                cols.table_name,
-                cols.column_name,
-                cols.data_type,
-                cols.is_nullable,
-                cons.constraint_type,
-                cons.constraint_name,
-                fk.references_table AS referenced_table,
-                fk.references_column AS referenced_column
-            FROM information_schema.columns cols
-            LEFT JOIN information_schema.key_column_usage kcu
-                ON cols.table_schema = kcu.table_schema
-                AND cols.table_name = kcu.table_name
-                AND cols.column_name = kcu.column_name
-            LEFT JOIN information_schema.table_constraints cons
-                ON kcu.table_schema = cons.table_schema
-                AND kcu.table_name = cons.table_name
-                AND kcu.constraint_name = cons.constraint_name
-            LEFT JOIN (
-                SELECT
-                    rc.constraint_name,
-                    kcu.table_name AS references_table,
-                    kcu.column_name AS references_column
-                FROM information_schema.referential_constraints rc
-                JOIN information_schema.key_column_usage kcu
-                    ON rc.unique_constraint_name = kcu.constraint_name
-            ) fk
-                ON cons.constraint_name = fk.constraint_name
-            WHERE cols.table_schema = 'public'
-            ORDER BY cols.table_schema, cols.table_name, cols.ordinal_position;
-            """
-            curs = conn.cursor()
-            curs.execute(query)
-            columns = [desc[0] for desc in curs.description]
-            rows = curs.fetchall()
-            curs.close()
-            schema_info = [dict(zip(columns, row)) for row in rows]
-            res = json.dumps(schema_info, indent=2)
+            async with _tool_call("get_db_schema"):
+                res = await _run_read("get_db_schema", _cached_page, "schema", SCHEMA_QUERY, "get_db_schema",
+                                      page_size, page_token)
         except Exception as e:
-            print(f"Could not fetch database schema: {e}")
+            logger.warning("Could not fetch database schema: %s", e)
             res = ""
-        finally:
-            connection_pool.putconn(conn)
         return res
 
+    @kernel_function
+    async def get_server_diagnostics(self) -> str:
+        """Gets server performance diagnostics: per-tool latency (pool wait, execute, serialize, total), error counts and connection pool usage."""
+        return json.dumps(get_diagnostics(), separators=(",", ":"))
+
+
+class _RequestTracker:
+    # Counts in-flight HTTP requests so shutdown can wait for them and refuse new ones
+    def __init__(self):
+        self.in_flight = 0
+        self.draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @asynccontextmanager
+    async def track(self):
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.set()
+
+    async def drain(self, timeout):
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Shutting down with %d requests still in flight", self.in_flight)
+
+
+async def _send_unavailable(send):
+    await send({"type": "http.response.start", "status": 503,
+                "headers": [(b"content-type", b"text/plain"), (b"retry-after", b"5")]})
+    await send({"type": "http.response.body", "body": b"server is shutting down"})
+
+
+async def serve_http(server, transport: str, host: str, port: int, drain_timeout: float) -> None:
+    """Serves the MCP server over streamable HTTP (/mcp/) or SSE (/sse) until interrupted."""
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.routing import Mount, Route
+
+    tracker = _RequestTracker()
+    metrics.gauge("http_requests_in_flight", lambda: tracker.in_flight)
+
+    if transport == "streamable-http":
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+
+        manager = StreamableHTTPSessionManager(app=server)
+
+        async def handle_mcp(scope, receive, send):
+            if tracker.draining:
+                await _send_unavailable(send)
+                return
+            async with tracker.track():
+                await manager.handle_request(scope, receive, send)
+
+        routes = [Mount("/mcp", app=handle_mcp)]
+        sessions = manager.run
+    else:
+        from mcp.server.sse import SseServerTransport
+        from starlette.responses import Response
 
+        sse = SseServerTransport("/messages/")
+
+        async def handle_sse(request):
+            if tracker.draining:
+                return Response("server is shutting down", status_code=503)
+            async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+                await server.run(read_stream, write_stream, server.create_initialization_options())
+            return Response()
+
+        async def handle_messages(scope, receive, send):
+            if tracker.draining:
+                await _send_unavailable(send)
+                return
+            async with tracker.track():
+                await sse.handle_post_message(scope, receive, send)
+
+        routes = [Route("/sse", endpoint=handle_sse, methods=["GET"]), Mount("/messages/", app=handle_messages)]
+        sessions = nullcontext
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with sessions():
+            logger.info("Serving MCP over %s on http://%s:%d", transport, host, port)
+            yield
+            await tracker.drain(drain_timeout)
+        if connection_pool is not None:
+            connection_pool.closeall()
+
+    class DrainingServer(uvicorn.Server):
+        # new requests get a 503 as soon as a shutdown signal arrives
+        def handle_exit(self, sig, frame):
+            tracker.draining = True
+            super().handle_exit(sig, frame)
+
+    config = uvicorn.Config(Starlette(routes=routes, lifespan=lifespan), host=host, port=port,
+                            timeout_graceful_shutdown=drain_timeout, log_level="warning")
+    await DrainingServer(config).serve()
+
+
+def _check_startup_budget(budget: float) -> bool:
+    startup_timings["server_ready"] = round(time.perf_counter() - _process_start, 3)
+    for phase, seconds in startup_timings.items():
+        metrics.gauge("startup_seconds", lambda seconds=seconds: seconds, phase=phase)
+    within = startup_timings["server_ready"] <= budget
+    if within:
+        logger.info("Server ready in %.3fs %s", startup_timings["server_ready"], startup_timings)
+    else:
+        logger.warning("Startup took %.3fs, over the %.1fs budget: %s",
+                       startup_timings["server_ready"], budget, startup_timings)
+    return within
+
+
+async def _warm_pool():
+    try:
+        await _get_pool()
+    except Exception as e:
+        logger.warning("Could not open the connection pool yet, retrying on the first tool call: %s", e)
+
+
+def check_startup(budget: float) -> int:
+    """Measures the imports needed to serve the handshake and returns a process exit code."""
+    from semantic_kernel.agents import ChatCompletionAgent  # noqa: F401
+    from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion  # noqa: F401
+    import mcp.server.stdio  # noqa: F401
+
+    within = _check_startup_budget(budget)
+    print(json.dumps({"budget_seconds": budget, "within_budget": within, **startup_timings}))
+    return 0 if within else 1
+
+
+async def run(transport: Literal["stdio", "streamable-http", "sse"] = "stdio", host: str = "127.0.0.1",
+              port: int = 8000, drain_timeout: float = 30.0, startup_budget: float = 2.0) -> None:
+    from semantic_kernel.agents import ChatCompletionAgent
+    from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 
-async def run(transport: Literal["stdio"] = "stdio") -> None:
     agent = ChatCompletionAgent(
         service=AzureChatCompletion(),
         name="WriteAgent",
@@ -159,17 +736,23 @@ async def run(transport: Literal["stdio"] = "stdio") -> None:
 
                         Below are the instructions you must follow:
                         - You must always first esnure you have the database schema.
-                        - Always prioritize using a stored procedure if available for the task.
+                        - Schema and procedure results are paged; keep calling with next_page_token until it is null.
+                        - Always prioritize using a stored procedure if available for the task. get_procedure_info lists each procedure's arguments; run it with call_procedure, passing the arguments by name.
                         - For adding a new record, ensure that there is value provided for all required NOT NULL columns. Ask the user for any missing values.                       
                         - You can also create new stored procedures. Stored procedures should not have OUT parameters.
                         - In case of a duplicate record, add the new record with a different primary key value. 
                         - You must always ensure to not violate referential integrity.
                         - Before running the query,ask user to confirm once.
+                        - Writes the planner expects to touch too many rows are rejected with the plan summary; narrow the WHERE clause or split the change instead of retrying it unchanged.
                         """,
         plugins=[Contoso_WritePlugin()],  # add the plugin to the agent
     )
 
     server = agent.as_mcp_server()
+    _check_startup_budget(startup_budget)
+
+    # open the pool while the client runs the handshake instead of on the first tool call
+    warm_pool = asyncio.create_task(_warm_pool())
 
     if transport == "stdio":
         from mcp.server.stdio import stdio_server
@@ -179,8 +762,25 @@ async def run(transport: Literal["stdio"] = "stdio") -> None:
                 await server.run(read_stream, write_stream, server.create_initialization_options())
 
         await handle_stdin()
+    else:
+        await serve_http(server, transport, host, port, drain_timeout)
 
 
 if __name__ == "__main__":
     args = parse_arguments()
-    anyio.run(run, args.transport)
\ No newline at end of file
+    # stdout carries the MCP protocol on the stdio transport, so logs go to stderr
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.metrics_file:
+        start_file_exporter(metrics, args.metrics_file)
+    if args.metrics_port:
+        start_http_exporter(metrics, args.metrics_port)
+    max_session_concurrency = args.max_session_concurrency
+    pool_warmup = args.pool_warmup
+    write_guard = WriteGuard(args.max_write_rows, args.max_write_cost, args.write_statement_timeout,
+                             args.write_lock_timeout)
+    if args.check_startup:
+        sys.exit(check_startup(args.startup_budget))
+    import anyio
+    anyio.run(functools.partial(run, args.transport, args.host, args.port, args.drain_timeout,
+                                args.startup_budget))
\ No newline at end of file
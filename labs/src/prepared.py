@@ -0,0 +1,98 @@
+import itertools
+import re
+
+from psycopg2 import extensions
+
+# psycopg2 placeholders and escapes; like psycopg2, quoting is not taken into account
+_PLACEHOLDER = re.compile(r"%%|%s|%\(")
+
+
+class PreparingConnection(extensions.connection):
+    """psycopg2 connection that remembers the statements prepared on its session."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = {}
+        # names whose PREPARE or DEALLOCATE may or may not have run when a call failed
+        self.unconfirmed = set()
+        self._statement_ids = itertools.count(1)
+
+    def next_statement_name(self) -> str:
+        return f"mcp_stmt_{next(self._statement_ids)}"
+
+
+def to_positional(sql: str):
+    """Rewrites psycopg2 %s placeholders as $1, $2, ... for PREPARE.
+
+    Returns (statement, parameter count), or None when the statement uses named
+    %(name)s placeholders, which cannot be prepared positionally.
+    """
+    count = 0
+    out = []
+    pos = 0
+    for m in _PLACEHOLDER.finditer(sql):
+        tok = m.group()
+        if tok == "%(":
+            return None
+        out.append(sql[pos:m.start()])
+        if tok == "%%":
+            out.append("%")
+        else:
+            count += 1
+            out.append(f"${count}")
+        pos = m.end()
+    out.append(sql[pos:])
+    return "".join(out), count
+
+
+def execute_prepared(cursor, sql: str, params=None, max_prepared: int = 100, prefix: str = ""):
+    """Executes sql with params, reusing a server-side prepared statement per shape.
+
+    The first execution of a statement shape sends PREPARE and EXECUTE in a single round
+    trip; later executions on the same session only send EXECUTE, so the server skips
+    parsing and planning. Connections that are not PreparingConnection instances, and
+    statements without parameters, fall back to a plain execute. prefix is plain SQL
+    (e.g. a SAVEPOINT) sent in the same round trip ahead of the statement.
+
+    A statement prepared by a call whose EXECUTE failed is deallocated on the next call,
+    so at most max_prepared statements stay on the session.
+    """
+    conn = cursor.connection
+    if not params or not isinstance(conn, PreparingConnection):
+        cursor.execute(prefix + sql, params or None)
+        return
+    # names a failed call may have left prepared (or not deallocated) on the server
+    created = []
+    if conn.unconfirmed:
+        # PREPARE and DEALLOCATE are not undone by a rollback; drop what a failed call left behind
+        cursor.execute("SELECT name FROM pg_prepared_statements WHERE name = ANY(%s)", (sorted(conn.unconfirmed),))
+        created = [leaked for (leaked,) in cursor.fetchall()]
+        prefix += "".join(f"DEALLOCATE {leaked}; " for leaked in created)
+        conn.unconfirmed.clear()
+    name = conn.prepared.get(sql)
+    statement = None
+    if name is None:
+        converted = to_positional(sql)
+        if converted is None or converted[1] != len(params):
+            statement = prefix + sql
+        else:
+            if len(conn.prepared) >= max_prepared:
+                oldest = conn.prepared.pop(next(iter(conn.prepared)))
+                created.append(oldest)
+                prefix += f"DEALLOCATE {oldest}; "
+            name = conn.next_statement_name()
+            created.append(name)
+            prefix += f"PREPARE {name} AS {converted[0]}; ".replace("%", "%%")
+    if statement is None:
+        statement = f"{prefix}EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+    try:
+        cursor.execute(statement, params)
+    except BaseException:
+        # the new statement may exist on the server without being recorded; the next call,
+        # after the caller's rollback, checks which of these exist and deallocates them
+        conn.unconfirmed.update(created)
+        raise
+    if name is not None:
+        # (re)insert at the end so eviction drops the least recently used statement
+        conn.prepared.pop(sql, None)
+        conn.prepared[sql] = name
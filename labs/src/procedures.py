@@ -0,0 +1,226 @@
+import datetime
+import json
+import re
+import uuid
+from decimal import Decimal, InvalidOperation
+
+# Routines defined in the public schema, one row each, with their argument signatures.
+# Functions that belong to extensions (pgvector installs hundreds into public) are left out.
+PROCEDURE_QUERY = """
+SELECT
+    n.nspname AS routine_schema,
+    p.proname AS routine_name,
+    CASE p.prokind WHEN 'p' THEN 'PROCEDURE' ELSE 'FUNCTION' END AS routine_type,
+    CASE WHEN p.prokind = 'p' THEN NULL ELSE format_type(p.prorettype, NULL) END AS return_type,
+    p.proname || '_' || p.oid AS specific_name,
+    pg_get_function_identity_arguments(p.oid) AS signature,
+    (SELECT json_agg(json_build_object(
+                'name', nullif(p.proargnames[a.i], ''),
+                'type', format_type(a.t, NULL),
+                'mode', coalesce(p.proargmodes[a.i]::text, 'i')) ORDER BY a.i)
+     FROM unnest(coalesce(p.proallargtypes, p.proargtypes::oid[])) WITH ORDINALITY a(t, i)) AS arguments,
+    p.pronargdefaults AS defaults,
+    obj_description(p.oid, 'pg_proc') AS description
+FROM pg_proc p
+JOIN pg_namespace n ON n.oid = p.pronamespace
+WHERE n.nspname = 'public' AND p.prokind IN ('p', 'f')
+  AND NOT EXISTS (SELECT 1 FROM pg_depend d
+                  WHERE d.classid = 'pg_proc'::regclass AND d.objid = p.oid AND d.deptype = 'e')
+ORDER BY routine_name, specific_name;
+"""
+
+_INTEGER_LIMITS = {"smallint": 2 ** 15, "integer": 2 ** 31, "bigint": 2 ** 63}
+_DECIMAL_TYPES = {"numeric", "real", "double precision", "money"}
+_TEXT_TYPES = {"text", "character varying", "character", "name", "citext", "bpchar"}
+_BOOLEANS = {"true": True, "t": True, "yes": True, "1": True, "false": False, "f": False, "no": False, "0": False}
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z_0-9$]*")
+
+
+def _quote(identifier: str) -> str:
+    # quoted identifier, with % doubled for psycopg2's parameter substitution
+    return '"' + identifier.replace('"', '""').replace("%", "%%") + '"'
+
+
+class ProcedureCallError(ValueError):
+    """Arguments that do not fit any signature of the procedure; nothing was sent to the server."""
+
+    def __init__(self, message, errors=(), signatures=()):
+        super().__init__(message)
+        self.errors = list(errors)
+        self.signatures = list(signatures)
+
+    def result(self) -> dict:
+        result = {"status": "invalid arguments", "error": str(self)}
+        if self.errors:
+            result["errors"] = self.errors
+        if self.signatures:
+            result["signatures"] = self.signatures
+        return result
+
+
+def coerce(value, pg_type: str):
+    """Checks value against a PostgreSQL type name (from format_type) and normalizes it.
+
+    Raises ValueError with a message meant for the agent. Types not listed here are passed
+    through as they are and checked by the server's cast.
+    """
+    if value is None:
+        return None
+    if pg_type.endswith("[]"):
+        if not isinstance(value, (list, tuple)):
+            raise ValueError(f"expected an array of {pg_type[:-2]}")
+        return [coerce(v, pg_type[:-2]) for v in value]
+    if pg_type in _INTEGER_LIMITS:
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        elif isinstance(value, str) and re.fullmatch(r"\s*[-+]?\d+\s*", value):
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"expected an integer, got {value!r}")
+        limit = _INTEGER_LIMITS[pg_type]
+        if not -limit <= value < limit:
+            raise ValueError(f"{value} is out of range for {pg_type}")
+        return value
+    if pg_type in _DECIMAL_TYPES:
+        if isinstance(value, str):
+            try:
+                return Decimal(value.strip())
+            except InvalidOperation:
+                raise ValueError(f"expected a number, got {value!r}") from None
+        if isinstance(value, bool) or not isinstance(value, (int, float, Decimal)):
+            raise ValueError(f"expected a number, got {value!r}")
+        return value
+    if pg_type == "boolean":
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in _BOOLEANS:
+            return _BOOLEANS[value.strip().lower()]
+        raise ValueError(f"expected true or false, got {value!r}")
+    if pg_type in _TEXT_TYPES:
+        if isinstance(value, (dict, list, tuple)):
+            raise ValueError(f"expected a string, got {type(value).__name__}")
+        return value if isinstance(value, str) else str(value)
+    if pg_type == "date":
+        try:
+            return datetime.date.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError(f"expected a date (YYYY-MM-DD), got {value!r}") from None
+    if pg_type.startswith("timestamp"):
+        try:
+            return datetime.datetime.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError(f"expected an ISO 8601 timestamp, got {value!r}") from None
+    if pg_type in ("json", "jsonb"):
+        return json.dumps(value)
+    if pg_type == "uuid":
+        try:
+            return str(uuid.UUID(str(value)))
+        except ValueError:
+            raise ValueError(f"expected a UUID, got {value!r}") from None
+    if isinstance(value, (dict, list, tuple)):
+        raise ValueError(f"expected a single {pg_type} value, got {type(value).__name__}")
+    return value
+
+
+class ProcedureSignature:
+    """One procedure overload from PROCEDURE_QUERY, with the CALL statements built for it."""
+
+    def __init__(self, record: dict):
+        self.name = record["routine_name"]
+        self.schema = record.get("routine_schema", "public")
+        self.signature = f"{self.name}({record.get('signature', '')})"
+        self.arguments = record.get("arguments") or []
+        self.inputs = [a for a in self.arguments if a["mode"] in ("i", "b", "v")]
+        defaults = record.get("defaults") or 0
+        self.required = self.inputs[:len(self.inputs) - defaults]
+        # unnamed parameters are addressed as $1, $2, ... (their input position)
+        self.input_names = [a.get("name") or f"${i + 1}" for i, a in enumerate(self.inputs)]
+        self.named = all(a.get("name") and _IDENTIFIER.fullmatch(a["name"]) for a in self.arguments)
+        self._statements = {}
+
+    def missing(self, args: dict) -> list:
+        return [self.input_names[i] for i in range(len(self.required)) if self.input_names[i] not in args]
+
+    def unknown(self, args: dict) -> list:
+        return [key for key in args if key not in self.input_names]
+
+    def statement(self, given: tuple) -> str:
+        """The CALL text for this set of given argument names, built once and reused.
+
+        Arguments are bound as %s parameters with an explicit cast to the declared type, so
+        the server resolves this exact overload and never sees agent-written SQL. Omitted
+        arguments with defaults are skipped with named notation, OUT arguments get NULL.
+        """
+        sql = self._statements.get(given)
+        if sql is None:
+            parts = []
+            inputs = iter(self.input_names)
+            for argument in self.arguments:
+                if argument["mode"] == "o":
+                    value = f"NULL::{argument['type']}"
+                else:
+                    key = next(inputs)
+                    if key not in given:
+                        continue
+                    value = f"%s::{argument['type']}"
+                parts.append(f"{argument['name']} => {value}" if self.named else value)
+            sql = f"CALL {_quote(self.schema)}.{_quote(self.name)}({', '.join(parts)})"
+            self._statements[given] = sql
+        return sql
+
+    def bind(self, args: dict):
+        """Returns (sql, params) for a call with args, or raises ProcedureCallError."""
+        errors = [f"{key}: missing required argument" for key in self.missing(args)]
+        errors += [f"{key}: no such argument" for key in self.unknown(args)]
+        params = []
+        given = tuple(key for key in self.input_names if key in args)
+        if not self.named and given != tuple(self.input_names[:len(given)]):
+            errors.append("arguments with defaults can only be left out from the end, "
+                          "this procedure has unnamed parameters")
+        for key, argument in zip(self.input_names, self.inputs):
+            if key in args:
+                try:
+                    params.append(coerce(args[key], argument["type"]))
+                except ValueError as e:
+                    errors.append(f"{key} ({argument['type']}): {e}")
+        if errors:
+            raise ProcedureCallError(f"arguments do not match {self.signature}", errors, [self.signature])
+        return self.statement(given), params
+
+
+class ProcedureCatalog:
+    """Procedure signatures by name, parsed from the JSON rows of PROCEDURE_QUERY."""
+
+    def __init__(self, encoded_rows):
+        self.procedures = {}
+        for encoded in encoded_rows:
+            record = json.loads(encoded)
+            if record.get("routine_type") == "PROCEDURE":
+                self.procedures.setdefault(record["routine_name"], []).append(ProcedureSignature(record))
+
+    def bind(self, name: str, args: dict):
+        """Picks the overload that fits args and returns (signature, sql, params)."""
+        overloads = self.procedures.get(name)
+        if not overloads:
+            raise ProcedureCallError(f"no stored procedure named {name!r}; see get_procedure_info")
+        fitting = [p for p in overloads if not p.missing(args) and not p.unknown(args)]
+        if len(fitting) > 1:
+            # unnamed overloads with the same arity: keep the ones whose types accept the values
+            typed = []
+            for procedure in fitting:
+                try:
+                    typed.append((procedure, procedure.bind(args)))
+                except ProcedureCallError:
+                    pass
+            if len(typed) == 1:
+                procedure, (sql, params) = typed[0]
+                return procedure.signature, sql, params
+            raise ProcedureCallError(f"the arguments match more than one overload of {name}",
+                                     signatures=[p.signature for p in fitting])
+        if not fitting:
+            if len(overloads) == 1:
+                overloads[0].bind(args)  # raises with the per-argument errors
+            raise ProcedureCallError(f"the arguments match no overload of {name}",
+                                     signatures=[p.signature for p in overloads])
+        sql, params = fitting[0].bind(args)
+        return fitting[0].signature, sql, params
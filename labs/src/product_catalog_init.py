@@ -1,18 +1,21 @@
 import psycopg2
 from get_conn import get_connection_uri
+from sql_script import execute_sql_script
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
 
 def execute_sql_file(cursor, sql_file_path):
-    with open(sql_file_path, 'r', encoding="utf-8") as file:
-        sql = file.read()
-        print(f"Executing SQL file: {sql_file_path}")
-        print(sql)  # Debug print to verify the content of the SQL file
-        try:
-            cursor.execute(sql)
-        except Exception as e:
-            print(f"Error executing SQL file: {e}")
+    # Statements are streamed from the file; runs of single-table INSERTs are sent as COPY batches
+    print(f"Executing SQL file: {sql_file_path}")
+    try:
+        report = execute_sql_script(cursor, sql_file_path)
+        print(f"Executed {report['statements']} statements in {report['round_trips']} round trips "
+              f"({report['rows_copied']} rows loaded with COPY)")
+        print(f"Timings (s): {report['timings']}")
+        return report
+    except Exception as e:
+        print(f"Error executing SQL file: {e}")
         
 
 
@@ -10,7 +10,13 @@ CREATE TABLE product_catalogue (
     name TEXT,
     category TEXT,
     description TEXT,
-    price REAL
+    price REAL,
+    -- weighted full-text document for hybrid search, maintained by the server on every write
+    search_tsv tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'C')
+    ) STORED
 );
 
 INSERT INTO product_catalogue (id, name, category, description, price) VALUES (1, 'Apple iPhone 14 Pro', 'Smartphone', 'The Apple iPhone 14 Pro is a flagship smartphone featuring a 6.1-inch Super Retina XDR display, the powerful A16 Bionic chip, and a triple rear camera system with 48MP main sensor. With advanced ProMotion technology, this phone offers buttery-smooth visuals and efficient battery usage, perfect for power users. The iPhone 14 Pro also features Face ID authentication and iOS 16, delivering cutting-edge security and a seamless user interface.', 999);
@@ -1969,3 +1975,5 @@ INSERT INTO product_catalogue (id, name, category, description, price) VALUES (1
 INSERT INTO product_catalogue (id, name, category, description, price) VALUES (1954, 'Dyson Purifier Cool TP07', 'Air Purifier', 'The Dyson Purifier Cool TP07 is an advanced air purifier and bladeless fan designed for modern homes. It automatically senses, captures, and reports airborne pollutants in real time, removing 99.97% of particles as small as 0.3 microns with a HEPA filter. The oscillating, bladeless design delivers powerful cooling while purifying, all controllable via the MyDyson app or voice assistants. It’s an efficient solution for improving indoor air quality and comfort.', 649.99);
 INSERT INTO product_catalogue (id, name, category, description, price) VALUES (1955, 'Ubiquiti UniFi Dream Machine Pro', 'Appliance', 'The Ubiquiti UniFi Dream Machine Pro is an all-in-one network appliance ideal for advanced home and small business environments. Combining a security gateway, managed switch, NVR, and network controller in a single rackmount device, it offers robust performance, intuitive management, and scalable protection. With VPN, intrusion detection, and seamless device integration, it’s perfect for users seeking professional-grade networking solutions.', 379.0);
 INSERT INTO product_catalogue (id, name, category, description, price) VALUES (1956, 'D-Link DCS-6500LH Compact Full HD Pan & Tilt Wi-Fi Camera', 'Camera', 'The D-Link DCS-6500LH is a compact Full HD Pan & Tilt Wi-Fi Camera perfect for home surveillance. With 360-degree coverage, motion and sound detection, IR night vision, and secure cloud recording, it provides peace of mind around the clock. The mydlink app offers easy remote access, letting you monitor your home from anywhere. Its discreet design blends seamlessly into any environment.', 59.99);
+
+CREATE INDEX product_catalogue_search_tsv_idx ON product_catalogue USING gin (search_tsv);
@@ -0,0 +1,193 @@
+import argparse
+import time
+
+import numpy as np
+
+try:
+    from vector_copy import VECTOR_TABLES, get_vector_indexes
+except ImportError:  # imported as src.quantized_vectors from the notebooks
+    from .vector_copy import VECTOR_TABLES, get_vector_indexes
+
+# Compact representations searched by the index; the full-precision embedding column stays
+# in the table for re-ranking. pgvector stores vectors this size out of line (TOAST), so a
+# search only reads the full vectors of the candidates it re-ranks.
+#   halfvec: 2 bytes per dimension in a generated column, cosine distance (1/2 the index size)
+#   binary:  1 bit per dimension in an expression index, Hamming distance (1/32 the index size)
+MODES = {
+    "halfvec": {
+        "column_sql": "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS embedding_half halfvec({dim}) "
+                      "GENERATED ALWAYS AS (embedding::halfvec({dim})) STORED",
+        "index_expr": "embedding_half",
+        "opclass": "halfvec_cosine_ops",
+        "order_by": "embedding_half <=> %(embedding)s::halfvec({dim})",
+    },
+    "binary": {
+        "column_sql": None,
+        "index_expr": "(binary_quantize(embedding)::bit({dim}))",
+        "opclass": "bit_hamming_ops",
+        "order_by": "binary_quantize(embedding)::bit({dim}) <~> binary_quantize(%(embedding)s::vector({dim}))",
+    },
+}
+
+# The compact index finds `candidates` rows; only those are re-ranked on the full vectors
+QUANTIZED_SEARCH_SQL = """
+WITH candidates AS (
+    SELECT vector_id
+    FROM {table}
+    ORDER BY {order_by}
+    LIMIT %(candidates)s
+)
+SELECT t.{id_column}, t.description, t.embedding <=> %(embedding)s::vector AS distance
+FROM candidates c
+JOIN {table} t ON t.vector_id = c.vector_id
+ORDER BY distance
+LIMIT %(limit)s
+"""
+
+EXACT_SEARCH_SQL = """
+SELECT {id_column}, description, embedding <=> %(embedding)s::vector AS distance
+FROM {table}
+ORDER BY embedding <=> %(embedding)s::vector
+LIMIT %(limit)s
+"""
+
+
+def index_name(table: str, mode: str) -> str:
+    return f"{table}_embedding_{mode}_idx"
+
+
+def migrate_table(conn, table: str, mode: str = "binary", dim: int = 1536, method: str = "hnsw",
+                  drop_full_index: bool = False) -> dict:
+    """Adds the compact representation and its index to an existing embedding table.
+
+    halfvec adds a generated column, which rewrites the table once; new rows (including
+    bulk_load_vectors COPYs) fill it automatically. binary only builds an expression index.
+    drop_full_index drops the table's full-precision DiskANN/HNSW indexes, which is where
+    most of the memory goes; plain exact searches still work, as sequential scans.
+    """
+    spec = MODES[mode]
+    stats = {"table": table, "mode": mode}
+    with conn.cursor() as cur:
+        if spec["column_sql"]:
+            start = time.perf_counter()
+            cur.execute(spec["column_sql"].format(table=table, dim=dim))
+            stats["column_seconds"] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name(table, mode)} ON {table} "
+                    f"USING {method} ({spec['index_expr'].format(dim=dim)} {spec['opclass']})")
+        stats["index_seconds"] = round(time.perf_counter() - start, 3)
+        if drop_full_index:
+            dropped = []
+            for access_method in ("diskann", "hnsw", "ivfflat"):
+                for name, definition in get_vector_indexes(cur, table, access_method):
+                    if "embedding_half" not in definition and "binary_quantize" not in definition:
+                        cur.execute(f'DROP INDEX "{name}"')
+                        dropped.append(name)
+            stats["dropped_indexes"] = dropped
+        cur.execute(f"ANALYZE {table}")
+    conn.commit()
+    stats.update(storage_report(conn, table))
+    return stats
+
+
+def storage_report(conn, table: str) -> dict:
+    """Sizes (MB) of the table heap, its TOAST data and each of its indexes."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT pg_relation_size(c.oid), coalesce(pg_total_relation_size(c.reltoastrelid), 0)
+            FROM pg_class c WHERE c.oid = %s::regclass
+        """, (table,))
+        heap, toast = cur.fetchone()
+        cur.execute("""
+            SELECT i.relname, pg_relation_size(i.oid)
+            FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+            WHERE x.indrelid = %s::regclass
+            ORDER BY i.relname
+        """, (table,))
+        indexes = cur.fetchall()
+    conn.rollback()
+    mb = lambda n: round(n / (1024 * 1024), 2)
+    return {"heap_mb": mb(heap), "toast_mb": mb(toast), "index_mb": {name: mb(size) for name, size in indexes}}
+
+
+def _vector_text(embedding) -> str:
+    return "[" + ",".join(str(float(x)) for x in embedding) + "]"
+
+
+def quantized_search(conn, table: str, embedding, limit: int = 10, mode: str = "binary", oversample: int = 10,
+                     dim: int = 1536) -> list:
+    """Top-limit (id, description, cosine distance) rows: limit * oversample candidates from
+    the compact index, re-ranked on the full-precision embeddings."""
+    candidates = limit * oversample
+    sql = QUANTIZED_SEARCH_SQL.format(table=table, id_column=VECTOR_TABLES[table][0],
+                                      order_by=MODES[mode]["order_by"].format(dim=dim))
+    with conn.cursor() as cur:
+        # HNSW returns at most ef_search rows per scan, which would silently cap the candidates
+        cur.execute("SET LOCAL hnsw.ef_search = %s", (max(40, min(candidates, 1000)),))
+        cur.execute(sql, {"embedding": _vector_text(embedding), "candidates": candidates, "limit": limit})
+        rows = cur.fetchall()
+    conn.rollback()
+    return rows
+
+
+def exact_search(conn, table: str, embedding, limit: int = 10) -> list:
+    """Ground truth: a full scan over the full-precision embeddings, ignoring every index."""
+    sql = EXACT_SEARCH_SQL.format(table=table, id_column=VECTOR_TABLES[table][0])
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_indexscan = off")
+        cur.execute(sql, {"embedding": _vector_text(embedding), "limit": limit})
+        rows = cur.fetchall()
+    conn.rollback()
+    return rows
+
+
+def measure_recall(conn, table: str, queries, k: int = 10, mode: str = "binary", oversamples=(1, 4, 10),
+                   dim: int = 1536) -> dict:
+    """Recall@k of quantized_search against exact_search, and median latency, per oversample."""
+    truth = [{row[0] for row in exact_search(conn, table, q, k)} for q in queries]
+    report = {}
+    for oversample in oversamples:
+        recalls, latencies = [], []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            found = {row[0] for row in quantized_search(conn, table, query, k, mode, oversample, dim)}
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len(found & expected) / max(1, len(expected)))
+        report[f"oversample_{oversample}"] = {
+            "recall_at_k": round(float(np.mean(recalls)), 4),
+            "p50_ms": round(float(np.median(latencies)) * 1000, 3),
+        }
+    return report
+
+
+def sample_queries(conn, table: str, count: int = 50, seed: int = 0) -> list:
+    """Stored embeddings plus a little noise, as stand-ins for real query embeddings."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT embedding::text FROM {table} ORDER BY random() LIMIT %s", (count,))
+        rows = cur.fetchall()
+    conn.rollback()
+    rng = np.random.default_rng(seed)
+    vectors = [np.array(r[0].strip("[]").split(","), dtype=np.float32) for r in rows]
+    return [v + rng.normal(0, 0.01, v.shape).astype(np.float32) for v in vectors]
+
+
+if __name__ == "__main__":
+    from get_conn import connect
+
+    parser = argparse.ArgumentParser(description="Add quantized search to an embedding table and measure recall.")
+    parser.add_argument("--table", choices=sorted(VECTOR_TABLES), default="product_desc_ann")
+    parser.add_argument("--mode", choices=sorted(MODES), default="binary")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--method", default="hnsw", help="Index access method for the compact index.")
+    parser.add_argument("--drop-full-index", action="store_true",
+                        help="Drop the full-precision vector indexes once the compact one exists.")
+    parser.add_argument("--recall-queries", type=int, default=50, help="0 to skip the recall measurement.")
+    args = parser.parse_args()
+
+    conn = connect()
+    print(f"Before: {storage_report(conn, args.table)}")
+    print(f"After: {migrate_table(conn, args.table, args.mode, args.dim, args.method, args.drop_full_index)}")
+    if args.recall_queries:
+        queries = sample_queries(conn, args.table, args.recall_queries)
+        print(f"Recall: {measure_recall(conn, args.table, queries, mode=args.mode, dim=args.dim)}")
+    conn.close()
@@ -0,0 +1,414 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+
+# Quoted literals and identifiers ('...', "...", $tag$...$tag$) are kept verbatim; everything
+# between them is case-folded and has its whitespace collapsed, which is how Postgres reads
+# unquoted SQL anyway
+_QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|(?<![\w$])\$((?:[A-Za-z_]\w*)?)\$.*?\$\1\$", re.DOTALL)
+_IDENT = r'(?:"(?:[^"]|"")+"|[a-z_][\w$]*)'
+_NAME = rf"{_IDENT}(?:\s*\.\s*{_IDENT})?"
+_JOIN = re.compile(rf"\bjoin\s+(?:lateral\s+|only\s+)?({_NAME})(\s*\()?")
+_JOIN_WORD = re.compile(r"\bjoin\b")
+_FROM = re.compile(r"\bfrom\s+")
+_FROM_ITEM = re.compile(rf"\s*(?:only\s+|lateral\s+)?({_NAME})(\s*\()?")
+# Clauses that end a FROM list; commas before them (outside parentheses) separate FROM items
+_FROM_END = re.compile(r"\b(?:where|group|order|limit|offset|having|window|union|intersect|except|"
+                       r"fetch|for|returning)\b|[(),]")
+# Results that depend on the clock, a sequence or randomness must not be reused
+_VOLATILE = re.compile(r"\b(?:now|random|clock_timestamp|statement_timestamp|timeofday|nextval|setval|"
+                       r"current_date|current_time|current_timestamp|localtime|localtimestamp|"
+                       r"gen_random_uuid|pg_sleep)\b|\bfor\s+(?:update|share|no\s+key|key)\b|"
+                       r"\b(?:insert|update|delete|merge)\b")  # data-modifying CTEs
+# Words that may be followed by "(" in a cacheable read: SQL keywords, type modifiers and
+# built-in functions that neither read tables nor depend on anything but their arguments.
+# Any other call could be a user function reading tables behind the cache's back.
+_SAFE_CALLS = frozenset("""
+    select from where and or not in exists any all some as on using values over filter within
+    partition by group order having join lateral case when then else end cast distinct union
+    intersect except with recursive is null between like ilike similar to array row
+    count sum avg min max bool_and bool_or every string_agg array_agg json_agg jsonb_agg
+    json_build_object jsonb_build_object json_object_agg jsonb_object_agg row_number rank
+    dense_rank percent_rank cume_dist ntile lag lead first_value last_value nth_value
+    percentile_cont percentile_disc mode stddev variance
+    lower upper initcap length char_length trim ltrim rtrim btrim substring substr position
+    replace concat concat_ws left right lpad rpad split_part strpos regexp_replace
+    regexp_match regexp_matches starts_with format to_char to_number to_date date_trunc
+    date_part extract age make_date coalesce nullif greatest least abs ceil ceiling floor
+    round trunc sqrt power mod sign numeric decimal varchar char character interval
+    timestamp timestamptz time date
+""".split())
+_CALL = re.compile(r"([a-z_][\w$]*)\s*\(")
+
+# Write statements whose target tables can be read off the statement itself
+_WRITE_TARGETS = (
+    re.compile(rf"^insert\s+into\s+({_NAME})"),
+    re.compile(rf"^update\s+(?:only\s+)?({_NAME})"),
+    re.compile(rf"^delete\s+from\s+(?:only\s+)?({_NAME})"),
+    re.compile(rf"^merge\s+into\s+({_NAME})"),
+    re.compile(rf"^copy\s+({_NAME})"),
+    re.compile(rf"^alter\s+table\s+(?:if\s+exists\s+)?(?:only\s+)?({_NAME})"),
+)
+_MULTI_TARGETS = re.compile(r"^(?:truncate(?:\s+table)?|drop\s+table(?:\s+if\s+exists)?)\s+(.+?)"
+                            r"(?:\s+(?:cascade|restrict|restart\s+identity|continue\s+identity))*$")
+
+# Tables whose rows change when rows of the given tables are updated or deleted, through
+# ON DELETE/ON UPDATE CASCADE, SET NULL or SET DEFAULT foreign keys. The first parameter
+# follows every foreign key instead, for TRUNCATE ... CASCADE, which empties all referencing tables.
+CASCADE_TARGETS_QUERY = """
+SELECT DISTINCT child.relname, parent.relname
+FROM pg_catalog.pg_constraint con
+JOIN pg_catalog.pg_class child ON child.oid = con.conrelid
+JOIN pg_catalog.pg_class parent ON parent.oid = con.confrelid
+WHERE con.contype = 'f'
+  AND (%s OR con.confdeltype IN ('c', 'n', 'd') OR con.confupdtype IN ('c', 'n', 'd'))
+  AND parent.relname = ANY(%s);
+"""
+_TRUNCATE_CASCADE = re.compile(r"(?:^|;)\s*truncate\b[^;]*\bcascade\b")
+
+# Views, foreign tables, sequences etc. by the names a query reads. A view's result changes
+# with its base tables, which the cache cannot see, so queries reading one are not cached.
+NON_TABLE_RELATIONS_QUERY = """
+SELECT DISTINCT relname FROM pg_catalog.pg_class WHERE relname = ANY(%s) AND relkind NOT IN ('r', 'p');
+"""
+
+# User triggers can write anywhere, so a write to one of these tables invalidates everything
+TRIGGERED_TABLES_QUERY = """
+SELECT DISTINCT c.relname
+FROM pg_catalog.pg_trigger t
+JOIN pg_catalog.pg_class c ON c.oid = t.tgrelid
+WHERE NOT t.tgisinternal AND t.tgname <> 'mcp_change_counter' AND c.relname = ANY(%s);
+"""
+
+# Cross-process invalidation: statement-level triggers bump a per-table counter on every
+# INSERT, UPDATE, DELETE and TRUNCATE, whoever runs it. The counter row is locked until
+# the writing transaction commits, so concurrent writers to one table queue on it; that
+# is fine for the lab workloads but worth knowing before installing it on a busy table.
+CHANGE_COUNTER_SETUP_SQL = """
+CREATE SCHEMA IF NOT EXISTS mcp_meta;
+CREATE TABLE IF NOT EXISTS mcp_meta.table_change_counter (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION mcp_meta.bump_table_change_counter() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO mcp_meta.table_change_counter AS t (table_name, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = t.version + 1;
+    RETURN NULL;
+END;
+$$;
+"""
+
+CHANGE_COUNTER_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS mcp_change_counter ON {table};
+CREATE TRIGGER mcp_change_counter AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+    FOR EACH STATEMENT EXECUTE FUNCTION mcp_meta.bump_table_change_counter();
+"""
+
+CHANGE_COUNTER_QUERY = "SELECT table_name, version FROM mcp_meta.table_change_counter WHERE table_name = ANY(%s);"
+
+
+def install_change_counters(conn, tables=None):
+    """Creates mcp_meta.table_change_counter and its trigger on each table (default: every public table)."""
+    with conn.cursor() as curs:
+        curs.execute(CHANGE_COUNTER_SETUP_SQL)
+        if tables is None:
+            curs.execute("SELECT tablename FROM pg_catalog.pg_tables WHERE schemaname = 'public' ORDER BY tablename;")
+            tables = [r[0] for r in curs.fetchall()]
+        for table in tables:
+            curs.execute(CHANGE_COUNTER_TRIGGER_SQL.format(table='"' + table.replace('"', '""') + '"'))
+    conn.commit()
+
+
+def normalize_sql(sql: str) -> str:
+    """Case-folds and collapses whitespace outside quotes and drops trailing semicolons.
+
+    Statements that differ only in layout or keyword case get the same cache key.
+    """
+    parts, pos = [], 0
+    for m in _QUOTED.finditer(sql):
+        parts += [re.sub(r"\s+", " ", sql[pos:m.start()].lower()), m.group()]
+        pos = m.end()
+    parts.append(re.sub(r"\s+", " ", sql[pos:].lower()))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def _table_name(name: str) -> str:
+    # "public"."Products" -> Products, public.products -> products
+    last = re.split(r'\s*\.\s*(?=(?:[^"]*"[^"]*")*[^"]*$)', name)[-1]
+    return last[1:-1].replace('""', '"') if last.startswith('"') else last
+
+
+def _blank_literals(normalized: str) -> str:
+    # string literals can contain anything, including the words the parsers look for
+    return _QUOTED.sub(lambda m: m.group() if m.group().startswith('"') else "''", normalized)
+
+
+def read_dependencies(sql: str):
+    """Returns the set of tables a SELECT reads, or None when it must not be cached.
+
+    That is anything other than a plain SELECT/WITH, queries calling functions outside a
+    list of known side-effect-free built-ins (their reads and results are unknowable here),
+    locking reads, and FROM/JOIN items other than plain table names (subqueries and
+    parenthesized joins in FROM), since a table the walk misses would never invalidate it.
+    CTE names are reported like tables, which only costs an unused dependency.
+    """
+    text = _blank_literals(normalize_sql(sql))
+    if not re.match(r"^(?:select|with|table|values)\b", text) or ";" in text or _VOLATILE.search(text):
+        return None
+    if any(name not in _SAFE_CALLS for name in _CALL.findall(text)):
+        return None
+    if text.startswith("table "):
+        return {_table_name(text[6:].strip())}
+    tables = set()
+    joins = 0
+    for m in _JOIN.finditer(text):
+        if m.group(2):
+            return None
+        tables.add(_table_name(m.group(1)))
+        joins += 1
+    if joins != len(_JOIN_WORD.findall(text)):
+        return None  # JOIN (subquery) or JOIN (a JOIN b): tables the walk cannot see
+    for m in _FROM.finditer(text):
+        # FROM a, b x JOIN c ON ..., d AS y -- every item up to the next clause must be a plain table
+        pos = m.end()
+        while True:
+            item = _FROM_ITEM.match(text, pos)
+            if not item or item.group(2):
+                return None  # a subquery, a parenthesized join or a function in FROM
+            tables.add(_table_name(item.group(1)))
+            pos, depth = item.end(), 0
+            for end in _FROM_END.finditer(text, pos):
+                token = end.group()
+                if token == "(":
+                    depth += 1
+                elif token == ")":
+                    depth -= 1
+                    if depth < 0:
+                        break  # end of the enclosing subquery
+                elif depth == 0:
+                    break
+            else:
+                end = None
+            if end is None or end.group() != ",":
+                break
+            pos = end.end()
+    return tables
+
+
+def write_targets(sql: str):
+    """Returns the set of tables a write statement modifies, or None when that is unknown.
+
+    CALL, DO, SELECT func(...), CREATE FUNCTION, WITH ... (data-modifying CTEs) and
+    other statements that can write anywhere report None.
+    """
+    text = _blank_literals(normalize_sql(sql))
+    if ";" in text:
+        targets = set()
+        for statement in text.split(";"):
+            found = write_targets(statement) if statement.strip() else set()
+            if found is None:
+                return None
+            targets |= found
+        return targets
+    for pattern in _WRITE_TARGETS:
+        m = pattern.match(text)
+        if m:
+            return {_table_name(m.group(1))}
+    m = _MULTI_TARGETS.match(text)
+    if m:
+        return {_table_name(t.strip().removeprefix("only ").strip()) for t in m.group(1).split(",")}
+    if re.match(r"^create\s+(?:unique\s+)?index\b", text) or re.match(r"^(?:analyze|vacuum|comment)\b", text):
+        return set()
+    return None
+
+
+def _size(value) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+
+class QueryResultCache:
+    """LRU cache of query results, invalidated per table.
+
+    Entries are keyed on the database, the normalized SQL and the parameters, and
+    remember which tables the query reads; queries reading views or other non-table
+    relations are not cached. note_write() drops the entries that read a table the write
+    touches (following cascading foreign keys). With use_change_counters,
+    each hit also compares the trigger-maintained counters of its tables (one short
+    query), which catches writes from other processes too; see install_change_counters.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int | None = None,
+                 use_change_counters: bool = False):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 8
+        self.use_change_counters = use_change_counters
+        self._entries = OrderedDict()  # key -> (tables, counters, value, size)
+        self._by_table = {}  # (dbname, table) -> set of keys
+        self._plain_tables = {}  # (dbname, name) -> False for views and other non-tables
+        # bumped on every invalidation, so a load that raced a write is not stored
+        self._generations = {}  # (dbname, table) or dbname -> count
+        self._epoch = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _counters(self, conn, tables):
+        with conn.cursor() as curs:
+            curs.execute(CHANGE_COUNTER_QUERY, (sorted(tables),))
+            found = dict(curs.fetchall())
+        return tuple(found.get(t, 0) for t in sorted(tables))
+
+    def get(self, conn, sql: str, params=None, loader=None):
+        """Returns loader(conn) for this query, from memory when nothing it reads has changed.
+
+        loader defaults to executing sql with params and returning fetchall().
+        """
+        if loader is None:
+            def loader(c):
+                with c.cursor() as curs:
+                    curs.execute(sql, params)
+                    return curs.fetchall()
+        tables = read_dependencies(sql)
+        if tables is None:
+            with self._lock:
+                self.uncacheable += 1
+            return loader(conn)
+        dbname = conn.info.dbname
+        if not self._reads_tables_only(conn, dbname, tables):
+            with self._lock:
+                self.uncacheable += 1
+            return loader(conn)
+        key = (dbname, normalize_sql(sql), json.dumps(params, sort_keys=True, default=str))
+        counters = self._counters(conn, tables) if self.use_change_counters else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == counters:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            generations = self._generation(dbname, tables)
+        value = loader(conn)
+        size = _size(value)
+        with self._lock:
+            if size <= self.max_entry_bytes and self._generation(dbname, tables) == generations:
+                self._store(key, tables, counters, value, size)
+        return value
+
+    def _reads_tables_only(self, conn, dbname, tables) -> bool:
+        # names are looked up once per database; invalidate() forgets them, as DDL does
+        unknown = sorted(t for t in tables if (dbname, t) not in self._plain_tables)
+        if unknown:
+            with conn.cursor() as curs:
+                curs.execute(NON_TABLE_RELATIONS_QUERY, (unknown,))
+                others = {r[0] for r in curs.fetchall()}
+            with self._lock:
+                for name in unknown:
+                    self._plain_tables[(dbname, name)] = name not in others
+        return all(self._plain_tables.get((dbname, t), False) for t in tables)
+
+    def _generation(self, dbname, tables):
+        return (self._epoch, self._generations.get(dbname, 0),
+                *(self._generations.get((dbname, t), 0) for t in sorted(tables)))
+
+    def _store(self, key, tables, counters, value, size):
+        self._drop(key)
+        self._entries[key] = (frozenset(tables), counters, value, size)
+        self._bytes += size
+        for table in tables:
+            self._by_table.setdefault((key[0], table), set()).add(key)
+        while self._bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[3]
+        for table in entry[0]:
+            keys = self._by_table.get((key[0], table))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[(key[0], table)]
+
+    def invalidate_tables(self, dbname: str, tables):
+        """Drops every cached result of dbname that reads one of tables."""
+        with self._lock:
+            for table in tables:
+                self._generations[(dbname, table)] = self._generations.get((dbname, table), 0) + 1
+                for key in list(self._by_table.get((dbname, table), ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def invalidate(self, dbname: str | None = None):
+        """Drops cached results (for one database, or all of them)."""
+        with self._lock:
+            for key in [k for k in self._entries if dbname is None or k[0] == dbname]:
+                self._drop(key)
+                self.invalidations += 1
+            if dbname is None:
+                self._epoch += 1
+                self._plain_tables.clear()
+            else:
+                self._generations[dbname] = self._generations.get(dbname, 0) + 1
+                for name in [k for k in self._plain_tables if k[0] == dbname]:
+                    del self._plain_tables[name]
+
+    def note_write(self, conn, sql: str):
+        """Invalidates what a successfully executed write statement may have changed.
+
+        Call it after the commit, on the connection that ran the write.
+        """
+        dbname = conn.info.dbname
+        tables = write_targets(sql)
+        if tables is None:
+            self.invalidate(dbname)
+            return
+        if not tables:
+            return
+        truncate_cascade = bool(_TRUNCATE_CASCADE.search(_blank_literals(normalize_sql(sql))))
+        try:
+            with conn.cursor() as curs:
+                curs.execute(TRIGGERED_TABLES_QUERY, (sorted(tables),))
+                if curs.fetchall():
+                    tables = None
+                else:
+                    # follow cascading foreign keys until no new table turns up
+                    frontier = set(tables)
+                    while frontier:
+                        curs.execute(CASCADE_TARGETS_QUERY, (truncate_cascade, sorted(frontier)))
+                        children = {child for child, _ in curs.fetchall()}
+                        frontier = children - tables
+                        tables |= children
+            conn.rollback()
+        except Exception:
+            conn.rollback()
+            tables = None
+        if tables is None:
+            self.invalidate(dbname)
+        else:
+            self.invalidate_tables(dbname, tables)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "uncacheable": self.uncacheable,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "cached_bytes": self._bytes,
+            }
@@ -0,0 +1,140 @@
+import threading
+import time
+
+# Fingerprint of the catalog rows that describe the public schema. Any DDL on a table,
+# column, constraint or routine inserts, deletes or rewrites one of these rows, which
+# changes either the row count or the sum of row versions (xmin). Reading the catalogs
+# directly is far cheaper than the information_schema views the introspection uses.
+CATALOG_VERSION_QUERY = """
+SELECT
+    (SELECT count(*) || ':' || coalesce(sum(c.xmin::text::bigint), 0)
+       FROM pg_catalog.pg_class c
+      WHERE c.relnamespace = 'public'::regnamespace)
+    || '/' ||
+    (SELECT count(*) || ':' || coalesce(sum(a.xmin::text::bigint), 0)
+       FROM pg_catalog.pg_attribute a
+       JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+      WHERE c.relnamespace = 'public'::regnamespace AND a.attnum > 0)
+    || '/' ||
+    (SELECT count(*) || ':' || coalesce(sum(co.xmin::text::bigint), 0)
+       FROM pg_catalog.pg_constraint co
+      WHERE co.connamespace = 'public'::regnamespace)
+    || '/' ||
+    (SELECT count(*) || ':' || coalesce(sum(p.xmin::text::bigint), 0)
+       FROM pg_catalog.pg_proc p
+      WHERE p.pronamespace = 'public'::regnamespace);
+"""
+
+# Alternative version source: a counter bumped by DDL event triggers. Creating event
+# triggers needs elevated privileges, so this is opt-in (see install_ddl_event_trigger).
+EVENT_TRIGGER_VERSION_QUERY = "SELECT version::text FROM mcp_meta.schema_ddl_version;"
+
+DDL_EVENT_TRIGGER_SQL = """
+CREATE SCHEMA IF NOT EXISTS mcp_meta;
+CREATE TABLE IF NOT EXISTS mcp_meta.schema_ddl_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO mcp_meta.schema_ddl_version (id, version) VALUES (TRUE, 0) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION mcp_meta.bump_schema_ddl_version() RETURNS event_trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE mcp_meta.schema_ddl_version SET version = version + 1;
+END;
+$$;
+
+DROP EVENT TRIGGER IF EXISTS mcp_schema_ddl_end;
+CREATE EVENT TRIGGER mcp_schema_ddl_end ON ddl_command_end
+    EXECUTE FUNCTION mcp_meta.bump_schema_ddl_version();
+DROP EVENT TRIGGER IF EXISTS mcp_schema_ddl_drop;
+CREATE EVENT TRIGGER mcp_schema_ddl_drop ON sql_drop
+    EXECUTE FUNCTION mcp_meta.bump_schema_ddl_version();
+"""
+
+
+def install_ddl_event_trigger(conn):
+    """Creates the DDL event triggers that maintain mcp_meta.schema_ddl_version."""
+    with conn.cursor() as curs:
+        curs.execute(DDL_EVENT_TRIGGER_SQL)
+    conn.commit()
+
+
+def _size(value) -> int:
+    # values are serialized strings or sequences of them (one per record)
+    return len(value) if isinstance(value, (str, bytes)) else sum(len(v) for v in value)
+
+
+class SchemaCache:
+    """Caches serialized introspection results per database until the schema changes.
+
+    Every lookup runs a cheap version query; the expensive loader only runs when the
+    version differs from the one the cached value was built against.
+    """
+
+    def __init__(self, version_query: str = CATALOG_VERSION_QUERY, check_interval: float = 0.0):
+        self.version_query = version_query
+        # how long (seconds) a version read is trusted before the catalog is asked again
+        self.check_interval = check_interval
+        self._entries = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.version_checks = 0
+
+    def _current_version(self, conn) -> str:
+        dbname = conn.info.dbname
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(dbname)
+        if cached is not None and now - cached[1] < self.check_interval:
+            return cached[0]
+        with conn.cursor() as curs:
+            curs.execute(self.version_query)
+            version = curs.fetchone()[0]
+        # leave the connection idle, the version read must not hold a snapshot open
+        conn.rollback()
+        with self._lock:
+            self.version_checks += 1
+            self._versions[dbname] = (version, now)
+        return version
+
+    def get(self, conn, key: str, loader) -> str:
+        """Returns the cached value for key, calling loader(conn) on a miss or schema change."""
+        return self.get_versioned(conn, key, loader)[1]
+
+    def get_versioned(self, conn, key: str, loader):
+        """Like get, but returns (catalog version, value) so callers can tell values apart."""
+        dbname = conn.info.dbname
+        version = self._current_version(conn)
+        with self._lock:
+            entry = self._entries.get((dbname, key))
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry
+            self.misses += 1
+        value = loader(conn)
+        with self._lock:
+            self._entries[(dbname, key)] = (version, value)
+        return version, value
+
+    def invalidate(self, dbname: str | None = None):
+        """Drops cached values (for one database, or all of them)."""
+        with self._lock:
+            if dbname is None:
+                self._entries.clear()
+                self._versions.clear()
+            else:
+                self._entries = {k: v for k, v in self._entries.items() if k[0] != dbname}
+                self._versions.pop(dbname, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "version_checks": self.version_checks,
+                "entries": len(self._entries),
+                "cached_bytes": sum(_size(v[1]) for v in self._entries.values()),
+            }
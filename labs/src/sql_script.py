@@ -0,0 +1,248 @@
+import io
+import re
+import time
+
+# Tokens that change the lexical state while scanning a script outside of strings/comments
+_NORMAL_TOKEN = re.compile(r"""[;'"]|--|/\*|\$(?:[A-Za-z_][A-Za-z_0-9]*)?\$""")
+_BLOCK_TOKEN = re.compile(r"/\*|\*/")
+_LEADING_LINE_COMMENTS = re.compile(r"(?:\s+|--[^\n]*(?:\n|\Z))*")
+
+_INSERT_HEAD = re.compile(
+    r"INSERT\s+INTO\s+((?:\"[^\"]+\"|[A-Za-z_][\w$]*)(?:\.(?:\"[^\"]+\"|[A-Za-z_][\w$]*))?)"
+    r"\s*\(([^()]*)\)\s*VALUES\s*",
+    re.I,
+)
+# A single literal inside a VALUES tuple: quoted string, NULL/TRUE/FALSE or a number
+_LITERAL = re.compile(
+    r"\s*(?:'([^']*(?:''[^']*)*)'|(NULL|TRUE|FALSE)\b|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?))\s*",
+    re.I,
+)
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+
+
+def strip_leading_comments(statement: str) -> str:
+    pos = _LEADING_LINE_COMMENTS.match(statement).end()
+    while statement.startswith("/*", pos):
+        # block comments nest in PostgreSQL
+        depth = 0
+        for m in _BLOCK_TOKEN.finditer(statement, pos):
+            depth += 1 if m.group() == "/*" else -1
+            if depth == 0:
+                pos = m.end()
+                break
+        else:
+            return ""
+        pos = _LEADING_LINE_COMMENTS.match(statement, pos).end()
+    return statement[pos:]
+
+
+def iter_statements(lines):
+    """Splits an SQL script into statements without reading it all into memory.
+
+    Takes any iterable of lines (e.g. an open file) and yields one statement at a time,
+    without the terminating semicolon and leading comments. Semicolons inside string
+    literals, quoted identifiers, comments and dollar-quoted bodies are not treated as
+    statement terminators.
+    """
+    pieces = []
+    state = None  # None, "'", '"', "/*" or a dollar quote tag
+    depth = 0
+    for line in lines:
+        pos = 0
+        start = 0
+        end = len(line)
+        while pos < end:
+            if state is None:
+                m = _NORMAL_TOKEN.search(line, pos)
+                if m is None:
+                    break
+                tok = m.group()
+                pos = m.end()
+                if tok == ";":
+                    pieces.append(line[start:m.start()])
+                    statement = strip_leading_comments("".join(pieces)).strip()
+                    pieces = []
+                    start = pos
+                    if statement:
+                        yield statement
+                elif tok == "--":
+                    break
+                elif tok == "/*":
+                    state, depth = "/*", 1
+                else:
+                    state = tok
+            elif state == "/*":
+                m = _BLOCK_TOKEN.search(line, pos)
+                if m is None:
+                    break
+                pos = m.end()
+                depth += 1 if m.group() == "/*" else -1
+                if depth == 0:
+                    state = None
+            else:
+                idx = line.find(state, pos)
+                if idx < 0:
+                    break
+                pos = idx + len(state)
+                state = None
+        pieces.append(line[start:])
+    statement = strip_leading_comments("".join(pieces)).strip()
+    if statement:
+        yield statement
+
+
+def parse_insert(statement: str):
+    """Splits a plain INSERT ... VALUES statement into (table, columns, values_text).
+
+    Returns None for anything else, including INSERTs without an explicit column list.
+    """
+    m = _INSERT_HEAD.match(statement)
+    if m is None:
+        return None
+    columns = ",".join(col.strip() for col in m.group(2).split(","))
+    return m.group(1), columns, statement[m.end():]
+
+
+def parse_values(values_text: str):
+    """Parses the tuples of a VALUES list into rows of Python strings/None.
+
+    Returns None if anything other than simple literals appears (function calls,
+    DEFAULT, casts, ON CONFLICT, RETURNING...), in which case the statement cannot be
+    turned into COPY data and must be sent as SQL.
+    """
+    rows = []
+    pos = 0
+    end = len(values_text)
+    while True:
+        while pos < end and values_text[pos].isspace():
+            pos += 1
+        if pos >= end or values_text[pos] != "(":
+            return None
+        pos += 1
+        row = []
+        while True:
+            m = _LITERAL.match(values_text, pos)
+            if m is None:
+                return None
+            quoted, keyword, number = m.groups()
+            if quoted is not None:
+                row.append(quoted.replace("''", "'"))
+            elif keyword is not None:
+                keyword = keyword.upper()
+                row.append(None if keyword == "NULL" else ("t" if keyword == "TRUE" else "f"))
+            else:
+                row.append(number)
+            pos = m.end()
+            if pos < end and values_text[pos] == ",":
+                pos += 1
+                continue
+            if pos < end and values_text[pos] == ")":
+                pos += 1
+                break
+            return None
+        rows.append(row)
+        while pos < end and values_text[pos].isspace():
+            pos += 1
+        if pos >= end:
+            return rows
+        if values_text[pos] != ",":
+            return None
+        pos += 1
+
+
+def _copy_line(row) -> str:
+    return "\t".join("\\N" if v is None else v.translate(_COPY_ESCAPES) for v in row) + "\n"
+
+
+class ScriptExecutor:
+    """Executes a stream of SQL statements, batching runs of same-table INSERTs.
+
+    Consecutive INSERT ... VALUES statements for the same table and column list are
+    collected and sent as one COPY FROM STDIN (or, with use_copy=False, as one multi-row
+    INSERT), up to batch_rows rows per round trip. Only INSERTs made entirely of literal
+    tuples are batched; every other statement is executed as-is, in order.
+    """
+
+    def __init__(self, cursor, batch_rows: int = 5000, use_copy: bool = True):
+        self.cursor = cursor
+        self.batch_rows = batch_rows
+        self.use_copy = use_copy
+        self._key = None
+        self._copy_buf = io.StringIO()
+        self._values = []
+        self._pending_rows = 0
+        self.timings = {"parse": 0.0, "execute": 0.0, "copy": 0.0, "insert": 0.0}
+        self.counts = {"statements": 0, "inserts_batched": 0, "rows_copied": 0,
+                       "rows_inserted": 0, "round_trips": 0}
+
+    def _timed(self, phase, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.timings[phase] += time.perf_counter() - start
+            self.counts["round_trips"] += 1
+
+    def add(self, statement: str):
+        self.counts["statements"] += 1
+        start = time.perf_counter()
+        parsed = parse_insert(statement)
+        rows = parse_values(parsed[2]) if parsed is not None else None
+        self.timings["parse"] += time.perf_counter() - start
+
+        if rows is None:
+            # not an INSERT made only of literal tuples, send it as written
+            self.flush()
+            self._timed("execute", self.cursor.execute, statement)
+            return
+
+        table, columns, values_text = parsed
+        key = (table, columns)
+        if key != self._key:
+            self.flush()
+            self._key = key
+        self.counts["inserts_batched"] += 1
+        start = time.perf_counter()
+        if self.use_copy:
+            self._copy_buf.writelines(_copy_line(row) for row in rows)
+        else:
+            self._values.append(values_text)
+        self._pending_rows += len(rows)
+        self.timings["parse"] += time.perf_counter() - start
+        if self._pending_rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        """Sends the pending INSERT batch, if any."""
+        if self._key is None:
+            return
+        table, columns = self._key
+        if self.use_copy:
+            self._copy_buf.seek(0)
+            self._timed("copy", self.cursor.copy_expert,
+                        f"COPY {table} ({columns}) FROM STDIN", self._copy_buf)
+            self.counts["rows_copied"] += self._pending_rows
+            self._copy_buf = io.StringIO()
+        else:
+            sql = f"INSERT INTO {table} ({columns}) VALUES " + ",\n".join(self._values)
+            self._timed("insert", self.cursor.execute, sql)
+            self.counts["rows_inserted"] += self._pending_rows
+            self._values = []
+        self._key = None
+        self._pending_rows = 0
+
+    def report(self) -> dict:
+        return {"timings": {k: round(v, 4) for k, v in self.timings.items()}, **self.counts}
+
+
+def execute_sql_script(cursor, sql_file_path, batch_rows: int = 5000, use_copy: bool = True) -> dict:
+    """Streams an SQL file to the database and returns per-phase timings and counts."""
+    start = time.perf_counter()
+    executor = ScriptExecutor(cursor, batch_rows=batch_rows, use_copy=use_copy)
+    with open(sql_file_path, 'r', encoding="utf-8") as file:
+        for statement in iter_statements(file):
+            executor.add(statement)
+    executor.flush()
+    report = executor.report()
+    report["timings"]["total"] = round(time.perf_counter() - start, 4)
+    return report
@@ -0,0 +1,185 @@
+import struct
+import time
+
+import numpy as np
+
+# Columns written for each embedding table, in COPY order
+VECTOR_TABLES = {
+    "product_desc_ann": ("product_id", "description", "embedding"),
+    "product_catalogue_vectors": ("id", "description", "embedding"),
+}
+
+_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_TRAILER = struct.pack(">h", -1)
+_NULL = struct.pack(">i", -1)
+
+
+def encode_vector(values, dtype=">f4") -> bytes:
+    """Binary COPY field for a pgvector vector (dtype >f4) or halfvec (dtype >f2) value.
+
+    The wire format is the dimension and a reserved int16, followed by the elements in
+    network byte order. The conversion is a single NumPy cast, not a per-element loop.
+    """
+    array = np.asarray(values).astype(dtype, copy=False).ravel()
+    data = struct.pack(">hh", array.shape[0], 0) + array.tobytes()
+    return struct.pack(">i", len(data)) + data
+
+
+def _encode_int4(value) -> bytes:
+    return struct.pack(">ii", 4, value)
+
+
+def _encode_int8(value) -> bytes:
+    return struct.pack(">iq", 8, value)
+
+
+def _encode_text(value) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack(">i", len(data)) + data
+
+
+def _encode_float4(value) -> bytes:
+    return struct.pack(">if", 4, value)
+
+
+FIELD_ENCODERS = {
+    "int4": _encode_int4,
+    "int8": _encode_int8,
+    "text": _encode_text,
+    "float4": _encode_float4,
+    "vector": encode_vector,
+    "halfvec": lambda value: encode_vector(value, ">f2"),
+}
+
+
+class BinaryCopyStream:
+    """File-like object producing COPY BINARY data from an iterable of rows on demand.
+
+    psycopg2's copy_expert pulls data with read(), so rows are encoded as the server
+    consumes them and only about one read size of encoded data is held at a time.
+    """
+
+    def __init__(self, rows, field_types):
+        self._rows = iter(rows)
+        self._encoders = [FIELD_ENCODERS[t] for t in field_types]
+        self._field_count = struct.pack(">h", len(field_types))
+        self._buffer = bytearray(_HEADER)
+        self._done = False
+        self.rows_written = 0
+
+    def _encode_row(self, row) -> bytes:
+        parts = [self._field_count]
+        for encoder, value in zip(self._encoders, row):
+            parts.append(_NULL if value is None else encoder(value))
+        return b"".join(parts)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = 1 << 20
+        while len(self._buffer) < size and not self._done:
+            row = next(self._rows, None)
+            if row is None:
+                self._buffer += _TRAILER
+                self._done = True
+            else:
+                self._buffer += self._encode_row(row)
+                self.rows_written += 1
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def parse_binary_copy(data: bytes):
+    """Yields rows of raw field bytes (None for NULL) from COPY ... TO STDOUT (FORMAT BINARY) output."""
+    if not data.startswith(_HEADER[:11]):
+        raise ValueError("not COPY BINARY data")
+    (extension_length,) = struct.unpack_from(">i", data, 15)
+    pos = 19 + extension_length
+    view = memoryview(data)
+    while True:
+        (field_count,) = struct.unpack_from(">h", data, pos)
+        pos += 2
+        if field_count == -1:
+            return
+        row = []
+        for _ in range(field_count):
+            (length,) = struct.unpack_from(">i", data, pos)
+            pos += 4
+            if length == -1:
+                row.append(None)
+            else:
+                row.append(view[pos:pos + length])
+                pos += length
+        yield row
+
+
+def decode_vector(field, dtype=">f4") -> np.ndarray:
+    """Decodes a binary pgvector vector (or halfvec with dtype >f2) field into float32."""
+    (dim,) = struct.unpack_from(">h", field, 0)
+    return np.frombuffer(field, dtype=dtype, count=dim, offset=4).astype(np.float32)
+
+
+def iter_vector_rows(ids, descriptions, embeddings):
+    """Zips ids, descriptions and an (n, dim) embedding matrix into COPY rows."""
+    return zip(ids, descriptions, embeddings)
+
+
+def copy_rows(cursor, table, columns, field_types, rows) -> int:
+    """Streams rows into table with COPY ... FROM STDIN (FORMAT BINARY); returns the row count."""
+    stream = BinaryCopyStream(rows, field_types)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)", stream, size=1 << 16
+    )
+    return stream.rows_written
+
+
+def get_vector_indexes(cursor, table, method="diskann"):
+    """Returns (name, definition) of the indexes on table that use the given access method."""
+    cursor.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_am am ON am.oid = i.relam
+        WHERE t.relname = %s AND am.amname = %s
+        """,
+        (table, method),
+    )
+    return cursor.fetchall()
+
+
+def bulk_load_vectors(conn, table, rows, columns=None, field_types=("int4", "text", "vector"),
+                      rebuild_index: bool = False) -> dict:
+    """Loads embedding rows into product_desc_ann/product_catalogue_vectors in one COPY.
+
+    rows yields (id, description, embedding) tuples; embeddings can be NumPy float32
+    arrays. With rebuild_index=True the table's DiskANN indexes are dropped before the
+    load and recreated afterwards, which is much faster than maintaining them row by row.
+    Everything runs in one transaction, committed at the end.
+    """
+    columns = columns or VECTOR_TABLES[table]
+    stats = {"rows": 0, "copy_seconds": 0.0, "index_seconds": 0.0, "indexes_rebuilt": []}
+    try:
+        with conn.cursor() as cur:
+            indexes = get_vector_indexes(cur, table) if rebuild_index else []
+            for name, _ in indexes:
+                cur.execute(f'DROP INDEX "{name}"')
+
+            start = time.perf_counter()
+            stats["rows"] = copy_rows(cur, table, columns, field_types, rows)
+            stats["copy_seconds"] = round(time.perf_counter() - start, 3)
+
+            start = time.perf_counter()
+            for name, definition in indexes:
+                cur.execute(definition)
+                stats["indexes_rebuilt"].append(name)
+            stats["index_seconds"] = round(time.perf_counter() - start, 3)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return stats
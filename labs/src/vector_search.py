@@ -0,0 +1,228 @@
+import io
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+
+try:
+    from vector_copy import VECTOR_TABLES, decode_vector, parse_binary_copy
+except ImportError:  # imported as src.vector_search from the notebooks
+    from .vector_copy import VECTOR_TABLES, decode_vector, parse_binary_copy
+
+
+class LocalVectorIndex:
+    """In-process top-k search over a memory-mapped float32 copy of an embedding table.
+
+    The index directory holds raw, append-only arrays (vectors, product ids, source
+    vector_ids and precomputed norms) plus a small meta.json that records how many rows
+    are valid and the last vector_id synced from the database. Queries are answered with
+    NumPy matrix products over the mapped matrix and return (id, score) pairs only.
+
+    An optional IVF layer (build_ivf) clusters the vectors so that a query only scans the
+    nprobe closest partitions, for catalogues too large to scan in full.
+    """
+
+    def __init__(self, path: str, dim: int = 1536):
+        self.path = path
+        self.dim = dim
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._files = {name: os.path.join(path, name) for name in
+                       ("vectors.f32", "ids.i8", "vector_ids.i8", "norms.f32", "meta.json",
+                        "ivf_centroids.f32")}
+        self.meta = {"dim": dim, "count": 0, "last_vector_id": 0}
+        if os.path.exists(self._files["meta.json"]):
+            with open(self._files["meta.json"]) as f:
+                self.meta = json.load(f)
+            if self.meta["dim"] != dim:
+                raise ValueError(f"index at {path} has dimension {self.meta['dim']}, not {dim}")
+        self._centroids = None
+        self._reload()
+
+    def __len__(self):
+        return int(self._alive.sum()) if self._count else 0
+
+    def _map(self, name, dtype, shape):
+        return np.memmap(self._files[name], dtype=dtype, mode="r", shape=shape)
+
+    def _reload(self):
+        count = self._count = self.meta["count"]
+        if count:
+            self._vectors = self._map("vectors.f32", np.float32, (count, self.dim))
+            self._ids = np.array(self._map("ids.i8", np.int64, (count,)))
+            self._vector_ids = np.array(self._map("vector_ids.i8", np.int64, (count,)))
+            self._norms = np.array(self._map("norms.f32", np.float32, (count,)))
+            # a product that was re-embedded appears more than once; only its newest row is live
+            _, last = np.unique(self._ids[::-1], return_index=True)
+            self._alive = np.zeros(count, dtype=bool)
+            self._alive[count - 1 - last] = True
+            self._alive &= ~np.isin(self._vector_ids, self.meta.get("deleted_vector_ids", []))
+        if os.path.exists(self._files["ivf_centroids.f32"]):
+            centroids = np.fromfile(self._files["ivf_centroids.f32"], dtype=np.float32)
+            self._centroids = centroids.reshape(-1, self.dim)
+            self._assign_lists()
+        else:
+            self._centroids = None
+
+    def _write_meta(self):
+        tmp = self._files["meta.json"] + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._files["meta.json"])
+
+    def append(self, ids, vectors, vector_ids=None):
+        """Appends rows; meta.json is updated last so a partial write is never visible."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.asarray(ids, dtype=np.int64)
+        if vector_ids is None:
+            vector_ids = np.zeros(len(ids), dtype=np.int64)
+        vector_ids = np.asarray(vector_ids, dtype=np.int64)
+        with self._lock:
+            count = self.meta["count"]
+            for name, array in (("vectors.f32", vectors), ("ids.i8", ids), ("vector_ids.i8", vector_ids),
+                                ("norms.f32", np.linalg.norm(vectors, axis=1).astype(np.float32))):
+                itemsize = array.dtype.itemsize * (self.dim if name == "vectors.f32" else 1)
+                with open(self._files[name], "ab") as f:
+                    # drop any tail left behind by an interrupted append
+                    f.truncate(count * itemsize)
+                    f.write(array.tobytes())
+            self.meta["count"] = count + len(ids)
+            if len(vector_ids):
+                self.meta["last_vector_id"] = max(self.meta["last_vector_id"], int(vector_ids.max()))
+            self._write_meta()
+            self._reload()
+
+    def sync(self, conn, table: str = "product_catalogue_vectors", batch_size: int = 5000,
+             detect_deletes: bool = False) -> int:
+        """Pulls rows added since the last sync (by vector_id) and returns how many arrived.
+
+        Rows are read with a binary COPY, so embeddings arrive as packed float32 without
+        per-element conversion. With detect_deletes=True the current set of vector_ids is
+        also compared against the index and rows deleted in the database are hidden.
+        Writers must give a changed embedding a new vector_id (EmbeddingSync does), since
+        rows updated in place are not seen here; a product's newest row replaces its older ones.
+        """
+        id_column = VECTOR_TABLES[table][0]
+        added = 0
+        with conn.cursor() as cur:
+            while True:
+                buf = io.BytesIO()
+                cur.copy_expert(
+                    f"COPY (SELECT vector_id::int8, {id_column}::int8, embedding FROM {table} "
+                    f"WHERE vector_id > {int(self.meta['last_vector_id'])} "
+                    f"ORDER BY vector_id LIMIT {int(batch_size)}) TO STDOUT (FORMAT BINARY)",
+                    buf,
+                )
+                rows = list(parse_binary_copy(buf.getvalue()))
+                if not rows:
+                    break
+                vector_ids = [struct.unpack(">q", r[0])[0] for r in rows]
+                ids = [struct.unpack(">q", r[1])[0] for r in rows]
+                self.append(ids, np.stack([decode_vector(r[2]) for r in rows]), vector_ids)
+                added += len(rows)
+                if len(rows) < batch_size:
+                    break
+            if detect_deletes and self._count:
+                cur.execute(f"SELECT vector_id FROM {table}")
+                present = np.fromiter((r[0] for r in cur), dtype=np.int64)
+                gone = np.setdiff1d(self._vector_ids, present)
+                with self._lock:
+                    self.meta["deleted_vector_ids"] = gone.tolist()
+                    self._write_meta()
+                    self._reload()
+        conn.rollback()
+        return added
+
+    def build_ivf(self, n_lists: int = 64, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        """Clusters the vectors into n_lists partitions with k-means (on normalized vectors)."""
+        with self._lock:
+            rng = np.random.default_rng(seed)
+            rows = np.flatnonzero(self._alive)
+            sample = rows if len(rows) <= sample_size else rng.choice(rows, sample_size, replace=False)
+            data = self._vectors[np.sort(sample)] / np.maximum(self._norms[np.sort(sample)], 1e-12)[:, None]
+            centroids = data[rng.choice(len(data), min(n_lists, len(data)), replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(data @ centroids.T, axis=1)
+                for c in range(len(centroids)):
+                    members = data[assignment == c]
+                    if len(members):
+                        mean = members.mean(axis=0)
+                        centroids[c] = mean / max(np.linalg.norm(mean), 1e-12)
+            centroids.astype(np.float32).tofile(self._files["ivf_centroids.f32"])
+            self._centroids = centroids.astype(np.float32)
+            self._assign_lists()
+
+    def _assign_lists(self):
+        if not self._count:
+            self._lists = None
+            return
+        assignment = np.empty(self._count, dtype=np.int32)
+        for start in range(0, self._count, 65536):
+            block = self._vectors[start:start + 65536]
+            assignment[start:start + 65536] = np.argmax(block @ self._centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(len(self._centroids) + 1))
+        self._lists = (order, bounds)
+
+    def _candidates(self, query, nprobe):
+        if self._centroids is None or self._lists is None or nprobe is None:
+            return None
+        order, bounds = self._lists
+        probes = np.argsort(-(self._centroids @ query))[:nprobe]
+        return np.sort(np.concatenate([order[bounds[p]:bounds[p + 1]] for p in probes]))
+
+    def search(self, query, k: int = 10, metric: str = "cosine", nprobe: int | None = None):
+        """Returns the k nearest (id, score) pairs.
+
+        For cosine the score is the similarity (higher is better); for l2 it is the
+        Euclidean distance (lower is better). nprobe restricts the scan to that many IVF
+        partitions when build_ivf has been run.
+        """
+        with self._lock:
+            if not self._count:
+                return []
+            query = np.asarray(query, dtype=np.float32).ravel()
+            rows = self._candidates(query / max(np.linalg.norm(query), 1e-12), nprobe)
+            if rows is None:
+                vectors, norms, alive, ids = self._vectors, self._norms, self._alive, self._ids
+            else:
+                vectors, norms, alive, ids = (self._vectors[rows], self._norms[rows],
+                                              self._alive[rows], self._ids[rows])
+            dots = vectors @ query
+            if metric == "cosine":
+                scores = dots / np.maximum(norms * np.linalg.norm(query), 1e-12)
+                scores[~alive] = -np.inf
+                keys = -scores
+            elif metric == "l2":
+                scores = np.sqrt(np.maximum(norms ** 2 - 2 * dots + query @ query, 0))
+                scores[~alive] = np.inf
+                keys = scores
+            else:
+                raise ValueError("metric must be 'cosine' or 'l2'")
+            k = min(k, int(alive.sum()))
+            if k <= 0:
+                return []
+            top = np.argpartition(keys, k - 1)[:k]
+            top = top[np.argsort(keys[top])]
+            return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def search_rows(self, conn, query, k: int = 10, table: str = "product_catalogue_vectors",
+                    nprobe: int | None = None) -> list:
+        """Searches in-process, then reads only the matched rows: [(id, score, description)], best first.
+
+        The database sees one primary-key lookup instead of a vector scan; call sync() first
+        (once, then whenever the embedding table may have changed).
+        """
+        matches = self.search(query, k, nprobe=nprobe)
+        if not matches:
+            return []
+        id_column, text_column, _ = VECTOR_TABLES[table]
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT DISTINCT ON ({id_column}) {id_column}, {text_column} FROM {table} "
+                        f"WHERE {id_column} = ANY(%s) ORDER BY {id_column}, vector_id DESC",
+                        ([product_id for product_id, _ in matches],))
+            texts = dict(cur.fetchall())
+        conn.rollback()
+        return [(product_id, score, texts[product_id]) for product_id, score in matches if product_id in texts]
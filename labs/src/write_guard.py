@@ -0,0 +1,112 @@
+import json
+
+try:
+    from sql_script import iter_statements, strip_leading_comments
+except ImportError:  # imported as src.write_guard from the notebooks
+    from .sql_script import iter_statements, strip_leading_comments
+
+# Statements EXPLAIN can plan without running them; anything else (CALL, DDL, DO) only gets the timeouts
+_EXPLAINABLE = ("INSERT", "UPDATE", "DELETE", "MERGE", "WITH")
+
+_HINT = ("Add a selective WHERE clause (e.g. on the primary key), or split the change into smaller "
+         "statements; do not retry the same statement.")
+
+
+def split_statements(query: str) -> list:
+    """The statements of a possibly multi-statement query, in order."""
+    return list(iter_statements(query.splitlines(True)))
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _walk(child)
+
+
+def _input_rows(node):
+    # a ModifyTable node writes the rows its input produces
+    return max((child.get("Plan Rows", 0) for child in node.get("Plans", ())), default=node.get("Plan Rows", 0))
+
+
+def summarize_plan(plan) -> dict:
+    """Operation, target table, estimated cost/rows and the scans of an EXPLAIN (FORMAT JSON) result.
+
+    The row estimate is the largest input of any ModifyTable node in the plan, i.e. the
+    number of rows the statement is expected to write, also for writes inside a WITH
+    (which sit under CTE/InitPlan nodes below a root that may return a single row).
+    The operation and relation are those of that node.
+    """
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"]
+    writes = [node for node in _walk(root) if node["Node Type"] == "ModifyTable"]
+    target = max(writes, key=_input_rows) if writes else root
+    summary = {
+        "node": root["Node Type"],
+        "operation": target.get("Operation"),
+        "relation": target.get("Relation Name"),
+        "total_cost": root.get("Total Cost"),
+        "estimated_rows": _input_rows(target) if writes else root.get("Plan Rows", 0),
+        "scans": [
+            {"node": node["Node Type"], "relation": node["Relation Name"], "estimated_rows": node.get("Plan Rows")}
+            for node in _walk(root) if "Scan" in node["Node Type"] and node.get("Relation Name")
+        ][:5],
+    }
+    return {key: value for key, value in summary.items() if value not in (None, [])}
+
+
+class WriteGuard:
+    """Pre-execution limits for agent-issued writes.
+
+    check() runs EXPLAIN (FORMAT JSON) on a statement, without executing it, and rejects
+    it when the planner expects it to write more than max_rows rows or to cost more than
+    max_cost. apply_timeouts() sets statement_timeout and lock_timeout with SET LOCAL,
+    so they end with the transaction and never leak to the next user of a pooled connection.
+    A limit of None is not checked.
+    """
+
+    def __init__(self, max_rows: int | None = 1000, max_cost: float | None = 100_000,
+                 statement_timeout: str | None = "5s", lock_timeout: str | None = "2s"):
+        self.max_rows = max_rows
+        self.max_cost = max_cost
+        self.statement_timeout = statement_timeout
+        self.lock_timeout = lock_timeout
+        settings = []
+        for name, value in (("statement_timeout", statement_timeout), ("lock_timeout", lock_timeout)):
+            if value is not None:
+                settings.append(f"SET LOCAL {name} = '{str(value).replace(chr(39), chr(39) * 2)}'")
+        self.settings_sql = "; ".join(settings)
+
+    def limits(self) -> dict:
+        return {"max_rows": self.max_rows, "max_cost": self.max_cost,
+                "statement_timeout": self.statement_timeout, "lock_timeout": self.lock_timeout}
+
+    def apply_timeouts(self, cursor):
+        """Sets the per-call timeouts for the rest of the cursor's current transaction."""
+        if self.settings_sql:
+            cursor.execute(self.settings_sql)
+
+    @staticmethod
+    def explainable(sql: str) -> bool:
+        words = strip_leading_comments(sql).split(None, 1)
+        return bool(words) and words[0].upper() in _EXPLAINABLE
+
+    def check(self, cursor, sql: str, params=None, prefix: str = ""):
+        """Returns None if the statement is within the limits, else a structured rejection.
+
+        prefix is plain SQL (e.g. a SAVEPOINT) sent in the same round trip ahead of the EXPLAIN;
+        only pass it for statements that are explainable(), the others are not checked.
+        """
+        if not self.explainable(sql):
+            return None
+        cursor.execute(prefix + "EXPLAIN (FORMAT JSON) " + sql, params or None)
+        plan = summarize_plan(cursor.fetchone()[0])
+        reasons = []
+        if self.max_rows is not None and plan["estimated_rows"] > self.max_rows:
+            reasons.append(f"estimated rows {plan['estimated_rows']} exceed the limit of {self.max_rows}")
+        if self.max_cost is not None and (plan.get("total_cost") or 0) > self.max_cost:
+            reasons.append(f"estimated cost {plan['total_cost']} exceeds the limit of {self.max_cost}")
+        if not reasons:
+            return None
+        return {"status": "rejected", "error": "; ".join(reasons), "limits": self.limits(), "plan": plan,
+                "hint": _HINT}